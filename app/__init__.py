@@ -1,15 +1,35 @@
-from flask import Flask
+from flask import Flask, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from sqlalchemy import event
 from sqlite3 import Connection as SQLiteConnection
-from sqlalchemy.engine import Engine
 from flask_cors import CORS
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.utils import import_string
 import os
 from flask_mailman import Mail
+from .utils.cache import TTLCache
+from .utils.passwords import HashingBusy, PasswordHasher
+from .utils.ratelimit import parse_rate
+from .utils.pool import (
+    apply_statement_timeout,
+    parse_statement_timeouts,
+    postgres_engine_options,
+)
+from .utils.replica import (
+    REPLICA_BIND,
+    ReplicaSession,
+    make_read_only,
+    release_replica,
+    remember_writer,
+    replica_bind,
+    route_to_replica,
+)
+from .utils.sql import ensure_columns, ensure_indexes
+from .utils.sqlite import apply_sqlite_pragmas, check_sqlite_settings
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": ReplicaSession})
 jwt = JWTManager()
 mail = Mail()
 
@@ -67,6 +87,20 @@ def create_app():
         "DATABASE_URL", "sqlite:///app.db"
     )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = postgres_engine_options()
+    # Optional read replica serving GET requests; a user who wrote within the
+    # last REPLICA_STICKINESS_SECONDS keeps reading from the primary.
+    replica_url = os.getenv("DATABASE_REPLICA_URL")
+    if replica_url:
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND: replica_bind(replica_url)}
+    app.config["REPLICA_STICKINESS_SECONDS"] = int(
+        os.getenv("REPLICA_STICKINESS_SECONDS", 5)
+    )
+    # Per-blueprint statement timeouts in milliseconds, e.g. "events:2000".
+    app.config["DB_STATEMENT_TIMEOUTS"] = parse_statement_timeouts(
+        os.getenv("DB_STATEMENT_TIMEOUTS")
+    )
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
     app.config.update(
         MAIL_SERVER=os.getenv("MAIL_SERVER"),
@@ -76,29 +110,218 @@ def create_app():
         MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
         MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
         MAIL_DEFAULT_SENDER=os.getenv("MAIL_DEFAULT_SENDER"),
+        MAIL_TIMEOUT=int(os.getenv("MAIL_TIMEOUT", 10)),
+    )
+    # Mail is written to an outbox table and sent by a background thread
+    # (MAIL_OUTBOX_WORKER=False leaves it to `flask send-outbox`). Failed
+    # sends are retried after MAIL_OUTBOX_RETRY_SECONDS, doubling each time.
+    app.config["MAIL_OUTBOX_WORKER"] = os.getenv("MAIL_OUTBOX_WORKER", "True") == "True"
+    app.config["MAIL_OUTBOX_BATCH_SIZE"] = int(os.getenv("MAIL_OUTBOX_BATCH_SIZE", 50))
+    app.config["MAIL_OUTBOX_POLL_SECONDS"] = int(
+        os.getenv("MAIL_OUTBOX_POLL_SECONDS", 30)
+    )
+    app.config["MAIL_OUTBOX_RETRY_SECONDS"] = int(
+        os.getenv("MAIL_OUTBOX_RETRY_SECONDS", 30)
+    )
+    app.config["MAIL_OUTBOX_MAX_ATTEMPTS"] = int(
+        os.getenv("MAIL_OUTBOX_MAX_ATTEMPTS", 8)
+    )
+    # How long a claimed batch stays hidden from other senders.
+    app.config["MAIL_OUTBOX_LEASE_SECONDS"] = int(
+        os.getenv("MAIL_OUTBOX_LEASE_SECONDS", 300)
+    )
+
+    app.config["EVENTS_CACHE_SIZE"] = int(os.getenv("EVENTS_CACHE_SIZE", 256))
+    app.config["EVENTS_CACHE_TTL"] = int(os.getenv("EVENTS_CACHE_TTL", 60))
+    app.config["IDENTITY_CACHE_SIZE"] = int(os.getenv("IDENTITY_CACHE_SIZE", 1024))
+    app.config["IDENTITY_CACHE_TTL"] = int(os.getenv("IDENTITY_CACHE_TTL", 30))
+    # Password hashing: Werkzeug method string (e.g. "pbkdf2:sha256:600000" or
+    # "scrypt:32768:8:1"), worker processes (0 = inline) and the number of
+    # hashes allowed to queue before callers wait up to PASSWORD_HASH_TIMEOUT.
+    app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2")
+    app.config["PASSWORD_HASH_WORKERS"] = int(
+        os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)
+    )
+    app.config["PASSWORD_HASH_MAX_PENDING"] = int(
+        os.getenv("PASSWORD_HASH_MAX_PENDING", 0)
+    )
+    app.config["PASSWORD_HASH_TIMEOUT"] = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+    # Token buckets in front of login and forgot_password, as "attempts/seconds"
+    # per client IP and per email; an empty value disables a limit.
+    # RATE_LIMIT_STORE names the bucket store class, e.g. one shared by all
+    # worker processes.
+    app.config["LOGIN_RATE_LIMIT_IP"] = parse_rate(
+        os.getenv("LOGIN_RATE_LIMIT_IP", "30/60")
     )
+    app.config["LOGIN_RATE_LIMIT_EMAIL"] = parse_rate(
+        os.getenv("LOGIN_RATE_LIMIT_EMAIL", "10/300")
+    )
+    app.config["FORGOT_PASSWORD_RATE_LIMIT_IP"] = parse_rate(
+        os.getenv("FORGOT_PASSWORD_RATE_LIMIT_IP", "5/300")
+    )
+    app.config["FORGOT_PASSWORD_RATE_LIMIT_EMAIL"] = parse_rate(
+        os.getenv("FORGOT_PASSWORD_RATE_LIMIT_EMAIL", "3/3600")
+    )
+    app.config["RATE_LIMIT_STORE"] = os.getenv(
+        "RATE_LIMIT_STORE", "app.utils.ratelimit.MemoryBucketStore"
+    )
+    # Reverse proxies in front of the app (0 = none). Their X-Forwarded-For
+    # entries are trusted, so the per-IP limits see the real client address
+    # rather than the proxy's; any other client could forge the header.
+    app.config["TRUSTED_PROXY_COUNT"] = int(os.getenv("TRUSTED_PROXY_COUNT", 0))
+    if app.config["TRUSTED_PROXY_COUNT"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXY_COUNT"])
+    # Upper bound, in seconds, on how long a token revoked by another worker
+    # process (logout, permission change) is still accepted here.
+    app.config["REVOCATION_REFRESH_SECONDS"] = int(
+        os.getenv("REVOCATION_REFRESH_SECONDS", 30)
+    )
+    app.config["EVENTS_STREAM_HISTORY"] = int(os.getenv("EVENTS_STREAM_HISTORY", 1000))
+    app.config["EVENTS_STREAM_HEARTBEAT"] = int(
+        os.getenv("EVENTS_STREAM_HEARTBEAT", 15)
+    )
+    # Open streams per process; each holds a worker thread (0 = no limit).
+    app.config["EVENTS_STREAM_MAX_SUBSCRIBERS"] = int(
+        os.getenv("EVENTS_STREAM_MAX_SUBSCRIBERS", 50)
+    )
+
+    # SQLite performance profile, applied to every connection. WAL lets reads
+    # proceed while a registration holds the write lock; an empty value keeps
+    # SQLite's default.
+    app.config["SQLITE_JOURNAL_MODE"] = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    app.config["SQLITE_SYNCHRONOUS"] = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    app.config["SQLITE_BUSY_TIMEOUT"] = os.getenv("SQLITE_BUSY_TIMEOUT", "5000")
+    app.config["SQLITE_MMAP_SIZE"] = os.getenv("SQLITE_MMAP_SIZE", "268435456")
+    app.config["SQLITE_CACHE_SIZE"] = os.getenv("SQLITE_CACHE_SIZE", "-65536")
+    app.config["SQLITE_TEMP_STORE"] = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
 
-    @event.listens_for(Engine, "connect")
     def set_sqlite_pragma(dbapi_connection, connection_record):
         if isinstance(dbapi_connection, SQLiteConnection):
-            cursor = dbapi_connection.cursor()
-            cursor.execute("PRAGMA foreign_keys=ON")
-            cursor.close()
+            apply_sqlite_pragmas(dbapi_connection, app.config)
+
+    def set_replica_pragma(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, SQLiteConnection):
+            apply_sqlite_pragmas(dbapi_connection, app.config)
+            make_read_only(dbapi_connection)
 
     db.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
+    app.extensions["events_cache"] = TTLCache(
+        maxsize=app.config["EVENTS_CACHE_SIZE"], ttl=app.config["EVENTS_CACHE_TTL"]
+    )
+    app.extensions["password_hasher"] = PasswordHasher(
+        method=app.config["PASSWORD_HASH_METHOD"],
+        workers=app.config["PASSWORD_HASH_WORKERS"],
+        max_pending=app.config["PASSWORD_HASH_MAX_PENDING"],
+        timeout=app.config["PASSWORD_HASH_TIMEOUT"],
+    )
+
+    app.extensions["rate_limit_store"] = import_string(
+        app.config["RATE_LIMIT_STORE"]
+    )()
+
+    @app.errorhandler(HashingBusy)
+    def hashing_busy(e):
+        return (
+            jsonify({"message": "Too many requests, try again shortly."}),
+            503,
+            {"Retry-After": "1"},
+        )
+
+    if replica_url:
+        stickiness = app.config["REPLICA_STICKINESS_SECONDS"]
+
+        @app.before_request
+        def use_replica_for_reads():
+            route_to_replica(db.session, stickiness)
+
+        @app.after_request
+        def stick_writers_to_primary(response):
+            return remember_writer(response, stickiness)
+
+        @app.teardown_request
+        def leave_replica(exc):
+            release_replica(db.session)
+
+    @app.before_request
+    def refresh_revocations():
+        app.extensions["revocations"].refresh_if_stale()
+
+    @app.before_request
+    def set_statement_timeout():
+        timeout = app.config["DB_STATEMENT_TIMEOUTS"].get(request.blueprint)
+        # Registered after replica routing so it applies to the engine in use.
+        if timeout is not None and db.engine.dialect.name == "postgresql":
+            # Lasts until the request's first commit or rollback.
+            apply_statement_timeout(db.session, timeout)
 
     with app.app_context():
+        event.listen(db.engine, "connect", set_sqlite_pragma)
+        if replica_url:
+            event.listen(db.engines[REPLICA_BIND], "connect", set_replica_pragma)
+
         from .models import User, Event, Registration
+        from .utils import (
+            versions,
+            autoapprove,
+            broadcast,
+            identity,
+            revocation,
+            outbox,
+        )
+        from .utils.jwt import user_lookup_callback
+
+        app.extensions["event_broadcaster"] = broadcast.Broadcaster(
+            history=app.config["EVENTS_STREAM_HISTORY"],
+            max_subscribers=app.config["EVENTS_STREAM_MAX_SUBSCRIBERS"],
+        )
+        app.extensions["identity_cache"] = identity.IdentityCache(
+            maxsize=app.config["IDENTITY_CACHE_SIZE"],
+            ttl=app.config["IDENTITY_CACHE_TTL"],
+        )
+        if app.config["MAIL_OUTBOX_WORKER"]:
+            app.extensions["mail_outbox_sender"] = outbox.OutboxSender(
+                app, poll_interval=app.config["MAIL_OUTBOX_POLL_SECONDS"]
+            )
+        app.extensions["revocations"] = revocation.RevocationList(
+            max_staleness=app.config["REVOCATION_REFRESH_SECONDS"]
+        )
+        from .utils.search import install_search_index
         from .routes import auth, user, admin, events
+        from .commands import (
+            reconcile_staffing_counters_command,
+            reevaluate_event_statuses_command,
+            send_outbox_command,
+        )
 
         app.register_blueprint(auth.bp)
         app.register_blueprint(user.bp)
         app.register_blueprint(admin.bp)
         app.register_blueprint(events.bp)
+        app.cli.add_command(reconcile_staffing_counters_command)
+        app.cli.add_command(reevaluate_event_statuses_command)
+        app.cli.add_command(send_outbox_command)
 
         db.create_all()
+        with db.engine.begin() as connection:
+            if connection.dialect.name == "sqlite":
+                check_sqlite_settings(connection, app.config)
+            added_columns = ensure_columns(connection, db.metadata)
+            install_search_index(connection)
+            ensure_indexes(connection, db.metadata)
+        if any(table == "event" for table, _ in added_columns):
+            # Staffing counters added to existing events start at 0.
+            from .utils.autoapprove import reconcile_staffing_counters
+
+            reconcile_staffing_counters()
+            db.session.commit()
         create_super_admin_if_not_exists()
+        app.extensions["revocations"].load()
+        if app.config["MAIL_OUTBOX_WORKER"] and outbox.has_undelivered(
+            app.config["MAIL_OUTBOX_MAX_ATTEMPTS"]
+        ):
+            # Mail left queued or backing off by a previous process.
+            app.extensions["mail_outbox_sender"].wake()
 
     return app
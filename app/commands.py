@@ -0,0 +1,47 @@
+import click
+from flask.cli import with_appcontext
+
+from app import db
+from app.utils.autoapprove import (
+    reconcile_staffing_counters,
+    reevaluate_event_statuses,
+)
+from app.utils.outbox import deliver_pending
+from app.utils.versions import EVENTS_KEY, event_key, mark_changed
+
+
+@click.command("reconcile-staffing-counters")
+@with_appcontext
+def reconcile_staffing_counters_command():
+    """Rebuild per-event staffing counters from the registrations table."""
+    updated = reconcile_staffing_counters()
+    db.session.commit()
+    click.echo(f"Reconciled staffing counters for {updated} events.")
+
+
+@click.command("reevaluate-event-statuses")
+@click.option("--all", "all_events", is_flag=True, help="Include past events.")
+@with_appcontext
+def reevaluate_event_statuses_command(all_events):
+    """Approve every upcoming pending event that its registrations staff."""
+    changed = reevaluate_event_statuses(
+        upcoming_only=not all_events, recount=True, demote=False
+    )
+    if changed:
+        mark_changed(db.session, {EVENTS_KEY} | {event_key(i) for i in changed})
+    db.session.commit()
+    click.echo(f"Updated the status of {len(changed)} events.")
+
+
+@click.command("send-outbox")
+@with_appcontext
+def send_outbox_command():
+    """Send every due message in the mail outbox."""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = deliver_pending()
+        total_sent += sent
+        total_failed += failed
+        if sent + failed == 0:
+            break
+    click.echo(f"Sent {total_sent} messages, {total_failed} failed.")
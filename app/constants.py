@@ -41,3 +41,13 @@ ROLE_OPTIONS = [
     "Family Representative",
     "Guide",
 ]
+
+EVENT_STATUS_OPTIONS = [
+    "pending",
+    "approved",
+]
+
+REGISTRATION_STATUS_OPTIONS = [
+    "approved",
+    "pending",
+]
@@ -1,5 +1,6 @@
 from . import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime
+from .utils.passwords import password_hasher
 
 
 class User(db.Model):
@@ -8,11 +9,16 @@ class User(db.Model):
     last_name = db.Column(db.String(80), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone_number = db.Column(db.String(20))
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
     token_version = db.Column(db.Integer, default=0)
     permission_type = db.Column(db.String(20), nullable=False, default="user")
     preferredLanguages = db.Column(db.String(100), nullable=True)
-    role = db.Column(db.String(50), nullable=False, default="Family Representative")
+    # The previous role is loaded on change so the staffing counters of the
+    # user's registrations can move with it (see app.utils.autoapprove).
+    role = db.column_property(
+        db.Column(db.String(50), nullable=False, default="Family Representative"),
+        active_history=True,
+    )
 
     registrations = db.relationship(
         "Registration",
@@ -22,13 +28,22 @@ class User(db.Model):
     )
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher().hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher().verify(self.password_hash, password)
 
 
 class Event(db.Model):
+    __table_args__ = (
+        db.Index("ix_event_date_id", "date", "id"),
+        db.Index("ix_event_status_date_id", "status", "date", "id"),
+        db.Index("ix_event_channel_date_id", "channel", "date", "id"),
+        db.Index("ix_event_language_date_id", "language", "date", "id"),
+        db.Index("ix_event_location_date_id", "location", "date", "id"),
+        db.Index("ix_event_target_audience_date_id", "target_audience", "date", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(400), nullable=False)
@@ -40,6 +55,14 @@ class Event(db.Model):
     group_size = db.Column(db.Integer, nullable=False, default=0)
     num_instructors_needed = db.Column(db.Integer, nullable=False, default=0)
     num_representatives_needed = db.Column(db.Integer, nullable=False, default=0)
+    # Denormalized registration counts per role, maintained alongside every
+    # registration insert/delete (see app.utils.autoapprove).
+    num_family_reps_registered = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    num_guides_registered = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
     target_audience = db.Column(db.String(50), nullable=False)
     group_description = db.Column(db.Text, nullable=True)
     additional_notes = db.Column(db.Text, nullable=True)
@@ -55,6 +78,12 @@ class Event(db.Model):
 
 class Registration(db.Model):
     __tablename__ = "registrations"
+    # The (user_id, event_id) primary key serves per-user lookups, this index
+    # serves per-event ones.
+    __table_args__ = (
+        db.Index("ix_registrations_event_id_user_id", "event_id", "user_id"),
+    )
+
     user_id = db.Column(
         db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
     )
@@ -65,3 +94,53 @@ class Registration(db.Model):
 
     user = db.relationship("User", back_populates="registrations")
     event = db.relationship("Event", back_populates="registrations")
+
+
+class WaitlistEntry(db.Model):
+    """A signup that arrived while its role was at capacity, promoted in id order."""
+
+    __tablename__ = "waitlist_entries"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "event_id"),
+        db.Index("ix_waitlist_entries_event_id_id", "event_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    event_id = db.Column(
+        db.Integer, db.ForeignKey("event.id", ondelete="CASCADE"), nullable=False
+    )
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    user = db.relationship("User")
+
+
+class ResourceVersion(db.Model):
+    """Monotonic version of a cached resource, bumped on every committed write."""
+
+    __tablename__ = "resource_versions"
+    key = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class OutboxMessage(db.Model):
+    """An email committed with the change that caused it, awaiting delivery.
+
+    Deleted once sent, so the table only holds what is still due.
+    """
+
+    __tablename__ = "outbox_messages"
+    __table_args__ = (
+        db.Index("ix_outbox_messages_next_attempt_at_id", "next_attempt_at", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
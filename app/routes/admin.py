@@ -1,8 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
+from sqlalchemy.orm import contains_eager
 from app.models import Event, User, Registration
 from app import db
+from app.utils.autoapprove import reevaluate_event_statuses, should_autoapprove_event
+from app.utils.pool import pool_stats
+from app.utils.streaming import ndjson_response, wants_ndjson
+from app.utils.waitlist import promote_from_waitlist
 from app.utils.decorators import (
     admin_required,
     super_admin_required,
@@ -150,11 +155,6 @@ def update_event(event_id):
         event.num_representatives_needed = data["num_representatives_needed"]
     if "group_description" in data:
         event.group_description = data["group_description"]
-    if "additional_notes" in data:
-        event.additional_notes = data["additional_notes"]
-    if "status" in data:
-        event.status = data["status"]
-    event.group_description = data["group_description"]
     if "additional_notes" in data:
         event.additional_notes = data["additional_notes"]
     if "status" in data:
@@ -163,6 +163,12 @@ def update_event(event_id):
         event.contact_phone_number = data["contact_phone_number"]
 
     try:
+        if "num_instructors_needed" in data or "num_representatives_needed" in data:
+            # A raised capacity frees slots for waitlisted users.
+            promote_from_waitlist(event_id)
+            # An explicit status wins over the auto-approve rule.
+            if "status" not in data:
+                reevaluate_event_statuses([event_id])
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -252,6 +258,8 @@ def set_user_permission(user_id_to_change):
         return jsonify({"message": "Target user not found."}), 404
 
     target_user.permission_type = new_permission
+    # Tokens carry the old permission as a claim; revoke them.
+    target_user.token_version += 1
     try:
         db.session.commit()
         return (
@@ -270,22 +278,31 @@ def set_user_permission(user_id_to_change):
         )
 
 
+def _pending_registration_to_dict(reg):
+    return {
+        "event_id": reg.event_id,
+        "event_title": reg.event.title,
+        "user_id": reg.user_id,
+        "user_email": reg.user.email,
+        "user_role": reg.user.role,
+        "registration_status": reg.status,
+    }
+
+
 @bp.route("/admin/pending-registrations", methods=["GET"])
 @jwt_required()
 @admin_required
 def get_pending_registrations():
-    registrations = Registration.query.filter_by(status="pending").all()
-    registrations_list = [
-        {
-            "event_id": reg.event_id,
-            "event_title": reg.event.title,
-            "user_id": reg.user_id,
-            "user_email": reg.user.email,
-            "user_role": reg.user.role,
-            "registration_status": reg.status,
-        }
-        for reg in registrations
-    ]
+    registrations = (
+        Registration.query.filter_by(status="pending")
+        .join(Registration.event)
+        .join(Registration.user)
+        .options(contains_eager(Registration.event), contains_eager(Registration.user))
+    )
+    if wants_ndjson():
+        return ndjson_response(registrations, _pending_registration_to_dict)
+
+    registrations_list = [_pending_registration_to_dict(reg) for reg in registrations]
     return jsonify(registrations=registrations_list), 200
 
 
@@ -321,9 +338,25 @@ def reject_registration(event_id, user_id):
 
     db.session.delete(registration)
     try:
+        if promote_from_waitlist(event_id) and should_autoapprove_event(event_id):
+            Event.query.get(event_id).status = "approved"
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": str(e)}), 500
 
     return jsonify({"message": "Registration rejected"}), 200
+
+
+@bp.route("/admin/cache-stats", methods=["GET"])
+@jwt_required()
+@admin_required
+def get_cache_stats():
+    return jsonify(events=current_app.extensions["events_cache"].stats()), 200
+
+
+@bp.route("/admin/pool-stats", methods=["GET"])
+@jwt_required()
+@admin_required
+def get_pool_stats():
+    return jsonify(pool_stats(db.engine)), 200
@@ -1,9 +1,12 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, current_user, jwt_required
 from app.models import User
-from app import db, mail
+from app import db
 from app.constants import ROLE_OPTIONS
-from flask_mail import Message
+from app.utils.identity import remember_user
+from app.utils.outbox import enqueue_mail
+from app.utils.passwords import password_hasher
+from app.utils.ratelimit import rate_limited
 import secrets
 
 bp = Blueprint("auth", __name__)
@@ -43,6 +46,7 @@ def signup():
 
 
 @bp.route("/login", methods=["POST"])
+@rate_limited("LOGIN")
 def login():
     data = request.get_json()
     user = User.query.filter_by(email=data.get("email")).first()
@@ -50,9 +54,21 @@ def login():
     if not user or not user.check_password(data.get("password")):
         return jsonify({"message": "Invalid credentials"}), 401
 
+    if password_hasher().needs_rehash(user.password_hash):
+        # Upgrade to the configured method and cost while the password is at hand.
+        user.set_password(data.get("password"))
+        db.session.commit()
+
+    # The first authenticated requests of the session then need no user query.
+    remember_user(user)
     access_token = create_access_token(
         identity=str(user.id),
-        additional_claims={"token_version": user.token_version},
+        # Permission decorators authorize from these claims without a query.
+        additional_claims={
+            "token_version": user.token_version,
+            "permission_type": user.permission_type,
+            "role": user.role,
+        },
     )
 
     return (
@@ -74,6 +90,7 @@ def login():
 
 
 @bp.route("/forgot_password", methods=["POST"])
+@rate_limited("FORGOT_PASSWORD")
 def forgot_password():
     data = request.get_json()
     email = data.get("email")
@@ -82,14 +99,14 @@ def forgot_password():
     if user:
         temp_password = secrets.token_urlsafe(8)
         user.set_password(temp_password)
-        db.session.commit()
-
-        msg = Message(
+        # Committed together with the new password and sent in the background.
+        enqueue_mail(
+            db.session,
+            email,
             "Your new password",
-            recipients=[email],
-            body=f"Your temporary password is: {temp_password}",
+            f"Your temporary password is: {temp_password}",
         )
-        mail.send(msg)
+        db.session.commit()
 
     return (
         jsonify(
@@ -104,7 +121,7 @@ def forgot_password():
 @bp.route("/logout", methods=["POST"])
 @jwt_required()
 def logout():
-    user = User.query.get(get_jwt_identity())
+    user = current_user
     user.token_version += 1
     db.session.commit()
     return jsonify({"message": "Successfully logged out"}), 200
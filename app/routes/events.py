@@ -1,71 +1,381 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, Response, current_app, has_app_context, request, jsonify
+from flask_jwt_extended import jwt_required
 from datetime import datetime, timedelta
+from sqlalchemy import func, literal, union_all
+from app import db
 from app.models import Event, User, Registration
+from app.utils.broadcast import STREAM_RETRY_MS, sse_stream
 from app.utils.decorators import admin_required
-
+from app.utils.pagination import after_cursor, keyset_page, parse_limit
+from app.utils.search import search_event_ids
+from app.utils.serializers import event_load_options, event_to_dict, parse_fields
+from app.utils.streaming import ndjson_response, wants_ndjson
+from app.utils.versions import (
+    EVENTS_KEY,
+    not_modified,
+    on_commit,
+    registrants_key,
+    resource_etag,
+)
+from app.constants import (
+    CHANNEL_OPTIONS,
+    EVENT_STATUS_OPTIONS,
+    LANGUAGE_OPTIONS,
+    LOCATION_OPTIONS,
+    REGISTRATION_STATUS_OPTIONS,
+    ROLE_OPTIONS,
+    TARGET_AUDIENCE_OPTIONS,
+)
 
 bp = Blueprint("events", __name__)
 
+# Query parameters accepted as equality filters by GET /events, each backed by
+# a (column, date, id) index on Event.
+EVENT_FILTERS = {
+    "status": (Event.status, EVENT_STATUS_OPTIONS),
+    "channel": (Event.channel, CHANNEL_OPTIONS),
+    "language": (Event.language, LANGUAGE_OPTIONS),
+    "location": (Event.location, LOCATION_OPTIONS),
+    "target_audience": (Event.target_audience, TARGET_AUDIENCE_OPTIONS),
+}
+
+# Filters the sidebar shows value counts for.
+EVENT_FACETS = ("channel", "language", "location", "target_audience")
+
+EVENT_INCLUDES = {"counts"}
+
+MAX_BATCH_EVENT_IDS = 100
+
+
+def _registrant_to_dict(user):
+    return {
+        "id": user.id,
+        "firstName": user.first_name,
+        "lastName": user.last_name,
+        "email": user.email,
+        "phoneNumber": user.phone_number,
+        "role": user.role,
+    }
+
+
+def _parse_event_filters():
+    """Return {filter name: value} from the query string. Raises ValueError."""
+    filters = {}
+    for name, (column, options) in EVENT_FILTERS.items():
+        value = request.args.get(name)
+        if value is None:
+            continue
+        if value not in options:
+            raise ValueError(f"Invalid {name} option")
+        filters[name] = value
+    return filters
+
+
+def _filter_conditions(filters, exclude=None):
+    return [
+        EVENT_FILTERS[name][0] == value
+        for name, value in filters.items()
+        if name != exclude
+    ]
+
+
+def _registration_counts(event_ids):
+    """Per-event registration counts by role and status, in one GROUP BY query."""
+    counts = {
+        event_id: {
+            role: {status: 0 for status in REGISTRATION_STATUS_OPTIONS}
+            for role in ROLE_OPTIONS
+        }
+        for event_id in event_ids
+    }
+    if not event_ids:
+        return counts
+
+    rows = (
+        db.session.query(
+            Registration.event_id, User.role, Registration.status, func.count()
+        )
+        .join(User, User.id == Registration.user_id)
+        .filter(Registration.event_id.in_(event_ids))
+        .group_by(Registration.event_id, User.role, Registration.status)
+    )
+    for event_id, role, status, count in rows:
+        counts[event_id].setdefault(role, {}).setdefault(status, 0)
+        counts[event_id][role][status] = count
+    return counts
+
+
+def _events_cache():
+    return current_app.extensions["events_cache"]
+
+
+@on_commit
+def _invalidate_events_cache(keys):
+    # Every page's key includes the events version, so this only frees pages
+    # that can no longer be hit. A registration leaves plain pages valid; the
+    # counts pages of its event miss on their registrants version instead and
+    # age out of the cache.
+    if has_app_context() and EVENTS_KEY in keys:
+        _events_cache().clear()
+
+
+def _page_event_ids(since):
+    """Ids of the events on the requested GET /events page. Raises ValueError."""
+    query = db.session.query(Event.id, Event.date).filter(
+        Event.date >= since, *_filter_conditions(_parse_event_filters())
+    )
+    rows, _ = keyset_page(
+        query,
+        Event.date,
+        Event.id,
+        request.args.get("cursor"),
+        parse_limit(request.args.get("limit")),
+    )
+    return [row.id for row in rows]
+
 
 @bp.route("/events", methods=["GET"])
 def get_events():
+    # Truncated to the minute so the feed, and its ETag, only shift once a minute.
+    yesterday = (datetime.now() - timedelta(days=1)).replace(second=0, microsecond=0)
+    stream = wants_ndjson()
+    include = {name for name in request.args.get("include", "").split(",") if name}
+    unknown = include - EVENT_INCLUDES
+    if unknown:
+        return jsonify({"message": f"Unknown include: {sorted(unknown)[0]}"}), 400
+    if stream and include:
+        return jsonify({"message": "include is not supported for NDJSON streams"}), 400
+
+    if not stream:
+        keys = [EVENTS_KEY]
+        if "counts" in include:
+            # Counts depend only on the registrations of this page's events,
+            # which an ids-only page query (served by the date/id indexes) names.
+            try:
+                keys += [registrants_key(i) for i in _page_event_ids(yesterday)]
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
+        etag = resource_etag(keys, yesterday.isoformat())
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
+        # The ETag covers the query string and the resource version, so it
+        # doubles as a cache key that can never serve a page from before a write.
+        payload = _events_cache().get(etag)
+        if payload is not None:
+            response = jsonify(payload)
+            response.set_etag(etag)
+            response.vary.add("Accept")
+            return response, 200
+
+    try:
+        fields = parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    query = Event.query.filter(Event.date >= yesterday).options(
+        event_load_options(fields)
+    )
+
+    try:
+        query = query.filter(*_filter_conditions(_parse_event_filters()))
+
+        if stream:
+            # Exports stream everything after the cursor unless a limit is given.
+            query = after_cursor(
+                query, Event.date, Event.id, request.args.get("cursor")
+            )
+            if "limit" in request.args:
+                query = query.limit(parse_limit(request.args["limit"]))
+            return ndjson_response(query, lambda event: event_to_dict(event, fields))
+
+        limit = parse_limit(request.args.get("limit"))
+        events, next_cursor = keyset_page(
+            query, Event.date, Event.id, request.args.get("cursor"), limit
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    events_list = [event_to_dict(event, fields) for event in events]
+    if "counts" in include:
+        counts = _registration_counts([event.id for event in events])
+        for event_dict in events_list:
+            event_dict["registration_counts"] = counts[event_dict["id"]]
+    payload = {"events": events_list, "next_cursor": next_cursor}
+    _events_cache().set(etag, payload)
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.vary.add("Accept")
+    return response, 200
+
+
+@bp.route("/events/stream", methods=["GET"])
+def stream_event_changes():
+    """Server-Sent Events feed of event status and staffing count changes."""
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"message": "Invalid Last-Event-ID"}), 400
+
+    broadcaster = current_app.extensions["event_broadcaster"]
+    # Each open stream occupies a worker thread; past the limit, turn new
+    # subscribers away before they starve ordinary requests.
+    if not broadcaster.subscribe():
+        return (
+            jsonify({"message": "Too many open streams, try again later."}),
+            503,
+            {"Retry-After": str(STREAM_RETRY_MS // 1000)},
+        )
+
+    # Not wrapped in stream_with_context: the open stream holds no app
+    # context, session or database connection while it waits.
+    stream = sse_stream(
+        broadcaster, last_id, current_app.config["EVENTS_STREAM_HEARTBEAT"]
+    )
+    response = Response(
+        stream,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(broadcaster.unsubscribe)
+    return response
+
+
+@bp.route("/events/facets", methods=["GET"])
+def get_event_facets():
+    yesterday = (datetime.now() - timedelta(days=1)).replace(second=0, microsecond=0)
+    try:
+        filters = _parse_event_filters()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    etag = resource_etag([EVENTS_KEY], yesterday.isoformat())
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    # One UNION ALL query. Each facet ignores its own filter so the sidebar
+    # can still offer the alternatives to the selected value.
+    branches = []
+    for name in EVENT_FACETS:
+        column = EVENT_FILTERS[name][0]
+        branches.append(
+            db.select(literal(name).label("facet"), column, func.count())
+            .where(Event.date >= yesterday, *_filter_conditions(filters, exclude=name))
+            .group_by(column)
+        )
+
+    facets = {
+        name: {option: 0 for option in EVENT_FILTERS[name][1]} for name in EVENT_FACETS
+    }
+    for facet, value, count in db.session.execute(union_all(*branches)):
+        facets[facet][value] = count
+
+    response = jsonify(facets=facets)
+    response.set_etag(etag)
+    return response, 200
+
+
+@bp.route("/events/search", methods=["GET"])
+def search_events():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"message": "Missing search query"}), 400
+
+    try:
+        fields = parse_fields(request.args.get("fields"))
+        limit = parse_limit(request.args.get("limit"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    page = request.args.get("page", "1")
+    if not page.isdigit() or int(page) < 1:
+        return jsonify({"message": "page must be a positive integer"}), 400
+    page = int(page)
+
     yesterday = datetime.now() - timedelta(days=1)
-    events = Event.query.filter(Event.date >= yesterday).all()
-    events_list = [
-        {
-            "id": event.id,
-            "title": event.title,
-            "description": event.description,
-            "date": event.date.isoformat(),
-            "channel": event.channel,
-            "language": event.language,
-            "location": event.location,
-            "status": event.status,
-            "group_size": event.group_size,
-            "num_instructors_needed": event.num_instructors_needed,
-            "num_representatives_needed": event.num_representatives_needed,
-            "target_audience": event.target_audience,
-            "group_description": event.group_description,
-            "additional_notes": event.additional_notes,
-            "contact_phone_number": event.contact_phone_number,
-        }
-        for event in events
-    ]
-    return jsonify({"events": events_list}), 200
+    ids = search_event_ids(q, yesterday, limit + 1, (page - 1) * limit)
+    next_page = page + 1 if len(ids) > limit else None
+    ids = ids[:limit]
+
+    events = {
+        event.id: event
+        for event in Event.query.filter(Event.id.in_(ids)).options(
+            event_load_options(fields)
+        )
+    }
+    events_list = [event_to_dict(events[event_id], fields) for event_id in ids]
+    return jsonify({"events": events_list, "next_page": next_page}), 200
+
+
+@bp.route("/events/registrants", methods=["GET"])
+def get_registrants_batch():
+    try:
+        event_ids = sorted({int(value) for value in request.args["ids"].split(",")})
+    except (KeyError, ValueError):
+        return (
+            jsonify({"message": "ids must be a comma-separated list of event ids"}),
+            400,
+        )
+    if len(event_ids) > MAX_BATCH_EVENT_IDS:
+        return (
+            jsonify(
+                {"message": f"At most {MAX_BATCH_EVENT_IDS} event ids per request"}
+            ),
+            400,
+        )
+
+    etag = resource_etag([EVENTS_KEY] + [registrants_key(i) for i in event_ids])
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    # A single outer join: unknown ids are left out, events without
+    # registrants come back with an empty list.
+    rows = (
+        db.session.query(Event.id, User)
+        .outerjoin(Registration, Registration.event_id == Event.id)
+        .outerjoin(User, User.id == Registration.user_id)
+        .filter(Event.id.in_(event_ids))
+    )
+    registrants = {}
+    for event_id, user in rows:
+        users = registrants.setdefault(str(event_id), [])
+        if user is not None:
+            users.append(_registrant_to_dict(user))
+
+    response = jsonify(registrants=registrants)
+    response.set_etag(etag)
+    return response, 200
 
 
 @bp.route("/events/<int:event_id>/registrants", methods=["GET"])
 def get_registrants(event_id):
+    stream = wants_ndjson()
+    if not stream:
+        etag = resource_etag([registrants_key(event_id)])
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
     event = Event.query.get(event_id)
     if not event:
         return jsonify({"message": "Event not found"}), 404
 
-    registrants = [
-        {
-            "id": reg.user.id,
-            "firstName": reg.user.first_name,
-            "lastName": reg.user.last_name,
-            "email": reg.user.email,
-            "phoneNumber": reg.user.phone_number,
-            "role": reg.user.role,
-        }
-        for reg in event.registrations
-    ]
+    users = User.query.join(Registration).filter(Registration.event_id == event_id)
+    if stream:
+        return ndjson_response(users, _registrant_to_dict)
 
-    return jsonify(registrants=registrants), 200
+    registrants = [_registrant_to_dict(user) for user in users]
+
+    response = jsonify(registrants=registrants)
+    response.set_etag(etag)
+    response.vary.add("Accept")
+    return response, 200
 
 
 @bp.route("/events/<int:event_id>/registrations/pending", methods=["GET"])
 @jwt_required()
 @admin_required
 def get_event_pending_registrations(event_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-
-    if not user or user.permission_type not in ["admin", "super_admin"]:
-        return jsonify({"message": "Admin access required"}), 403
-
     event = Event.query.get(event_id)
     if not event:
         return jsonify({"message": "Event not found"}), 404
@@ -1,17 +1,61 @@
-from flask import Blueprint, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import current_user, jwt_required, get_jwt_identity
 from app.models import User, Event, Registration
 from app import db
 from datetime import datetime, timedelta
-from app.utils.autoapprove import should_autoapprove_event
+from sqlalchemy import case, delete, select
+from sqlalchemy.orm import contains_eager
+from app.utils.autoapprove import (
+    approve_if_staffed,
+    approve_staffed_events,
+    claim_staffing_slot,
+    claim_staffing_slots,
+    demote_unstaffed_events,
+    release_staffing_slots,
+    should_autoapprove_event,
+)
+from app.utils.pagination import keyset_page, parse_limit
+from app.utils.serializers import event_load_options, event_to_dict, parse_fields
+from app.utils.sql import dialect_insert
+from app.utils.waitlist import (
+    join_waitlist,
+    join_waitlists,
+    leave_waitlist,
+    leave_waitlists,
+    promote_from_waitlist,
+    promote_next_in_line,
+)
+from app.utils.versions import (
+    EVENTS_KEY,
+    event_key,
+    mark_changed,
+    registrants_key,
+)
 
 bp = Blueprint("user", __name__)
 
+MAX_BULK_EVENT_IDS = 100
+
+MY_EVENT_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "date",
+    "channel",
+    "language",
+    "location",
+    "status",
+    "group_size",
+    "num_instructors_needed",
+    "num_representatives_needed",
+    "contact_phone_number",
+)
+
 
 @bp.route("/me", methods=["GET"])
 @jwt_required()
 def get_current_user():
-    user = User.query.get(get_jwt_identity())
+    user = current_user
     if not user:
         return jsonify({"message": "User not found"}), 404
 
@@ -35,31 +79,85 @@ def get_current_user():
 @jwt_required()
 def register_for_event(event_id):
     user_id = get_jwt_identity()
+    connection = db.session.connection()
+    registrations = Registration.__table__
 
-    event = Event.query.filter_by(id=event_id).with_for_update().first()
+    # Admission: a conditional UPDATE on the event row claims a slot for the
+    # user's role, comparing the staffing counter to the role's capacity.
+    if not claim_staffing_slot(connection, event_id, user_id):
+        return _waitlist(event_id, user_id)
 
-    if not event:
-        return jsonify({"message": "Event not found"}), 404
+    # One INSERT ... SELECT: the user's role decides the status and the
+    # (user_id, event_id) primary key rejects duplicates.
+    source = (
+        select(
+            User.id,
+            Event.id,
+            case((User.role == "Guide", "pending"), else_="approved"),
+        )
+        .select_from(User)
+        .join(Event, Event.id == event_id)
+        .where(User.id == user_id)
+    )
+    inserted = connection.execute(
+        dialect_insert(connection, registrations)
+        .from_select(["user_id", "event_id", "status"], source)
+        .on_conflict_do_nothing()
+        .returning(registrations.c.status)
+    ).first()
 
-    if Registration.query.filter_by(user_id=user_id, event_id=event_id).first():
+    if inserted is None:
+        # Also undoes the slot claimed above.
+        db.session.rollback()
         return jsonify({"message": "Already registered"}), 400
 
-    user = User.query.get(user_id)
-    registration_status = "pending" if user.role == "Guide" else "approved"
+    registration_status = inserted.status
+    # A user who got in after waiting must not be promoted again later.
+    leave_waitlists(connection, [event_id], user_id)
+    changed = {registrants_key(event_id)}
+    if approve_if_staffed(connection, event_id):
+        changed |= {EVENTS_KEY, event_key(event_id)}
+    mark_changed(db.session, changed)
 
-    registration = Registration(
-        user_id=user_id, event_id=event_id, status=registration_status
+    db.session.commit()
+
+    return (
+        jsonify({"message": "Registered successfully", "status": registration_status}),
+        201,
     )
-    db.session.add(registration)
 
-    if should_autoapprove_event(event_id):
-        event.status = "approved"
 
+def _waitlist(event_id, user_id):
+    if not db.session.get(Event, event_id):
+        return jsonify({"message": "Event not found"}), 404
+    if db.session.get(Registration, (user_id, event_id)):
+        return jsonify({"message": "Already registered"}), 400
+
+    position = join_waitlist(event_id, user_id)
+    if position is None:
+        return jsonify({"message": "Already on the waitlist"}), 400
+    # A slot freed since the claim failed was offered to the waitlist before
+    # this entry existed; offer it again now that the entry is in the queue.
+    promoted = promote_from_waitlist(event_id)
+    if promoted and approve_if_staffed(db.session.connection(), event_id):
+        mark_changed(db.session, {EVENTS_KEY, event_key(event_id)})
+    own = next((reg for reg in promoted if str(reg.user_id) == str(user_id)), None)
     db.session.commit()
 
+    if own is not None:
+        return (
+            jsonify({"message": "Registered successfully", "status": own.status}),
+            201,
+        )
     return (
-        jsonify({"message": "Registered successfully", "status": registration_status}),
-        201,
+        jsonify(
+            {
+                "message": "Event is full, added to the waitlist",
+                "status": "waitlisted",
+                "position": position,
+            }
+        ),
+        202,
     )
 
 
@@ -75,49 +173,231 @@ def unregister_from_event(event_id):
     )
 
     if not registration:
+        if leave_waitlist(event_id, user_id):
+            db.session.commit()
+            return jsonify({"message": "Removed from waitlist"}), 200
         return jsonify({"message": "Not registered"}), 404
 
     db.session.delete(registration)
+    promoted = promote_from_waitlist(event_id)
 
-    if not should_autoapprove_event(event_id):
-        event = Event.query.get(event_id)
-        if event:
+    event = Event.query.get(event_id)
+    if event:
+        if not should_autoapprove_event(event_id):
             event.status = "pending"
-            db.session.add(event)
+        elif promoted:
+            event.status = "approved"
 
     db.session.commit()
 
     return jsonify({"message": "Unregistered successfully"}), 200
 
 
+def _bulk_event_ids():
+    data = request.get_json(silent=True) or {}
+    event_ids = data.get("event_ids")
+    if (
+        not isinstance(event_ids, list)
+        or not event_ids
+        or not all(isinstance(event_id, int) for event_id in event_ids)
+    ):
+        raise ValueError("event_ids must be a non-empty list of event ids")
+    if len(event_ids) > MAX_BULK_EVENT_IDS:
+        raise ValueError(f"At most {MAX_BULK_EVENT_IDS} event ids per request")
+    return sorted(set(event_ids))
+
+
+@bp.route("/me/registrations", methods=["POST"])
+@jwt_required()
+def register_for_events():
+    """Register for many events in one transaction with set-based statements."""
+    try:
+        event_ids = _bulk_event_ids()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    user_id = get_jwt_identity()
+    connection = db.session.connection()
+    role = current_user.role
+    status = "pending" if role == "Guide" else "approved"
+
+    known = dict(
+        db.session.query(Event.id, Registration.user_id)
+        .outerjoin(
+            Registration,
+            (Registration.event_id == Event.id) & (Registration.user_id == user_id),
+        )
+        .filter(Event.id.in_(event_ids))
+        .all()
+    )
+    open_ids = [i for i in event_ids if i in known and known[i] is None]
+
+    claimed = claim_staffing_slots(connection, open_ids, user_id, role)
+    admitted = set()
+    if claimed:
+        registrations = Registration.__table__
+        # A concurrent request may have registered the user since the lookup
+        # above; those rows are skipped and their slots handed back.
+        admitted = set(
+            connection.execute(
+                dialect_insert(connection, registrations)
+                .values(
+                    [
+                        {"user_id": user_id, "event_id": event_id, "status": status}
+                        for event_id in sorted(claimed)
+                    ]
+                )
+                .on_conflict_do_nothing()
+                .returning(registrations.c.event_id)
+            ).scalars()
+        )
+        release_staffing_slots(connection, claimed - admitted, role)
+        leave_waitlists(connection, sorted(admitted), user_id)
+    waitlisted = join_waitlists(
+        connection, [i for i in open_ids if i not in claimed], user_id
+    )
+    promoted = set()
+    if waitlisted:
+        # As in the single path: re-offer slots freed since the claim failed.
+        promoted = promote_next_in_line(connection, waitlisted, role)
+    if promoted:
+        promoted_to_user = set(
+            connection.execute(
+                select(Registration.event_id).where(
+                    Registration.user_id == user_id,
+                    Registration.event_id.in_(promoted),
+                )
+            ).scalars()
+        )
+        admitted |= promoted_to_user
+        waitlisted -= promoted_to_user
+    staffed = admitted | promoted
+    approved = approve_staffed_events(connection, staffed) if staffed else set()
+
+    if staffed:
+        changed = {registrants_key(i) for i in staffed}
+        if approved:
+            changed |= {EVENTS_KEY} | {event_key(i) for i in approved}
+        mark_changed(db.session, changed)
+    db.session.commit()
+
+    results = {}
+    for event_id in event_ids:
+        if event_id not in known:
+            results[str(event_id)] = "not_found"
+        elif event_id in admitted:
+            results[str(event_id)] = status
+        elif known[event_id] is not None or event_id in claimed:
+            results[str(event_id)] = "already_registered"
+        elif event_id in waitlisted:
+            results[str(event_id)] = "waitlisted"
+        else:
+            results[str(event_id)] = "already_waitlisted"
+    return jsonify(results=results), 200
+
+
+@bp.route("/me/registrations", methods=["DELETE"])
+@jwt_required()
+def unregister_from_events():
+    """Unregister from (or leave the waitlist of) many events in one transaction."""
+    try:
+        event_ids = _bulk_event_ids()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    user_id = get_jwt_identity()
+    connection = db.session.connection()
+    role = current_user.role
+    registrations = Registration.__table__
+
+    removed = set(
+        connection.execute(
+            delete(registrations)
+            .where(
+                registrations.c.user_id == user_id,
+                registrations.c.event_id.in_(event_ids),
+            )
+            .returning(registrations.c.event_id)
+        ).scalars()
+    )
+    left = leave_waitlists(
+        connection, [i for i in event_ids if i not in removed], user_id
+    )
+
+    if removed:
+        release_staffing_slots(connection, removed, role)
+        promoted = promote_next_in_line(connection, removed, role)
+        # Same rule as the single unregister: unstaffed events go back to
+        # pending, events refilled from the waitlist are approved again.
+        changed_status = demote_unstaffed_events(connection, removed)
+        if promoted:
+            changed_status |= approve_staffed_events(connection, promoted)
+
+        changed = {registrants_key(i) for i in removed}
+        if changed_status:
+            changed |= {EVENTS_KEY} | {event_key(i) for i in changed_status}
+        mark_changed(db.session, changed)
+    db.session.commit()
+
+    results = {}
+    for event_id in event_ids:
+        if event_id in removed:
+            results[str(event_id)] = "unregistered"
+        elif event_id in left:
+            results[str(event_id)] = "left_waitlist"
+        else:
+            results[str(event_id)] = "not_registered"
+    return jsonify(results=results), 200
+
+
 @bp.route("/me/events", methods=["GET"])
 @jwt_required()
 def get_my_events():
-    yesterday = datetime.now() - timedelta(days=1)
     user_id = get_jwt_identity()
-    registrations = (
-        Registration.query.filter_by(user_id=user_id)
-        .filter(Event.date >= yesterday)
-        .all()
+    try:
+        fields = parse_fields(request.args.get("fields"), default=MY_EVENT_FIELDS)
+        limit = parse_limit(request.args.get("limit"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        date_from = (
+            datetime.fromisoformat(request.args["from"])
+            if "from" in request.args
+            else datetime.now() - timedelta(days=1)
+        )
+        date_to = (
+            datetime.fromisoformat(request.args["to"]) if "to" in request.args else None
+        )
+    except ValueError:
+        return jsonify({"message": "Invalid date format. Use ISO 8601."}), 400
+
+    # Explicit join: the (user_id, event_id) primary key finds the user's
+    # registrations, Event's (date, id) index orders and bounds them.
+    query = (
+        Registration.query.filter(Registration.user_id == user_id)
+        .join(Registration.event)
+        .filter(Event.date >= date_from)
+        .options(contains_eager(Registration.event).options(event_load_options(fields)))
     )
+    if date_to is not None:
+        query = query.filter(Event.date < date_to)
+
+    try:
+        registrations, next_cursor = keyset_page(
+            query,
+            Event.date,
+            Event.id,
+            request.args.get("cursor"),
+            limit,
+            row_key=lambda reg: (reg.event.date, reg.event.id),
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
     events = [
-        {
-            "id": reg.event.id,
-            "title": reg.event.title,
-            "description": reg.event.description,
-            "date": reg.event.date.isoformat(),
-            "channel": reg.event.channel,
-            "language": reg.event.language,
-            "location": reg.event.location,
-            "status": reg.event.status,
-            "group_size": reg.event.group_size,
-            "num_instructors_needed": reg.event.num_instructors_needed,
-            "num_representatives_needed": reg.event.num_representatives_needed,
-            "registration_status": reg.status,
-            "contact_phone_number": reg.event.contact_phone_number,
-        }
+        {**event_to_dict(reg.event, fields), "registration_status": reg.status}
         for reg in registrations
     ]
 
-    return jsonify(events=events), 200
+    return jsonify(events=events, next_cursor=next_cursor), 200
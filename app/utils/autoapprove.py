@@ -1,25 +1,368 @@
-from app.models import Event, Registration
+from datetime import datetime
+
+from sqlalchemy import and_, case, event, func, inspect, or_, select, true, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from app import db
+from app.models import Event, Registration, User
+from app.utils.versions import EVENTS_KEY, event_key, mark_changed, registrants_key
+
+# Event counter column maintained for each registrant role.
+ROLE_COUNTERS = {
+    "Family Representative": "num_family_reps_registered",
+    "Guide": "num_guides_registered",
+}
+
+# Event column capping the counter of each role. A capacity of 0 means the
+# role is not limited.
+ROLE_CAPACITIES = {
+    "Family Representative": "num_representatives_needed",
+    "Guide": "num_instructors_needed",
+}
 
 
 def should_autoapprove_event(event_id):
-    event = Event.query.get(event_id)
-    if not event:
+    # Querying (rather than Event.query.get) autoflushes pending
+    # registrations, so the counters read here include them.
+    row = (
+        db.session.query(
+            Event.num_family_reps_registered,
+            Event.num_guides_registered,
+            Event.num_instructors_needed,
+        )
+        .filter(Event.id == event_id)
+        .first()
+    )
+    if not row:
         return False
 
-    regs = Registration.query.filter_by(event_id=event_id).all()
-    if not regs:
+    family_rep_count, guide_count, num_instructors_needed = row
+    if family_rep_count + guide_count == 0:
         return False
 
-    family_rep_count = 0
-    guide_count = 0
-    for reg in regs:
-        if reg.user and reg.user.role == "Family Representative":
-            family_rep_count += 1
-        elif reg.user and reg.user.role == "Guide":
-            guide_count += 1
-
     if family_rep_count >= 1:
         return True
-    if guide_count >= event.num_instructors_needed:
+    if guide_count >= num_instructors_needed:
         return True
     return False
+
+
+def adjust_staffing_counters(connection, event_id, role, delta):
+    """Atomically add ``delta`` to the event's counter for ``role``."""
+    column = ROLE_COUNTERS.get(role)
+    if column is None:
+        return
+    counter = getattr(Event.__table__.c, column)
+    connection.execute(
+        update(Event.__table__)
+        .where(Event.__table__.c.id == event_id)
+        .values({column: counter + delta})
+    )
+
+
+def _role_increments(table, role, delta):
+    return {
+        column: getattr(table.c, column) + case((role == name, delta), else_=0)
+        for name, column in ROLE_COUNTERS.items()
+    }
+
+
+def claim_staffing_slot(connection, event_id, user_id):
+    """Count a new registration only if the user's role still has room.
+
+    The capacity comparison and the increment are one conditional UPDATE on
+    the event row, so admission is O(1) and race-free. Returns False when the
+    event is full for that role (or does not exist).
+    """
+    table = Event.__table__
+    role = select(User.role).where(User.id == user_id).scalar_subquery()
+    has_room = case(
+        *[
+            (
+                role == name,
+                or_(
+                    getattr(table.c, capacity) == 0,
+                    getattr(table.c, ROLE_COUNTERS[name]) < getattr(table.c, capacity),
+                ),
+            )
+            for name, capacity in ROLE_CAPACITIES.items()
+        ],
+        else_=true(),
+    )
+    result = connection.execute(
+        update(table)
+        .where(table.c.id == event_id, has_room)
+        .values(_role_increments(table, role, 1))
+    )
+    return result.rowcount > 0
+
+
+def autoapprove_predicate(family_reps, guides, instructors_needed):
+    """SQL form of should_autoapprove_event over any per-event role counts."""
+    return or_(
+        family_reps >= 1,
+        and_(guides > 0, guides >= instructors_needed),
+    )
+
+
+def staffed_condition(table=Event.__table__):
+    """The auto-approve rule over the counter columns."""
+    c = table.c
+    return autoapprove_predicate(
+        c.num_family_reps_registered, c.num_guides_registered, c.num_instructors_needed
+    )
+
+
+def claim_staffing_slots(connection, event_ids, user_id, role):
+    """Set-based claim_staffing_slot for one user over many events.
+
+    Events the user is already registered for are skipped. Returns the ids of
+    the events where a slot was claimed.
+    """
+    table = Event.__table__
+    registrations = Registration.__table__
+    conditions = [
+        table.c.id.in_(event_ids),
+        ~select(registrations.c.event_id)
+        .where(
+            registrations.c.event_id == table.c.id,
+            registrations.c.user_id == user_id,
+        )
+        .exists(),
+    ]
+    values = {}
+    if role in ROLE_COUNTERS:
+        counter = getattr(table.c, ROLE_COUNTERS[role])
+        capacity = getattr(table.c, ROLE_CAPACITIES[role])
+        conditions.append(or_(capacity == 0, counter < capacity))
+        values[ROLE_COUNTERS[role]] = counter + 1
+    else:
+        # Uncounted role: a no-op SET still locks and returns the rows.
+        values["status"] = table.c.status
+    result = connection.execute(
+        update(table).where(*conditions).values(values).returning(table.c.id)
+    )
+    return set(result.scalars())
+
+
+def release_staffing_slots(connection, event_ids, role):
+    """Decrement the ``role`` counter of every event in ``event_ids``."""
+    if role not in ROLE_COUNTERS or not event_ids:
+        return
+    table = Event.__table__
+    counter = getattr(table.c, ROLE_COUNTERS[role])
+    connection.execute(
+        update(table)
+        .where(table.c.id.in_(event_ids))
+        .values({ROLE_COUNTERS[role]: counter - 1})
+    )
+
+
+def approve_staffed_events(connection, event_ids):
+    """Approve, in one UPDATE, every listed event whose counters satisfy the rule.
+
+    Returns the ids of the events whose status changed.
+    """
+    table = Event.__table__
+    result = connection.execute(
+        update(table)
+        .where(
+            table.c.id.in_(event_ids),
+            table.c.status != "approved",
+            staffed_condition(table),
+        )
+        .values(status="approved")
+        .returning(table.c.id)
+    )
+    return set(result.scalars())
+
+
+def approve_if_staffed(connection, event_id):
+    """Approve the event in one UPDATE if its counters satisfy the rule.
+
+    Returns True when the status changed.
+    """
+    return bool(approve_staffed_events(connection, [event_id]))
+
+
+def demote_unstaffed_events(connection, event_ids):
+    """Set every listed event that no longer satisfies the rule back to pending.
+
+    Returns the ids of the events whose status changed.
+    """
+    table = Event.__table__
+    result = connection.execute(
+        update(table)
+        .where(
+            table.c.id.in_(event_ids),
+            table.c.status != "pending",
+            ~staffed_condition(table),
+        )
+        .values(status="pending")
+        .returning(table.c.id)
+    )
+    return set(result.scalars())
+
+
+def _registrant_role(session, registration):
+    user = registration.__dict__.get("user") or session.get(User, registration.user_id)
+    return user.role if user else None
+
+
+def _committed_role(user):
+    history = inspect(user).attrs.role.history
+    return history.deleted[0] if history.deleted else user.role
+
+
+@event.listens_for(Session, "before_flush")
+def _follow_registrants(session, flush_context, instances):
+    """Adjust counters for registrations that change without a Registration write.
+
+    A deleted user's registrations go through ON DELETE CASCADE, and a role
+    change moves every registration of the user to another counter. The
+    affected events then get the status the auto-approve rule gives.
+    """
+    deleted = [obj for obj in session.deleted if isinstance(obj, User)]
+    moved = [
+        obj
+        for obj in session.dirty
+        if isinstance(obj, User) and inspect(obj).attrs.role.history.deleted
+    ]
+    if not deleted and not moved:
+        return
+
+    # Registrations deleted through the ORM are counted by the after_flush hook.
+    handled = {
+        (obj.user_id, obj.event_id)
+        for obj in session.deleted
+        if isinstance(obj, Registration)
+    }
+    connection = session.connection()
+    table = Event.__table__
+    affected = set()
+    for user in deleted + moved:
+        event_ids = {
+            event_id
+            for event_id in connection.execute(
+                select(Registration.event_id).where(Registration.user_id == user.id)
+            ).scalars()
+            if (user.id, event_id) not in handled
+        }
+        if not event_ids:
+            continue
+        release_staffing_slots(connection, event_ids, _committed_role(user))
+        if user in moved and user not in deleted and user.role in ROLE_COUNTERS:
+            counter = getattr(table.c, ROLE_COUNTERS[user.role])
+            connection.execute(
+                update(table)
+                .where(table.c.id.in_(event_ids))
+                .values({ROLE_COUNTERS[user.role]: counter + 1})
+            )
+        affected |= event_ids
+    if not affected:
+        return
+
+    changed = demote_unstaffed_events(connection, affected)
+    changed |= approve_staffed_events(connection, affected)
+    keys = {registrants_key(event_id) for event_id in affected}
+    if changed:
+        keys |= {EVENTS_KEY} | {event_key(event_id) for event_id in changed}
+    mark_changed(session, keys)
+    session.info.setdefault("stale_counters", set()).update(affected)
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_staffing_counters(session, flush_context):
+    changes = [(reg, 1) for reg in session.new if isinstance(reg, Registration)]
+    changes += [(reg, -1) for reg in session.deleted if isinstance(reg, Registration)]
+    if not changes:
+        return
+
+    connection = session.connection()
+    for registration, delta in changes:
+        adjust_staffing_counters(
+            connection,
+            registration.event_id,
+            _registrant_role(session, registration),
+            delta,
+        )
+    session.info.setdefault("stale_counters", set()).update(
+        registration.event_id for registration, _ in changes
+    )
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_stale_counters(session, flush_context):
+    for event_id in session.info.pop("stale_counters", ()):
+        loaded = session.identity_map.get(identity_key(Event, event_id))
+        if loaded is not None:
+            session.expire(loaded, list(ROLE_COUNTERS.values()))
+
+
+def _registered_count(role):
+    return (
+        select(func.count())
+        .select_from(Registration)
+        .join(User, User.id == Registration.user_id)
+        .where(Registration.event_id == Event.id, User.role == role)
+        .scalar_subquery()
+    )
+
+
+def reconcile_staffing_counters(event_ids=None):
+    """Rebuild the denormalized counters from the registrations table.
+
+    Returns the number of events updated. The caller commits.
+    """
+    stmt = update(Event).values(
+        {column: _registered_count(role) for role, column in ROLE_COUNTERS.items()}
+    )
+    if event_ids is not None:
+        stmt = stmt.where(Event.id.in_(event_ids))
+    result = db.session.execute(stmt, execution_options={"synchronize_session": False})
+    return result.rowcount
+
+
+def reevaluate_event_statuses(
+    event_ids=None, upcoming_only=False, recount=False, demote=True
+):
+    """Set events' status to what the auto-approve rule gives, in one UPDATE.
+
+    Covers ``event_ids``, or every event when None, optionally only those not
+    yet past. ``recount`` evaluates the rule over registration aggregates
+    instead of the staffing counters. Without ``demote``, only pending events
+    that are staffed change (to approved), so approvals an admin made by hand
+    stand. Returns the ids of the events whose status changed. The caller
+    commits.
+    """
+    if recount:
+        family_reps = _registered_count("Family Representative")
+        guides = _registered_count("Guide")
+    else:
+        family_reps = Event.num_family_reps_registered
+        guides = Event.num_guides_registered
+    staffed = autoapprove_predicate(family_reps, guides, Event.num_instructors_needed)
+    if demote:
+        status = case((staffed, "approved"), else_="pending")
+        stmt = update(Event).where(Event.status != status).values(status=status)
+    else:
+        stmt = (
+            update(Event)
+            .where(Event.status == "pending", staffed)
+            .values(status="approved")
+        )
+    if event_ids is not None:
+        stmt = stmt.where(Event.id.in_(event_ids))
+    if upcoming_only:
+        stmt = stmt.where(Event.date >= datetime.now())
+    result = db.session.execute(
+        stmt.returning(Event.id), execution_options={"synchronize_session": False}
+    )
+    changed = set(result.scalars())
+
+    for event_id in changed:
+        loaded = db.session.identity_map.get(identity_key(Event, event_id))
+        if loaded is not None:
+            db.session.expire(loaded, ["status"])
+    return changed
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import deque
+
+from flask import current_app, has_app_context, json
+from sqlalchemy import select
+
+from app import db
+from app.models import Event
+from app.utils.versions import changed_event_ids, on_commit
+
+# Fields of an event pushed to stream subscribers when any of them changes.
+STREAM_FIELDS = ("status", "num_family_reps_registered", "num_guides_registered")
+
+# Reconnection delay suggested to EventSource clients, in milliseconds.
+STREAM_RETRY_MS = 5000
+
+
+class Broadcaster:
+    """In-process fan-out of event change messages to stream subscribers.
+
+    Keeps the last ``history`` messages so a reconnecting client can resume
+    from its Last-Event-ID. Ids start at the creation time in milliseconds,
+    so ids handed out by an earlier process are recognised as stale.
+    Subscribers block on a condition variable between messages and cost no
+    database work, but each holds a server thread for as long as it stays
+    connected; ``max_subscribers`` (0 for no limit) bounds how many do.
+    """
+
+    def __init__(self, history=1000, max_subscribers=0):
+        self._messages = deque(maxlen=history)
+        self._condition = threading.Condition()
+        self._last_id = int(time.time() * 1000)
+        # Clients that last saw an id before this one may have missed a change.
+        self._gap = self._last_id
+        self._published = {}
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+
+    @property
+    def last_id(self):
+        with self._condition:
+            return self._last_id
+
+    def subscribe(self):
+        """Count a new subscriber. Returns False, counting nothing, when full."""
+        with self._condition:
+            if self.max_subscribers and self.subscribers >= self.max_subscribers:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+    def mark_gap(self):
+        """Record that changes happened without being published."""
+        with self._condition:
+            # The missed change takes an id of its own, so clients that
+            # connect from now on are not mistaken for ones that missed it.
+            self._last_id += 1
+            self._gap = self._last_id
+            self._published.clear()
+
+    def publish(self, data):
+        """Queue ``data`` for subscribers unless it repeats the event's last message.
+
+        Returns the message id, or None when nothing was published.
+        """
+        with self._condition:
+            if self._published.get(data["id"]) == data:
+                return None
+            if len(self._messages) == self._messages.maxlen:
+                # Only events with a message still in the history are
+                # remembered, which bounds _published by ``history``.
+                _, evicted = self._messages[0]
+                if self._published.get(evicted["id"]) is evicted:
+                    del self._published[evicted["id"]]
+            self._published[data["id"]] = data
+            self._last_id += 1
+            self._messages.append((self._last_id, data))
+            self._condition.notify_all()
+            return self._last_id
+
+    def since(self, last_id, timeout):
+        """Messages after ``last_id``, waiting up to ``timeout`` seconds for one.
+
+        Returns None when ``last_id`` is too old (or too new) to resume from,
+        in which case the client has to reload its state.
+        """
+        with self._condition:
+            if not self._resumable(last_id):
+                return None
+            if last_id == self._last_id:
+                self._condition.wait(timeout)
+            return [(i, data) for i, data in self._messages if i > last_id]
+
+    def _resumable(self, last_id):
+        if last_id > self._last_id or last_id < self._gap:
+            return False
+        oldest = self._messages[0][0] if self._messages else self._last_id + 1
+        return last_id >= oldest - 1
+
+
+def sse_stream(broadcaster, last_id, heartbeat):
+    """Generate a text/event-stream of change messages after ``last_id``.
+
+    The caller holds the subscription (see Broadcaster.subscribe) and releases
+    it when the response closes, which also covers a stream never started.
+    """
+    if last_id is None:
+        last_id = broadcaster.last_id
+    yield f"retry: {STREAM_RETRY_MS}\n\n"
+    while True:
+        messages = broadcaster.since(last_id, heartbeat)
+        if messages is None:
+            last_id = broadcaster.last_id
+            yield f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+        elif not messages:
+            yield ": keepalive\n\n"
+        for message_id, data in messages or ():
+            yield f"id: {message_id}\nevent: change\ndata: {json.dumps(data)}\n\n"
+            last_id = message_id
+
+
+@on_commit
+def _publish_event_changes(keys):
+    if not has_app_context():
+        return
+    broadcaster = current_app.extensions.get("event_broadcaster")
+    event_ids = changed_event_ids(keys)
+    if broadcaster is None or not event_ids:
+        return
+    if not broadcaster.subscribers:
+        # Nobody to tell; resuming clients will be asked to reload instead.
+        broadcaster.mark_gap()
+        return
+
+    columns = [getattr(Event, field) for field in STREAM_FIELDS]
+    # The committing session cannot run SQL from its after_commit hook.
+    with db.engine.connect() as connection:
+        rows = connection.execute(
+            select(Event.id, *columns).where(Event.id.in_(event_ids))
+        ).all()
+    found = set()
+    for row in rows:
+        found.add(row.id)
+        broadcaster.publish(
+            {"id": row.id, **{field: getattr(row, field) for field in STREAM_FIELDS}}
+        )
+    for event_id in sorted(event_ids - found):
+        broadcaster.publish({"id": event_id, "deleted": True})
@@ -1,15 +1,17 @@
 from functools import wraps
 from flask import jsonify
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
-from app.models import User
+from flask_jwt_extended import get_current_user, get_jwt, verify_jwt_in_request
 
 
 def _check_permission(required_permissions):
     """Helper function to check user permissions."""
     verify_jwt_in_request()
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user or user.permission_type not in required_permissions:
+    # Tokens issued by login carry the permission as a claim, so this needs no
+    # query; revoked tokens were already rejected by verify_jwt_in_request.
+    permission_type = get_jwt().get("permission_type")
+    if permission_type is None:
+        permission_type = get_current_user().permission_type
+    if permission_type not in required_permissions:
         return (
             jsonify(message="Forbidden: You do not have the necessary permissions."),
             403,
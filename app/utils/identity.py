@@ -0,0 +1,98 @@
+import threading
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from app import db
+from app.models import User
+from app.utils.cache import TTLCache
+
+# Only what authorization reads is cached; the password hash and profile
+# fields stay unloaded and a view that needs them loads them on access.
+_USER_COLUMNS = ("id", "token_version", "permission_type", "role")
+
+
+class IdentityCache:
+    """Bounded cross-request cache of user rows keyed on (user_id, token_version).
+
+    Holds plain column values rather than ORM instances, so entries do not
+    depend on the session that loaded them. Every invalidation bumps a
+    generation counter; a lookup that raced with one does not store its row.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def get(self, user_id, token_version):
+        return self._cache.get((str(user_id), token_version))
+
+    def set(self, user_id, token_version, row, generation):
+        with self._lock:
+            if generation == self.generation:
+                self._cache.set((str(user_id), token_version), row)
+
+    def invalidate(self, user_id, token_versions):
+        with self._lock:
+            self.generation += 1
+            for token_version in token_versions:
+                self._cache.delete((str(user_id), token_version))
+
+    def stats(self):
+        return self._cache.stats()
+
+
+def _identity_cache():
+    return current_app.extensions["identity_cache"]
+
+
+def resolve_user(user_id, token_version):
+    """Return the user a token identifies, or None if it is unknown or revoked.
+
+    Within a request the session's identity map memoizes the user, so the
+    JWT user lookup, permission decorators and views share one instance.
+    Across requests the row comes from the identity cache and is attached to
+    the session without a query. Only a cache miss reads the database.
+    """
+    session = db.session
+    user = session.identity_map.get(identity_key(User, int(user_id)))
+    if user is None or "token_version" in inspect(user).unloaded:
+        cache = _identity_cache()
+        row = cache.get(user_id, token_version)
+        if row is not None:
+            detached = User(**row)
+            make_transient_to_detached(detached)
+            user = session.merge(detached, load=False)
+        else:
+            generation = cache.generation
+            user = session.get(User, int(user_id))
+            if user is None:
+                return None
+            remember_user(user, generation)
+    return user if user.token_version == token_version else None
+
+
+def remember_user(user, generation=None):
+    """Put a freshly loaded user into the identity cache (e.g. at login)."""
+    cache = _identity_cache()
+    cache.set(
+        user.id,
+        user.token_version,
+        {column: getattr(user, column) for column in _USER_COLUMNS},
+        cache.generation if generation is None else generation,
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_changed_users(session, flush_context):
+    if not has_app_context() or "identity_cache" not in current_app.extensions:
+        return
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            # Covers logout (token_version) and set_user_permission alike.
+            history = inspect(obj).attrs.token_version.history
+            versions = set(history.deleted or ()) | {obj.token_version}
+            _identity_cache().invalidate(obj.id, versions)
@@ -1,11 +1,39 @@
-from flask_jwt_extended import JWTManager
+from flask import current_app
+from flask_jwt_extended.exceptions import UserLookupError
+from werkzeug.local import LocalProxy
+
 from app import jwt
-from app.models import User
+from app.utils.identity import resolve_user
+
+
+def _token_version(jwt_data):
+    # Every token issued by login carries token_version; 0 is its default.
+    return jwt_data.get("token_version", 0)
+
+
+@jwt.token_in_blocklist_loader
+def token_revoked_callback(_jwt_header, jwt_data):
+    revocations = current_app.extensions["revocations"]
+    return revocations.is_revoked(jwt_data.get("sub"), _token_version(jwt_data))
 
 
 @jwt.user_lookup_loader
-def user_lookup_callback(_jwt_header, jwt_data):
+def user_lookup_callback(jwt_header, jwt_data):
     identity = jwt_data.get("sub")
-    token_version = jwt_data.get("token_version")
-    user = User.query.get(identity)
-    return user if user and user.token_version == token_version else None
+    token_version = _token_version(jwt_data)
+
+    resolved = []
+
+    def load():
+        if not resolved:
+            user = resolve_user(identity, token_version)
+            if user is None:
+                raise UserLookupError(
+                    f"Error loading the user {identity}", jwt_header, jwt_data
+                )
+            resolved.append(user)
+        return resolved[0]
+
+    # Resolved on first use, so views that only need the token's claims
+    # (e.g. the admin decorators) never touch the users table.
+    return LocalProxy(load)
@@ -0,0 +1,195 @@
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from flask_mailman import EmailMessage
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from app import db, mail
+from app.models import OutboxMessage
+
+
+def enqueue_mail(session, recipient, subject, body):
+    """Add an email to the outbox; it is sent only if the transaction commits."""
+    session.add(OutboxMessage(recipient=recipient, subject=subject, body=body))
+    session.info["outbox_pending"] = True
+
+
+def retry_delay(attempts, base, cap=3600):
+    """Exponential backoff: ``base`` seconds after the first failure, doubling."""
+    return min(cap, base * 2 ** (attempts - 1))
+
+
+def _claim_due(batch_size, max_attempts, lease, now):
+    """Claim up to ``batch_size`` due messages for this sender.
+
+    Pushing next_attempt_at past the lease keeps other senders (threads or
+    processes) from picking the same messages while these are in flight.
+    """
+    due = (OutboxMessage.next_attempt_at <= now) & (
+        OutboxMessage.attempts < max_attempts
+    )
+    ids = db.session.scalars(
+        select(OutboxMessage.id)
+        .where(due)
+        .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+        .limit(batch_size)
+    ).all()
+    if not ids:
+        return []
+    claimed = db.session.scalars(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(ids), due)
+        .values(next_attempt_at=now + timedelta(seconds=lease))
+        .returning(OutboxMessage.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return db.session.scalars(
+        select(OutboxMessage)
+        .where(OutboxMessage.id.in_(claimed))
+        .order_by(OutboxMessage.id)
+    ).all()
+
+
+def has_undelivered(max_attempts):
+    """Return whether any outbox message still has attempts left, due or not."""
+    return (
+        db.session.scalar(
+            select(OutboxMessage.id)
+            .where(OutboxMessage.attempts < max_attempts)
+            .limit(1)
+        )
+        is not None
+    )
+
+
+def deliver_pending(now=None):
+    """Send one batch of due outbox messages over a single SMTP connection.
+
+    Sent messages are deleted; failed ones are retried with exponential
+    backoff until MAIL_OUTBOX_MAX_ATTEMPTS. A message that runs out of
+    attempts keeps its recipient and last_error for inspection, but its body
+    (which may hold a temporary password) is erased. Returns (sent, failed).
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    messages = _claim_due(
+        config["MAIL_OUTBOX_BATCH_SIZE"],
+        config["MAIL_OUTBOX_MAX_ATTEMPTS"],
+        config["MAIL_OUTBOX_LEASE_SECONDS"],
+        now,
+    )
+    if not messages:
+        return 0, 0
+
+    sent, failed = [], []
+    connection = mail.get_connection()
+    try:
+        for message in messages:
+            try:
+                connection.open()
+                EmailMessage(
+                    message.subject,
+                    message.body,
+                    to=[message.recipient],
+                    connection=connection,
+                ).send()
+                sent.append(message.id)
+            except Exception as e:
+                failed.append((message, e))
+                # The connection may be unusable now; reconnect for the next one.
+                connection.close()
+    finally:
+        connection.close()
+
+    if sent:
+        db.session.execute(
+            delete(OutboxMessage)
+            .where(OutboxMessage.id.in_(sent))
+            .execution_options(synchronize_session=False)
+        )
+    for message, error in failed:
+        message.attempts += 1
+        message.last_error = str(error)
+        message.next_attempt_at = now + timedelta(
+            seconds=retry_delay(message.attempts, config["MAIL_OUTBOX_RETRY_SECONDS"])
+        )
+        if message.attempts >= config["MAIL_OUTBOX_MAX_ATTEMPTS"]:
+            message.body = ""
+            current_app.logger.error(
+                "Giving up on outbox message %s after %s attempts: %s",
+                message.id,
+                message.attempts,
+                error,
+            )
+    db.session.commit()
+    return len(sent), len(failed)
+
+
+class OutboxSender:
+    """Background thread draining the outbox.
+
+    Started on the first wake-up: at app startup when earlier processes left
+    undelivered mail, otherwise on the first commit that queues mail. Between
+    batches it sleeps for ``poll_interval`` seconds, so retries and messages
+    queued by other processes are still picked up.
+    """
+
+    def __init__(self, app, poll_interval=30):
+        self.app = app
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="mail-outbox", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    # A full batch suggests more is due; go again right away.
+                    while (
+                        sum(deliver_pending())
+                        == self.app.config["MAIL_OUTBOX_BATCH_SIZE"]
+                        and not self._stop.is_set()
+                    ):
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.exception("Mail outbox delivery failed: %s", e)
+            self._wakeup.wait(self.poll_interval)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_sender(session):
+    if not session.info.pop("outbox_pending", False) or not has_app_context():
+        return
+    sender = current_app.extensions.get("mail_outbox_sender")
+    if sender is not None:
+        sender.wake()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_wakeup(session, previous_transaction):
+    session.info.pop("outbox_pending", None)
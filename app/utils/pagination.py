@@ -0,0 +1,68 @@
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(date, row_id):
+    """Encode the (date, id) sort key of the last row on a page."""
+    raw = f"{date.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor. Raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_part, id_part = (
+            base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def parse_limit(value):
+    """Parse the ?limit= argument, clamped to MAX_PAGE_SIZE."""
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be a positive integer")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def after_cursor(query, date_column, id_column, cursor):
+    """Restrict a query to rows strictly after ``cursor``, ordered by (date, id)."""
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(tuple_(date_column, id_column) > (cursor_date, cursor_id))
+    return query.order_by(date_column, id_column)
+
+
+def keyset_page(query, date_column, id_column, cursor, limit, row_key=None):
+    """Return (rows, next_cursor) for a query ordered by (date, id).
+
+    Rows strictly after the cursor are fetched, one extra row is read to
+    detect whether another page exists. ``row_key`` extracts the (date, id)
+    sort key from a row when the columns do not live on the row itself.
+    """
+    query = after_cursor(query, date_column, id_column, cursor)
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    if row_key is None:
+        row_key = lambda row: (
+            getattr(row, date_column.key),
+            getattr(row, id_column.key),
+        )
+    return rows, encode_cursor(*row_key(rows[-1]))
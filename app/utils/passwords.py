@@ -0,0 +1,115 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, has_app_context
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS,
+    check_password_hash,
+    generate_password_hash,
+)
+
+DEFAULT_SCRYPT_PARAMS = (2**15, 8, 1)
+
+_START_METHOD = (
+    "forkserver"
+    if "forkserver" in multiprocessing.get_all_start_methods()
+    else "spawn"
+)
+
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up within the configured timeout."""
+
+
+def normalize_method(method):
+    """Full Werkzeug method string for ``method``, e.g. 'pbkdf2:sha256:600000'.
+
+    Stored hashes record their parameters in this form, which is what
+    needs_rehash compares against.
+    """
+    name, *args = method.split(":")
+    if name == "pbkdf2":
+        if len(args) > 2:
+            raise ValueError("'pbkdf2' takes at most 2 arguments.")
+        hash_name = args[0] if args else "sha256"
+        iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    if name == "scrypt":
+        if args and len(args) != 3:
+            raise ValueError("'scrypt' takes 3 arguments.")
+        n, r, p = map(int, args) if args else DEFAULT_SCRYPT_PARAMS
+        return f"scrypt:{n}:{r}:{p}"
+    raise ValueError(f"Unsupported password hash method: {method}")
+
+
+class PasswordHasher:
+    """Password hashing off the request thread, with bounded concurrency.
+
+    Hashes run in a pool of ``workers`` processes (inline in the calling
+    thread when 0), so a burst of logins cannot hold the GIL away from other
+    requests. At most ``max_pending`` hashes are queued or running; a caller
+    that waits longer than ``timeout`` seconds for a slot gets HashingBusy.
+    """
+
+    def __init__(self, method="pbkdf2", workers=None, max_pending=None, timeout=10):
+        self.method = normalize_method(method)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or 2 * max(self.workers, 1)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Started lazily from a request thread, so never by forking the
+                # multithreaded server: the children start from a fresh
+                # interpreter (via a fork server where the platform has one)
+                # and import the __main__ module as __mp_main__.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(_START_METHOD),
+                )
+                atexit.register(self.shutdown)
+            return self._executor
+
+    def _run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusy("Password hashing is saturated, try again shortly.")
+        try:
+            if not self.workers:
+                return fn(*args, **kwargs)
+            return self._pool().submit(fn, *args, **kwargs).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than configured."""
+        return password_hash.split("$", 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+                atexit.unregister(self.shutdown)
+
+
+# Used outside an application (seed scripts, fixtures): inline, Werkzeug defaults.
+_inline_hasher = PasswordHasher(workers=0)
+
+
+def password_hasher():
+    if has_app_context() and "password_hasher" in current_app.extensions:
+        return current_app.extensions["password_hasher"]
+    return _inline_hasher
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self._record(time.perf_counter() - started, timed_out=True)
+            raise
+        self._record(time.perf_counter() - started)
+        return connection
+
+    def _record(self, waited, timed_out=False):
+        with self._stats_lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def wait_stats(self):
+        with self._stats_lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "total_wait": self.total_wait,
+                "max_wait": self.max_wait,
+                "avg_wait": self.total_wait / self.checkouts if self.checkouts else 0.0,
+            }
+
+
+def postgres_engine_options():
+    """Build SQLALCHEMY_ENGINE_OPTIONS for PostgreSQL from DB_* environment settings.
+
+    DB_STATEMENT_TIMEOUT (milliseconds, 0 = none) becomes the session default
+    for every connection; blueprints can lower or raise it per request with
+    DB_STATEMENT_TIMEOUTS.
+    """
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "True") == "True",
+    }
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT", 30000))
+    if statement_timeout:
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={statement_timeout}"
+        }
+    return options
+
+
+def parse_statement_timeouts(value):
+    """Parse "events:2000,admin:10000" into {"events": 2000, "admin": 10000}."""
+    timeouts = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        blueprint, _, milliseconds = item.partition(":")
+        timeouts[blueprint.strip()] = int(milliseconds)
+    return timeouts
+
+
+def apply_statement_timeout(session, milliseconds):
+    """Limit statements of the session's current transaction to ``milliseconds``.
+
+    set_config(..., true) is the bind-parameter form of SET LOCAL, so the
+    limit ends with the transaction.
+    """
+    session.execute(
+        text("SELECT set_config('statement_timeout', :timeout, true)"),
+        {"timeout": str(int(milliseconds))},
+    )
+
+
+def pool_stats(engine):
+    """Live pool occupancy, plus checkout wait times for a TimedQueuePool."""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            # overflow() counts up from -size until the pool is full.
+            overflow=max(pool.overflow(), 0),
+            timeout=pool.timeout(),
+        )
+    if isinstance(pool, TimedQueuePool):
+        stats.update(pool.wait_stats())
+    return stats
@@ -0,0 +1,113 @@
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+
+def parse_rate(value):
+    """Parse "capacity/seconds" (e.g. "10/300") into (capacity, refill per second).
+
+    Returns None for an empty value or a zero capacity, which disables the limit.
+    """
+    if not value:
+        return None
+    capacity, _, period = value.partition("/")
+    capacity, period = int(capacity), float(period or 1)
+    if capacity <= 0:
+        return None
+    return capacity, capacity / period
+
+
+class MemoryBucketStore:
+    """Token buckets for one process, in a dict of (tokens, updated, full_at).
+
+    A bucket left alone until ``full_at`` has refilled completely and is
+    indistinguishable from a missing one, so such entries are dropped lazily:
+    every ``sweep_every`` calls, or whenever the store outgrows ``maxsize``
+    (then also dropping the least recently used buckets).
+
+    Any object with the same ``consume`` method can replace it, e.g. one
+    backed by a store shared between worker processes (RATE_LIMIT_STORE).
+    """
+
+    def __init__(self, maxsize=100000, sweep_every=1024):
+        self.maxsize = maxsize
+        self.sweep_every = sweep_every
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def consume(self, key, capacity, refill_rate, now=None):
+        """Take one token from ``key``'s bucket.
+
+        Returns (allowed, retry_after) with retry_after in seconds.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated, _ = self._buckets.pop(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            full_at = now + (capacity - tokens) / refill_rate
+            # Re-inserted, so dict order runs from least to most recently used.
+            self._buckets[key] = (tokens, now, full_at)
+
+            self._calls += 1
+            if self._calls >= self.sweep_every or len(self._buckets) > self.maxsize:
+                self._sweep(now)
+
+        retry_after = 0 if allowed else (1 - tokens) / refill_rate
+        return allowed, retry_after
+
+    def _sweep(self, now):
+        self._calls = 0
+        for key in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        for key in list(self._buckets)[: max(0, len(self._buckets) - self.maxsize)]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def _request_email():
+    data = request.get_json(silent=True)
+    email = data.get("email") if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def rate_limited(name):
+    """Throttle a route per client IP and per submitted email address.
+
+    Limits come from ``<NAME>_RATE_LIMIT_IP`` and ``<NAME>_RATE_LIMIT_EMAIL``.
+    A throttled request gets 429 before the view runs, so it costs neither a
+    query nor a password hash.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            store = current_app.extensions["rate_limit_store"]
+            checks = [
+                (f"ip:{request.remote_addr}", f"{name}_RATE_LIMIT_IP"),
+                (f"email:{_request_email()}", f"{name}_RATE_LIMIT_EMAIL"),
+            ]
+            for subject, setting in checks:
+                rate = current_app.config.get(setting)
+                if rate is None or subject == "email:None":
+                    continue
+                allowed, retry_after = store.consume(f"{name}:{subject}", *rate)
+                if not allowed:
+                    return (
+                        jsonify({"message": "Too many attempts, try again later."}),
+                        429,
+                        {"Retry-After": str(math.ceil(retry_after))},
+                    )
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,122 @@
+from flask import current_app, request
+from flask_jwt_extended import decode_token
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadData, URLSafeTimedSerializer
+
+from app.utils.pool import postgres_engine_options
+
+# Bind key of the read replica engine in SQLALCHEMY_BINDS.
+REPLICA_BIND = "replica"
+
+# Requests that only read and may be served from the replica.
+READ_METHODS = frozenset({"GET", "HEAD"})
+
+# Cookie holding the signed, timestamped id of a user who just wrote.
+STICKY_COOKIE = "read_primary"
+
+
+class ReplicaSession(Session):
+    """Session that sends every statement to the replica while routed there."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("use_replica"):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_bind(url):
+    """SQLALCHEMY_BINDS entry for a replica whose transactions are all read-only.
+
+    SQLite has no read-only transaction mode, so its connections are made
+    query_only when they connect instead (see make_read_only).
+    """
+    if url.startswith("postgresql"):
+        options = postgres_engine_options()
+        connect_args = options.setdefault("connect_args", {})
+        connect_args["options"] = " ".join(
+            filter(
+                None,
+                [connect_args.get("options"), "-c default_transaction_read_only=on"],
+            )
+        )
+        return {"url": url, **options}
+    return {"url": url}
+
+
+def make_read_only(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def request_identity():
+    """User id of the request's bearer token, or None if absent or invalid.
+
+    Decodes the token without the user lookup that jwt_required performs, so
+    routing does not itself query the database.
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme != "Bearer" or not token:
+        return None
+    try:
+        return decode_token(token)["sub"]
+    except Exception:
+        return None
+
+
+def _sticky_serializer():
+    return URLSafeTimedSerializer(
+        current_app.config["JWT_SECRET_KEY"], salt="replica-stickiness"
+    )
+
+
+def wrote_recently(user_id, max_age):
+    """Whether the request carries a valid stickiness cookie for ``user_id``."""
+    cookie = request.cookies.get(STICKY_COOKIE)
+    if not cookie:
+        return False
+    try:
+        return _sticky_serializer().loads(cookie, max_age=max_age) == user_id
+    except BadData:
+        return False
+
+
+def route_to_replica(session, max_age):
+    """Route a read request's session to the replica.
+
+    Users who wrote within the last ``max_age`` seconds stay on the primary so
+    their own changes are visible. Autoflush is off: nothing is written on reads.
+    """
+    if request.method not in READ_METHODS:
+        return
+    user_id = request_identity()
+    if user_id is not None and wrote_recently(user_id, max_age):
+        return
+    session.info["use_replica"] = True
+    session.autoflush = False
+
+
+def remember_writer(response, max_age):
+    """Start the stickiness window for a user whose write request succeeded.
+
+    The window travels with the client as a signed cookie rather than living
+    in this process, so every worker behind the load balancer honours it.
+    """
+    if request.method not in READ_METHODS and response.status_code < 400:
+        user_id = request_identity()
+        if user_id is not None:
+            response.set_cookie(
+                STICKY_COOKIE,
+                _sticky_serializer().dumps(user_id),
+                max_age=max_age,
+                httponly=True,
+                samesite="Lax",
+            )
+    return response
+
+
+def release_replica(session):
+    session.info.pop("use_replica", None)
+    session.autoflush = True
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import User
+
+
+class RevocationList:
+    """In-memory set of revoked (user_id, token_version) pairs.
+
+    Logging out or changing a user's permissions bumps their token_version,
+    which revokes every token carrying an older one. The set is therefore
+    stored as the lowest valid version per user: (user_id, v) is revoked
+    exactly when v is below it. Changes committed by this process apply at
+    once; changes made elsewhere are picked up by a background reload once
+    the set is ``max_staleness`` seconds old.
+    """
+
+    def __init__(self, max_staleness=30):
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._valid_from = {}
+        self._loaded_at = None
+        self._reloading = False
+
+    def is_revoked(self, user_id, token_version):
+        with self._lock:
+            return token_version < self._valid_from.get(str(user_id), 0)
+
+    def revoke_below(self, user_id, token_version):
+        """Revoke every token of the user older than ``token_version``."""
+        with self._lock:
+            key = str(user_id)
+            self._valid_from[key] = max(self._valid_from.get(key, 0), token_version)
+
+    def load(self):
+        """Rebuild the set from users' current token versions in one query."""
+        started = time.monotonic()
+        # Straight from the primary, never from the request's (replica) session.
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                select(User.id, User.token_version).where(User.token_version > 0)
+            ).all()
+        valid_from = {str(user_id): version for user_id, version in rows}
+        with self._lock:
+            # Versions only grow, so keep any revocation applied by this
+            # process while the query ran.
+            for key, version in self._valid_from.items():
+                if version > valid_from.get(key, 0):
+                    valid_from[key] = version
+            self._valid_from = valid_from
+            self._loaded_at = started
+
+    def refresh_if_stale(self):
+        """Start a reload in a background thread if the set is stale.
+
+        The caller goes on with the current set instead of waiting for a query
+        that grows with the number of users. Returns the reload thread, or
+        None if no reload was due or one is already running.
+        """
+        with self._lock:
+            if self._reloading or (
+                self._loaded_at is not None
+                and time.monotonic() - self._loaded_at < self.max_staleness
+            ):
+                return None
+            self._reloading = True
+        thread = threading.Thread(
+            target=self._reload,
+            args=(current_app._get_current_object(),),
+            name="revocation-reload",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _reload(self, app):
+        try:
+            with app.app_context():
+                self.load()
+        except Exception as e:
+            # The set stays stale, so the next request tries again.
+            app.logger.exception("Revocation list reload failed: %s", e)
+        finally:
+            with self._lock:
+                self._reloading = False
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_new_token_versions(session, flush_context):
+    for obj in session.dirty:
+        if isinstance(obj, User) and inspect(obj).attrs.token_version.history.deleted:
+            session.info.setdefault("new_token_versions", {})[obj.id] = obj.token_version
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_revocations(session):
+    versions = session.info.pop("new_token_versions", None)
+    if not versions or not has_app_context():
+        return
+    revocations = current_app.extensions.get("revocations")
+    if revocations is not None:
+        for user_id, token_version in versions.items():
+            revocations.revoke_below(user_id, token_version)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_revocations(session, previous_transaction):
+    session.info.pop("new_token_versions", None)
@@ -0,0 +1,104 @@
+import re
+
+from sqlalchemy import event, text
+
+from app import db
+from app.models import Event
+
+# Columns covered by full-text search, in the order they are indexed.
+SEARCH_COLUMNS = ("title", "description", "group_description")
+
+_PG_DOCUMENT = (
+    "to_tsvector('simple', "
+    + " || ' ' || ".join(f"coalesce({column}, '')" for column in SEARCH_COLUMNS)
+    + ")"
+)
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS event_fts USING fts5("
+    + ", ".join(SEARCH_COLUMNS)
+    + ", content='event', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS event_fts_ai AFTER INSERT ON event BEGIN "
+    "INSERT INTO event_fts(rowid, title, description, group_description) "
+    "VALUES (new.id, new.title, new.description, new.group_description); END",
+    "CREATE TRIGGER IF NOT EXISTS event_fts_ad AFTER DELETE ON event BEGIN "
+    "INSERT INTO event_fts(event_fts, rowid, title, description, group_description) "
+    "VALUES ('delete', old.id, old.title, old.description, old.group_description); END",
+    # Only changes to indexed columns re-tokenize; staffing counter and status
+    # updates on the registration path leave the index alone. Recreated on
+    # every start so databases with the older, column-less trigger get this one.
+    "DROP TRIGGER IF EXISTS event_fts_au",
+    "CREATE TRIGGER event_fts_au AFTER UPDATE OF "
+    + ", ".join(SEARCH_COLUMNS)
+    + " ON event BEGIN "
+    "INSERT INTO event_fts(event_fts, rowid, title, description, group_description) "
+    "VALUES ('delete', old.id, old.title, old.description, old.group_description); "
+    "INSERT INTO event_fts(rowid, title, description, group_description) "
+    "VALUES (new.id, new.title, new.description, new.group_description); END",
+]
+
+_PG_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_event_search ON event USING GIN ({_PG_DOCUMENT})",
+]
+
+
+def install_search_index(connection):
+    """Create the full-text index for the connection's dialect if it is missing.
+
+    SQLite gets an external-content FTS5 table kept in sync by triggers,
+    PostgreSQL a GIN expression index over the same tsvector used to query.
+    """
+    if connection.dialect.name == "sqlite":
+        existed = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'event_fts'")
+        ).first()
+        for statement in _SQLITE_DDL:
+            connection.execute(text(statement))
+        if not existed:
+            connection.execute(
+                text("INSERT INTO event_fts(event_fts) VALUES ('rebuild')")
+            )
+    elif connection.dialect.name == "postgresql":
+        for statement in _PG_DDL:
+            connection.execute(text(statement))
+
+
+@event.listens_for(Event.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    install_search_index(connection)
+
+
+@event.listens_for(Event.__table__, "before_drop")
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS event_fts"))
+
+
+def _fts5_query(terms):
+    # Quote every term so user input can never be parsed as FTS5 syntax.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def search_event_ids(query, since, limit, offset):
+    """Ids of events on or after ``since`` matching ``query``, best match first."""
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return []
+
+    params = {"since": since, "limit": limit, "offset": offset}
+    if db.session.get_bind(mapper=Event).dialect.name == "postgresql":
+        sql = (
+            f"SELECT id FROM event WHERE {_PG_DOCUMENT} @@ plainto_tsquery('simple', :q) "
+            "AND date >= :since "
+            f"ORDER BY ts_rank({_PG_DOCUMENT}, plainto_tsquery('simple', :q)) DESC, id "
+            "LIMIT :limit OFFSET :offset"
+        )
+        params["q"] = " ".join(terms)
+    else:
+        sql = (
+            "SELECT event.id FROM event_fts JOIN event ON event.id = event_fts.rowid "
+            "WHERE event_fts MATCH :q AND event.date >= :since "
+            "ORDER BY event_fts.rank, event.id LIMIT :limit OFFSET :offset"
+        )
+        params["q"] = _fts5_query(terms)
+    return list(db.session.execute(text(sql), params).scalars())
@@ -0,0 +1,55 @@
+from sqlalchemy.orm import load_only
+
+from app.models import Event
+
+# Serialized event attributes, in response order. Each one is a column on Event.
+EVENT_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "date",
+    "channel",
+    "language",
+    "location",
+    "status",
+    "group_size",
+    "num_instructors_needed",
+    "num_representatives_needed",
+    "target_audience",
+    "group_description",
+    "additional_notes",
+    "contact_phone_number",
+)
+
+
+def parse_fields(value, default=EVENT_FIELDS):
+    """Parse a ``?fields=a,b`` sparse fieldset. ``id`` is always included.
+
+    Raises ValueError naming the first unknown field.
+    """
+    if value is None:
+        return default
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = requested.difference(EVENT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field: {sorted(unknown)[0]}")
+    requested.add("id")
+    return tuple(field for field in EVENT_FIELDS if field in requested)
+
+
+def event_columns(fields):
+    """Event columns to load for ``fields``; ``date`` is kept for ordering."""
+    return [getattr(Event, field) for field in set(fields) | {"id", "date"}]
+
+
+def event_load_options(fields):
+    """Query option loading only the columns needed to serialize ``fields``."""
+    return load_only(*event_columns(fields))
+
+
+def event_to_dict(event, fields=EVENT_FIELDS):
+    data = {}
+    for field in fields:
+        value = getattr(event, field)
+        data[field] = value.isoformat() if field == "date" else value
+    return data
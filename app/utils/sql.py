@@ -0,0 +1,52 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateColumn
+
+
+def dialect_insert(connection, table):
+    """Return an INSERT construct supporting ON CONFLICT for the connection's dialect.
+
+    SQLite and PostgreSQL both support ``ON CONFLICT`` and ``RETURNING`` but
+    SQLAlchemy only exposes them on the dialect-specific insert() constructs.
+    """
+    if connection.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def ensure_indexes(connection, metadata):
+    """Create any index declared in ``metadata`` that an existing table lacks.
+
+    create_all() skips tables that already exist, so indexes added to a model
+    later would otherwise never reach an existing database.
+    """
+    for table in metadata.sorted_tables:
+        if not connection.dialect.has_table(connection, table.name):
+            continue
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def ensure_columns(connection, metadata):
+    """Add any column declared in ``metadata`` that an existing table lacks.
+
+    The column counterpart of ensure_indexes. A column added to an existing
+    table must be nullable or have a server_default. Returns the added
+    (table name, column name) pairs.
+    """
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    added = []
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.execute(
+                text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}")
+            )
+            added.append((table.name, column.name))
+    return added
@@ -0,0 +1,70 @@
+from sqlalchemy import text
+
+# PRAGMAs applied to every new SQLite connection, in order, keyed by the
+# app.config setting that holds their value. busy_timeout comes first so the
+# journal mode switch waits for other connections instead of failing.
+SQLITE_PRAGMAS = (
+    ("SQLITE_BUSY_TIMEOUT", "busy_timeout"),
+    ("SQLITE_JOURNAL_MODE", "journal_mode"),
+    ("SQLITE_SYNCHRONOUS", "synchronous"),
+    ("SQLITE_MMAP_SIZE", "mmap_size"),
+    ("SQLITE_CACHE_SIZE", "cache_size"),
+    ("SQLITE_TEMP_STORE", "temp_store"),
+)
+
+# Readable names for the integer values SQLite reports back.
+_SYNCHRONOUS = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}
+_TEMP_STORE = {0: "DEFAULT", 1: "FILE", 2: "MEMORY"}
+
+
+def apply_sqlite_pragmas(dbapi_connection, config):
+    """Apply the configured performance PRAGMAs and enable foreign keys.
+
+    A setting whose value is empty is left at SQLite's default.
+    """
+    cursor = dbapi_connection.cursor()
+    for setting, pragma in SQLITE_PRAGMAS:
+        value = config.get(setting)
+        if value not in (None, ""):
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def effective_sqlite_settings(connection):
+    """Read back the PRAGMA values a connection is actually running with."""
+    settings = {}
+    for _, pragma in SQLITE_PRAGMAS + ((None, "foreign_keys"),):
+        settings[pragma] = connection.execute(text(f"PRAGMA {pragma}")).scalar()
+    settings["synchronous"] = _SYNCHRONOUS.get(
+        settings["synchronous"], settings["synchronous"]
+    )
+    settings["temp_store"] = _TEMP_STORE.get(
+        settings["temp_store"], settings["temp_store"]
+    )
+    return settings
+
+
+def check_sqlite_settings(connection, config):
+    """Report the effective settings and any that differ from the configuration.
+
+    Returns a list of warnings, e.g. when WAL was requested for an in-memory
+    database, which always uses the "memory" journal.
+    """
+    settings = effective_sqlite_settings(connection)
+    print(
+        "SQLite settings: "
+        + ", ".join(f"{pragma}={value}" for pragma, value in settings.items())
+    )
+
+    warnings = []
+    for setting, pragma in SQLITE_PRAGMAS:
+        requested = config.get(setting)
+        if requested in (None, ""):
+            continue
+        actual = settings[pragma]
+        if str(actual).lower() != str(requested).lower():
+            warnings.append(f"{pragma} is {actual}, configured {requested}")
+    for warning in warnings:
+        print(f"SQLite setting not applied: {warning}")
+    return warnings
@@ -0,0 +1,26 @@
+from flask import Response, json, request, stream_with_context
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+
+def wants_ndjson():
+    """True when the client explicitly prefers newline-delimited JSON."""
+    return (
+        request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+        == NDJSON_MIMETYPE
+    )
+
+
+def ndjson_response(query, serialize):
+    """Stream ``query`` as one JSON document per line.
+
+    Rows are pulled from the database ``STREAM_BATCH_SIZE`` at a time through
+    a server-side cursor, so memory use does not grow with the result size.
+    """
+
+    def generate():
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            yield json.dumps(serialize(row)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
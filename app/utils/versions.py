@@ -0,0 +1,151 @@
+import hashlib
+
+from flask import current_app, has_app_context, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Event, Registration, ResourceVersion
+from app.utils.sql import dialect_insert
+
+EVENTS_KEY = "events"
+
+# Keys every feed reader depends on. Bumping one inside the write transaction
+# would hold its row lock until commit and serialize all writers behind it,
+# so they are bumped in a transaction of their own right after the commit.
+# A reader racing that commit can only pair the old version with data at
+# least as new, never cache stale data under the new version.
+DEFERRED_KEYS = frozenset({EVENTS_KEY})
+
+
+_commit_listeners = []
+
+
+def registrants_key(event_id):
+    return f"registrants:{event_id}"
+
+
+def event_key(event_id):
+    return f"event:{event_id}"
+
+
+def changed_event_ids(keys):
+    """Ids of the events whose row or registrations a set of changed keys covers."""
+    ids = set()
+    for key in keys:
+        prefix, _, event_id = key.partition(":")
+        if prefix in ("event", "registrants"):
+            ids.add(int(event_id))
+    return ids
+
+
+def _changed_keys(session):
+    keys = set()
+    for obj in session.deleted:
+        if isinstance(obj, Event):
+            # Registrations go with the event through ON DELETE CASCADE.
+            keys.update((EVENTS_KEY, event_key(obj.id), registrants_key(obj.id)))
+        elif isinstance(obj, Registration):
+            keys.add(registrants_key(obj.event_id))
+    for obj in list(session.new) + [
+        o for o in session.dirty if session.is_modified(o, include_collections=False)
+    ]:
+        if isinstance(obj, Event):
+            keys.update((EVENTS_KEY, event_key(obj.id)))
+        elif isinstance(obj, Registration):
+            keys.add(registrants_key(obj.event_id))
+    return keys
+
+
+def bump_versions(connection, keys):
+    """Increment the stored version of each key inside the current transaction."""
+    if not keys:
+        return
+    table = ResourceVersion.__table__
+    stmt = dialect_insert(connection, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={"version": table.c.version + 1},
+    )
+    connection.execute(stmt, [{"key": key, "version": 1} for key in sorted(keys)])
+
+
+def mark_changed(session, keys):
+    """Record writes issued outside the unit of work (bulk/Core statements).
+
+    Per-resource keys are bumped in the current transaction; DEFERRED_KEYS
+    after it commits.
+    """
+    keys = set(keys)
+    bump_versions(session.connection(), keys - DEFERRED_KEYS)
+    session.info.setdefault("changed_resources", set()).update(keys)
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_on_flush(session, flush_context):
+    keys = _changed_keys(session)
+    if keys:
+        mark_changed(session, keys)
+
+
+def on_commit(fn):
+    """Register ``fn(keys)`` to run after a commit that changed versioned resources."""
+    _commit_listeners.append(fn)
+    return fn
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_on_commit(session):
+    keys = session.info.pop("changed_resources", None)
+    if not keys or not has_app_context():
+        return
+    # The data is durable by now: a failing side effect is logged, never
+    # raised out of commit(), where callers would report the write as failed.
+    deferred = keys & DEFERRED_KEYS
+    if deferred:
+        try:
+            with db.engine.begin() as connection:
+                bump_versions(connection, deferred)
+        except Exception as e:
+            current_app.logger.exception(
+                "Could not bump versions %s after commit: %s", sorted(deferred), e
+            )
+    for listener in _commit_listeners:
+        try:
+            listener(keys)
+        except Exception as e:
+            current_app.logger.exception("Commit listener %s failed: %s", listener, e)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session, previous_transaction):
+    session.info.pop("changed_resources", None)
+
+
+def get_versions(keys):
+    rows = db.session.execute(
+        db.select(ResourceVersion.key, ResourceVersion.version).where(
+            ResourceVersion.key.in_(keys)
+        )
+    ).all()
+    found = dict(rows)
+    return [found.get(key, 0) for key in keys]
+
+
+def resource_etag(keys, *extra):
+    """Build a strong ETag from the versions of ``keys`` and the request URL.
+
+    Costs a single primary-key lookup on resource_versions; no rows of the
+    resource itself are read.
+    """
+    versions = get_versions(keys)
+    parts = [request.full_path]
+    parts += [f"{key}={version}" for key, version in zip(keys, versions)]
+    parts += [str(value) for value in extra]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def not_modified(etag):
+    response = make_response("", 304)
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,200 @@
+from sqlalchemy import delete, func, insert, or_, select, update
+
+from app import db
+from app.models import Event, Registration, User, WaitlistEntry
+from app.utils.autoapprove import ROLE_CAPACITIES, ROLE_COUNTERS
+from app.utils.sql import dialect_insert
+
+
+def join_waitlist(event_id, user_id):
+    """Append the user to the event's waitlist.
+
+    Returns the user's 1-based position among waitlisted users of the same
+    role, or None if they were already on it.
+    """
+    connection = db.session.connection()
+    table = WaitlistEntry.__table__
+    entry_id = connection.execute(
+        dialect_insert(connection, table)
+        .values(user_id=user_id, event_id=event_id)
+        .on_conflict_do_nothing()
+        .returning(table.c.id)
+    ).scalar()
+    if entry_id is None:
+        return None
+
+    role = db.session.query(User.role).filter(User.id == user_id).scalar()
+    return (
+        WaitlistEntry.query.join(User)
+        .filter(
+            WaitlistEntry.event_id == event_id,
+            WaitlistEntry.id <= entry_id,
+            User.role == role,
+        )
+        .count()
+    )
+
+
+def leave_waitlist(event_id, user_id):
+    """Remove the user from the event's waitlist. Returns True if they were on it."""
+    return (
+        WaitlistEntry.query.filter_by(event_id=event_id, user_id=user_id).delete() > 0
+    )
+
+
+def drop_registered_entries(connection, event_ids):
+    """Delete the waitlist entries of users already registered for the event.
+
+    Registering removes the user's own entry, but one left behind must never
+    be promoted into a second registration, so promotion purges them first.
+    """
+    waitlist = WaitlistEntry.__table__
+    registrations = Registration.__table__
+    connection.execute(
+        delete(waitlist).where(
+            waitlist.c.event_id.in_(event_ids),
+            select(registrations.c.user_id)
+            .where(
+                registrations.c.user_id == waitlist.c.user_id,
+                registrations.c.event_id == waitlist.c.event_id,
+            )
+            .exists(),
+        )
+    )
+
+
+def promote_from_waitlist(event_id):
+    """Fill free slots of the event from its waitlist, oldest entry first.
+
+    Pending deletes are flushed first so the staffing counters reflect the
+    slots just freed. Promoted users get the same registration status a
+    direct signup would. Returns the promoted Registration objects.
+    """
+    db.session.flush()
+    drop_registered_entries(db.session.connection(), [event_id])
+    event = db.session.get(
+        Event, event_id, with_for_update=True, populate_existing=True
+    )
+    if not event:
+        return []
+
+    promoted = []
+    for role, capacity_column in ROLE_CAPACITIES.items():
+        capacity = getattr(event, capacity_column)
+        free = None
+        if capacity:
+            free = capacity - getattr(event, ROLE_COUNTERS[role])
+            if free <= 0:
+                continue
+
+        entries = (
+            WaitlistEntry.query.join(User)
+            .filter(WaitlistEntry.event_id == event_id, User.role == role)
+            .order_by(WaitlistEntry.id)
+            .limit(free)
+            .all()
+        )
+        for entry in entries:
+            db.session.delete(entry)
+            registration = Registration(
+                user_id=entry.user_id,
+                event_id=event_id,
+                status="pending" if role == "Guide" else "approved",
+            )
+            db.session.add(registration)
+            promoted.append(registration)
+
+    db.session.flush()
+    return promoted
+
+
+def join_waitlists(connection, event_ids, user_id):
+    """Set-based join_waitlist. Returns the event ids whose waitlist was joined."""
+    if not event_ids:
+        return set()
+    table = WaitlistEntry.__table__
+    result = connection.execute(
+        dialect_insert(connection, table)
+        .values([{"user_id": user_id, "event_id": event_id} for event_id in event_ids])
+        .on_conflict_do_nothing()
+        .returning(table.c.event_id)
+    )
+    return set(result.scalars())
+
+
+def leave_waitlists(connection, event_ids, user_id):
+    """Set-based leave_waitlist. Returns the event ids whose waitlist was left."""
+    if not event_ids:
+        return set()
+    table = WaitlistEntry.__table__
+    result = connection.execute(
+        delete(table)
+        .where(table.c.user_id == user_id, table.c.event_id.in_(event_ids))
+        .returning(table.c.event_id)
+    )
+    return set(result.scalars())
+
+
+def promote_next_in_line(connection, event_ids, role):
+    """Promote, per event, the oldest waitlisted user of ``role`` if it has room.
+
+    Set-based counterpart of promote_from_waitlist for the single slot one
+    unregistration frees: a fixed five statements whatever the number of
+    events. Returns the ids of the events that received a promotion.
+    """
+    if role not in ROLE_COUNTERS or not event_ids:
+        return set()
+    drop_registered_entries(connection, event_ids)
+
+    waitlist = WaitlistEntry.__table__
+    users = User.__table__
+    events = Event.__table__
+    registrations = Registration.__table__
+    counter = getattr(events.c, ROLE_COUNTERS[role])
+    capacity = getattr(events.c, ROLE_CAPACITIES[role])
+
+    earlier = waitlist.alias()
+    earlier_users = users.alias()
+    oldest = (
+        select(func.min(earlier.c.id))
+        .select_from(
+            earlier.join(earlier_users, earlier_users.c.id == earlier.c.user_id)
+        )
+        .where(earlier.c.event_id == waitlist.c.event_id, earlier_users.c.role == role)
+        .scalar_subquery()
+    )
+    chosen = connection.execute(
+        select(waitlist.c.id, waitlist.c.user_id, waitlist.c.event_id)
+        .select_from(
+            waitlist.join(users, users.c.id == waitlist.c.user_id).join(
+                events, events.c.id == waitlist.c.event_id
+            )
+        )
+        .where(
+            waitlist.c.event_id.in_(event_ids),
+            users.c.role == role,
+            waitlist.c.id == oldest,
+            or_(capacity == 0, counter < capacity),
+        )
+    ).all()
+    if not chosen:
+        return set()
+
+    status = "pending" if role == "Guide" else "approved"
+    connection.execute(
+        insert(registrations),
+        [
+            {"user_id": row.user_id, "event_id": row.event_id, "status": status}
+            for row in chosen
+        ],
+    )
+    connection.execute(
+        delete(waitlist).where(waitlist.c.id.in_([row.id for row in chosen]))
+    )
+    promoted = {row.event_id for row in chosen}
+    connection.execute(
+        update(events)
+        .where(events.c.id.in_(promoted))
+        .values({ROLE_COUNTERS[role]: counter + 1})
+    )
+    return promoted
@@ -0,0 +1,202 @@
+"""Login throughput benchmark for the password hashing pool.
+
+Starts the app on a fresh SQLite database once per hashing pool size and has
+N client threads log in concurrently, each as its own user. A probe thread
+requests GET /events throughout to show how much a login burst slows the
+rest of the worker. Reports logins per second and latency percentiles for
+each pool size, from inline hashing (0) up to the number of cores.
+
+    python -m benchmarks.login_throughput --clients 16 --logins 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from app import db
+from app.models import User
+from app.utils.passwords import PasswordHasher
+from benchmarks.registration_contention import _percentile, create_app_with
+
+PASSWORD = "benchmark-password"
+
+
+def default_pool_sizes():
+    """0 (inline), then powers of two up to and including the core count."""
+    cores = os.cpu_count() or 1
+    sizes = [0]
+    size = 1
+    while size < cores:
+        sizes.append(size)
+        size *= 2
+    return sizes + [cores]
+
+
+def make_app(url, workers, method):
+    return create_app_with(
+        {
+            "DATABASE_URL": url,
+            "PASSWORD_HASH_WORKERS": str(workers),
+            "PASSWORD_HASH_METHOD": method,
+            # Every client logs in from the same address; measure hashing,
+            # not throttling.
+            "LOGIN_RATE_LIMIT_IP": "",
+            "LOGIN_RATE_LIMIT_EMAIL": "",
+            "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY")
+            or "login-throughput-benchmark-key",
+        }
+    )
+
+
+def setup_database(app, num_users, method):
+    """Create one user per client, all with the same password. Returns emails."""
+    # Hash once; every user shares it, so setup does not dominate the run.
+    password_hash = PasswordHasher(method=method, workers=0).hash(PASSWORD)
+    with app.app_context():
+        users = [
+            User(
+                first_name="Bench",
+                last_name=str(i),
+                email=f"login_{i}@example.com",
+                password_hash=password_hash,
+            )
+            for i in range(num_users)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.email for user in users]
+
+
+def _login_worker(app, email, logins, barrier, results):
+    client = app.test_client()
+    samples = []
+    barrier.wait()
+    for _ in range(logins):
+        started = time.perf_counter()
+        status = client.post(
+            "/login", json={"email": email, "password": PASSWORD}
+        ).status_code
+        samples.append((status, time.perf_counter() - started))
+    results.append(samples)
+
+
+def _probe(app, stop, latencies):
+    client = app.test_client()
+    while not stop.is_set():
+        started = time.perf_counter()
+        client.get("/events")
+        latencies.append(time.perf_counter() - started)
+        stop.wait(0.01)
+
+
+def run_pool_size(db_path, workers, clients, logins, method):
+    """Run one burst of logins with a hashing pool of ``workers`` processes."""
+    app = make_app(f"sqlite:///{os.path.abspath(db_path)}", workers, method)
+    emails = setup_database(app, clients, method)
+
+    barrier = threading.Barrier(clients + 1)
+    results = []
+    threads = [
+        threading.Thread(
+            target=_login_worker, args=(app, email, logins, barrier, results)
+        )
+        for email in emails
+    ]
+    stop = threading.Event()
+    probe_latencies = []
+    probe = threading.Thread(target=_probe, args=(app, stop, probe_latencies))
+    try:
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        probe.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        probe.join()
+    finally:
+        app.extensions["password_hasher"].shutdown()
+
+    samples = [sample for worker_samples in results for sample in worker_samples]
+    latencies = sorted(seconds for _, seconds in samples)
+    probe_latencies.sort()
+    return {
+        "workers": workers,
+        "logins": len(samples),
+        "failed": sum(1 for status, _ in samples if status != 200),
+        "elapsed": elapsed,
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "probe_p50": _percentile(probe_latencies, 50),
+        "probe_p95": _percentile(probe_latencies, 95),
+    }
+
+
+def run_benchmark(directory, pool_sizes=None, clients=8, logins=5, method="pbkdf2"):
+    """Run every pool size against fresh databases in ``directory``. Returns a report."""
+    pool_sizes = default_pool_sizes() if pool_sizes is None else pool_sizes
+    return {
+        "cores": os.cpu_count() or 1,
+        "clients": clients,
+        "method": PasswordHasher(method=method, workers=0).method,
+        "runs": [
+            run_pool_size(
+                os.path.join(directory, f"login_{workers}.db"),
+                workers,
+                clients,
+                logins,
+                method,
+            )
+            for workers in pool_sizes
+        ],
+    }
+
+
+def format_report(report):
+    lines = [
+        f"cores: {report['cores']}, clients: {report['clients']}, "
+        f"method: {report['method']}",
+        "pool  logins/s  login p50/p95 (ms)  GET /events p50/p95 (ms)  failed",
+    ]
+    for run in report["runs"]:
+        lines.append(
+            f"{run['workers']:>4}  {run['throughput']:>8.1f}  "
+            f"{run['p50'] * 1000:>8.1f} / {run['p95'] * 1000:<8.1f} "
+            f"{run['probe_p50'] * 1000:>13.1f} / {run['probe_p95'] * 1000:<8.1f}  "
+            f"{run['failed']}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8,
+                        help="concurrent client threads")
+    parser.add_argument("--logins", type=int, default=5,
+                        help="logins per client")
+    parser.add_argument("--pool-sizes", type=lambda s: [int(n) for n in s.split(",")],
+                        help="comma-separated hashing pool sizes (default: 0 up to the core count)")
+    parser.add_argument("--method", default="pbkdf2",
+                        help="Werkzeug hash method, e.g. pbkdf2:sha256:600000")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_benchmark(
+            tmp,
+            pool_sizes=args.pool_sizes,
+            clients=args.clients,
+            logins=args.logins,
+            method=args.method,
+        )
+    print(format_report(report))
+    return 1 if any(run["failed"] for run in report["runs"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
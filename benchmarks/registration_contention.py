@@ -0,0 +1,401 @@
+"""Contention benchmark for the registration path.
+
+Starts the app on a file-backed SQLite database in WAL mode and has N
+workers (threads or processes) register for and unregister from a single
+hot event in a loop, each as its own user. Reports throughput, latency
+percentiles, time spent waiting on the database write lock and the number
+of "database is locked" errors, then checks the registration invariants.
+
+    python -m benchmarks.registration_contention --workers 16 --iterations 50
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event as sa_event, func
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.models import Event, Registration, User, WaitlistEntry
+from app.utils.autoapprove import (
+    ROLE_CAPACITIES,
+    ROLE_COUNTERS,
+    should_autoapprove_event,
+)
+
+ROLES = ("Family Representative", "Guide")
+
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE")
+
+
+class LockWaitTimer:
+    """Per-thread time spent executing write statements.
+
+    In WAL mode reads never block and a transaction takes the write lock on
+    its first write statement, so under contention this time is dominated by
+    waiting for the lock (up to the busy timeout when it ends in an error).
+    """
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        sa_event.listen(engine, "before_cursor_execute", self._before)
+        sa_event.listen(engine, "after_cursor_execute", self._after)
+        sa_event.listen(engine, "handle_error", self._error)
+
+    @property
+    def total(self):
+        return getattr(self._local, "total", 0.0)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(_WRITE_PREFIXES):
+            self._local.started = time.perf_counter()
+
+    def _stop(self):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            self._local.total = self.total + time.perf_counter() - started
+            self._local.started = None
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self._stop()
+
+    def _error(self, exception_context):
+        self._stop()
+
+
+def create_app_with(settings):
+    """create_app() with ``settings`` in the environment for the call only.
+
+    create_app reads its configuration from the environment; restoring it
+    afterwards keeps a benchmark run from changing the settings of whatever
+    runs next in the process, e.g. the rest of a test session.
+    """
+    saved = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    try:
+        return create_app()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def make_app(url, busy_timeout):
+    app = create_app_with(
+        {
+            "DATABASE_URL": url,
+            "SQLITE_JOURNAL_MODE": "WAL",
+            "SQLITE_BUSY_TIMEOUT": str(int(busy_timeout * 1000)),
+            "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY")
+            or "registration-contention-benchmark-key",
+        }
+    )
+    # Let database errors reach the worker instead of becoming a 500 page.
+    app.config["PROPAGATE_EXCEPTIONS"] = True
+    return app
+
+
+def setup_database(app, num_users, guide_ratio, reps_needed, instructors_needed):
+    """Create the hot event and one user per worker. Returns (event_id, tokens)."""
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        num_guides = round(num_users * guide_ratio)
+        users = [
+            User(
+                first_name="Bench",
+                last_name=str(i),
+                email=f"bench_{i}@example.com",
+                # Workers authenticate with tokens, never with a password.
+                password_hash="!",
+                role="Guide" if i < num_guides else "Family Representative",
+            )
+            for i in range(num_users)
+        ]
+        event = Event(
+            title="Hot event",
+            description="Registration contention benchmark",
+            date=datetime.now() + timedelta(days=30),
+            channel="Hostages Square",
+            language="Hebrew",
+            location="Jerusalem",
+            target_audience="Universities",
+            num_representatives_needed=reps_needed,
+            num_instructors_needed=instructors_needed,
+        )
+        db.session.add_all(users + [event])
+        db.session.commit()
+
+        tokens = [
+            create_access_token(
+                identity=str(user.id),
+                additional_claims={"token_version": user.token_version},
+            )
+            for user in users
+        ]
+        return event.id, tokens
+
+
+def _timed(client, method, path, headers):
+    started = time.perf_counter()
+    try:
+        outcome = client.open(path, method=method, headers=headers).status_code
+    except OperationalError as e:
+        if "database is locked" not in str(e):
+            raise
+        outcome = "locked"
+    return method, outcome, time.perf_counter() - started
+
+
+def run_worker(app, timer, event_id, token, iterations, barrier):
+    """Alternate register/unregister on the hot event.
+
+    Returns (samples, lock_wait) where each sample is (method, outcome,
+    seconds) and outcome is the HTTP status or "locked".
+    """
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    samples = []
+    barrier.wait()
+    for _ in range(iterations):
+        samples.append(
+            _timed(client, "POST", f"/events/{event_id}/register", headers)
+        )
+        samples.append(
+            _timed(client, "DELETE", f"/events/{event_id}/unregister", headers)
+        )
+    return samples, timer.total
+
+
+def _process_worker(
+    url, busy_timeout, event_id, token, iterations, barrier, results
+):
+    app = make_app(url, busy_timeout)
+    with app.app_context():
+        timer = LockWaitTimer(db.engine)
+    results.put(run_worker(app, timer, event_id, token, iterations, barrier))
+
+
+def _run_threads(app, event_id, tokens, iterations):
+    with app.app_context():
+        timer = LockWaitTimer(db.engine)
+    barrier = threading.Barrier(len(tokens))
+    results = []
+
+    def target(token):
+        results.append(run_worker(app, timer, event_id, token, iterations, barrier))
+
+    threads = [threading.Thread(target=target, args=(token,)) for token in tokens]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _run_processes(url, busy_timeout, event_id, tokens, iterations):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(len(tokens))
+    queue = context.Queue()
+    processes = [
+        context.Process(
+            target=_process_worker,
+            args=(url, busy_timeout, event_id, token, iterations, barrier, queue),
+        )
+        for token in tokens
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return results
+
+
+def check_invariants(event_id):
+    """Return a list of human-readable invariant violations (empty if none)."""
+    violations = []
+
+    duplicates = (
+        db.session.query(Registration.user_id, Registration.event_id)
+        .group_by(Registration.user_id, Registration.event_id)
+        .having(func.count() > 1)
+        .all()
+    )
+    for user_id, dup_event_id in duplicates:
+        violations.append(f"user {user_id} registered twice for event {dup_event_id}")
+
+    both = (
+        db.session.query(WaitlistEntry.user_id)
+        .join(
+            Registration,
+            (Registration.user_id == WaitlistEntry.user_id)
+            & (Registration.event_id == WaitlistEntry.event_id),
+        )
+        .filter(WaitlistEntry.event_id == event_id)
+        .all()
+    )
+    for (user_id,) in both:
+        violations.append(f"user {user_id} is both registered and waitlisted")
+
+    event = db.session.get(Event, event_id)
+    counts = dict(
+        db.session.query(User.role, func.count())
+        .join(Registration, Registration.user_id == User.id)
+        .filter(Registration.event_id == event_id)
+        .group_by(User.role)
+        .all()
+    )
+    waiting = dict(
+        db.session.query(User.role, func.count())
+        .join(WaitlistEntry, WaitlistEntry.user_id == User.id)
+        .filter(WaitlistEntry.event_id == event_id)
+        .group_by(User.role)
+        .all()
+    )
+    for role in ROLES:
+        registered = counts.get(role, 0)
+        counter = getattr(event, ROLE_COUNTERS[role])
+        capacity = getattr(event, ROLE_CAPACITIES[role])
+        if counter != registered:
+            violations.append(
+                f"{ROLE_COUNTERS[role]} is {counter} but {registered} {role}s are registered"
+            )
+        if capacity and registered > capacity:
+            violations.append(f"{registered} {role}s registered over capacity {capacity}")
+        if waiting.get(role) and (not capacity or registered < capacity):
+            violations.append(f"{role}s are waitlisted while the role has room")
+
+    expected = "approved" if should_autoapprove_event(event_id) else "pending"
+    if event.status != expected:
+        violations.append(
+            f"event status is {event.status!r} but should_autoapprove_event "
+            f"implies {expected!r}"
+        )
+    return violations
+
+
+def _percentile(latencies, p):
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method="inclusive")[p - 1]
+
+
+def run_benchmark(
+    db_path,
+    workers=8,
+    iterations=25,
+    mode="thread",
+    guide_ratio=0.5,
+    reps_needed=2,
+    instructors_needed=2,
+    busy_timeout=5.0,
+):
+    """Run the benchmark against a fresh database at ``db_path``. Returns a report dict."""
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists")
+
+    url = f"sqlite:///{os.path.abspath(db_path)}"
+    app = make_app(url, busy_timeout)
+    event_id, tokens = setup_database(
+        app, workers, guide_ratio, reps_needed, instructors_needed
+    )
+
+    started = time.perf_counter()
+    if mode == "thread":
+        results = _run_threads(app, event_id, tokens, iterations)
+    elif mode == "process":
+        results = _run_processes(url, busy_timeout, event_id, tokens, iterations)
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for worker_samples, _ in results for sample in worker_samples]
+    latencies = sorted(seconds for _, _, seconds in samples)
+    outcomes = Counter(f"{method} {outcome}" for method, outcome, _ in samples)
+
+    with app.app_context():
+        violations = check_invariants(event_id)
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "requests": len(samples),
+        "elapsed": elapsed,
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+        "lock_wait": sum(lock_wait for _, lock_wait in results),
+        "locked_errors": sum(
+            1 for _, outcome, _ in samples if outcome == "locked"
+        ),
+        "outcomes": dict(outcomes),
+        "violations": violations,
+    }
+
+
+def format_report(report):
+    lines = [
+        f"mode:               {report['mode']} x {report['workers']}",
+        f"requests:           {report['requests']} in {report['elapsed']:.2f}s",
+        f"throughput:         {report['throughput']:.1f} req/s",
+        "latency p50/95/99:  "
+        + " / ".join(f"{report[p] * 1000:.1f}ms" for p in ("p50", "p95", "p99")),
+        f"lock wait (total):  {report['lock_wait']:.2f}s",
+        f"database is locked: {report['locked_errors']}",
+        "outcomes:           "
+        + ", ".join(f"{k}: {v}" for k, v in sorted(report["outcomes"].items())),
+    ]
+    if report["violations"]:
+        lines.append("INVARIANT VIOLATIONS:")
+        lines.extend(f"  - {violation}" for violation in report["violations"])
+    else:
+        lines.append("invariants:         ok")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=25,
+                        help="register/unregister pairs per worker")
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--guide-ratio", type=float, default=0.5,
+                        help="fraction of workers registering as guides")
+    parser.add_argument("--reps-needed", type=int, default=2,
+                        help="family representative capacity (0 = unlimited)")
+    parser.add_argument("--instructors-needed", type=int, default=2,
+                        help="guide capacity (0 = unlimited)")
+    parser.add_argument("--busy-timeout", type=float, default=5.0,
+                        help="seconds SQLite waits for the write lock")
+    parser.add_argument("--db", help="database file to create (default: a temp file)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_benchmark(
+            args.db or os.path.join(tmp, "bench.db"),
+            workers=args.workers,
+            iterations=args.iterations,
+            mode=args.mode,
+            guide_ratio=args.guide_ratio,
+            reps_needed=args.reps_needed,
+            instructors_needed=args.instructors_needed,
+            busy_timeout=args.busy_timeout,
+        )
+    print(format_report(report))
+    return 1 if report["violations"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,9 @@ def app():
     os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
     os.environ['JWT_SECRET_KEY'] = 'test-secret-key'
     os.environ['FLASK_ENV'] = 'testing'
+    os.environ['PASSWORD_HASH_WORKERS'] = '0'
+    # Tests drain the mail outbox themselves unless they start a sender.
+    os.environ['MAIL_OUTBOX_WORKER'] = 'False'
     
     app = create_app()
     app.config['TESTING'] = True
@@ -146,4 +149,37 @@ def super_admin_headers(client, sample_super_admin):
             'password': 'superadmin123'
         })
         token = response.json['access_token']
-        return {'Authorization': f'Bearer {token}'}
\ No newline at end of file
+        return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def smtp_server(app):
+    """A local SMTP server the app's mail is sent to; collects what it receives."""
+    import socket
+    from types import SimpleNamespace
+    from aiosmtpd.controller import Controller
+    from flask_mailman import Mail
+
+    received = SimpleNamespace(messages=[], sessions=set())
+
+    class Handler:
+        async def handle_DATA(self, server, session, envelope):
+            received.sessions.add(id(session))
+            received.messages.append(envelope)
+            return '250 OK'
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    controller = Controller(Handler(), hostname='127.0.0.1', port=port)
+    controller.start()
+
+    app.config.update(
+        MAIL_SERVER='127.0.0.1',
+        MAIL_PORT=port,
+        MAIL_USE_TLS=False,
+        MAIL_DEFAULT_SENDER='noreply@example.com',
+    )
+    app.extensions['mailman'] = Mail.init_mail(app.config)
+    received.port = port
+    yield received
+    controller.stop()
@@ -146,6 +146,45 @@ class TestUpdateEvent:
         assert response.status_code == 403
 
 
+    def test_capacity_edit_reevaluates_status(self, client, admin_headers, sample_event):
+        """Test that changing num_instructors_needed re-applies the auto-approve rule."""
+        with client.application.app_context():
+            guide = User(first_name="Only", last_name="Guide", email="only_guide@example.com", role="Guide")
+            guide.password_hash = "unused"
+            db.session.add_all([guide, sample_event])
+            db.session.commit()
+            db.session.add(Registration(user_id=guide.id, event_id=sample_event.id, status="pending"))
+            db.session.commit()
+            event_id = sample_event.id
+
+        response = client.put(f'/admin/edit/{event_id}', json={'num_instructors_needed': 1}, headers=admin_headers)
+        assert response.status_code == 200
+        with client.application.app_context():
+            assert db.session.get(Event, event_id).status == 'approved'
+
+        response = client.put(f'/admin/edit/{event_id}', json={'num_instructors_needed': 3}, headers=admin_headers)
+        assert response.status_code == 200
+        with client.application.app_context():
+            assert db.session.get(Event, event_id).status == 'pending'
+
+    def test_explicit_status_wins(self, client, admin_headers, sample_event):
+        """Test that a status sent with the edit is not overridden by the rule."""
+        with client.application.app_context():
+            db.session.add(sample_event)
+            db.session.commit()
+            event_id = sample_event.id
+
+        response = client.put(
+            f'/admin/edit/{event_id}',
+            json={'num_instructors_needed': 0, 'status': 'approved'},
+            headers=admin_headers
+        )
+
+        assert response.status_code == 200
+        with client.application.app_context():
+            assert db.session.get(Event, event_id).status == 'approved'
+
+
 class TestDeleteEvent:
     """Test cases for deleting events."""
     
@@ -310,6 +349,30 @@ class TestRegistrationManagement:
         assert 'registrations' in data
         assert len(data['registrations']) == 1
         assert data['registrations'][0]['registration_status'] == 'pending'
+
+    def test_get_pending_registrations_ndjson(self, client, admin_headers, sample_user, sample_event):
+        """Test streaming pending registrations as newline-delimited JSON."""
+        with client.application.app_context():
+            db.session.add(sample_user)
+            db.session.add(sample_event)
+            db.session.commit()
+            db.session.add(Registration(
+                user_id=sample_user.id,
+                event_id=sample_event.id,
+                status="pending"
+            ))
+            db.session.commit()
+
+        response = client.get(
+            '/admin/pending-registrations',
+            headers={**admin_headers, 'Accept': 'application/x-ndjson'}
+        )
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.get_data(as_text=True).splitlines()
+        assert len(lines) == 1
+        assert json.loads(lines[0])['event_title'] == 'Test Event'
     
     def test_approve_registration(self, client, admin_headers, sample_user, sample_event):
         """Test approving a registration."""
@@ -377,4 +440,70 @@ class TestRegistrationManagement:
                 user_id=user_id,
                 event_id=event_id
             ).first()
-            assert registration is None
\ No newline at end of file
+            assert registration is None
+
+class TestRejectPromotesWaitlist:
+    """Test cases for waitlist promotion after a rejected registration."""
+
+    def test_reject_promotes_waitlisted_guide(self, client, admin_headers):
+        """Test that rejecting a guide frees their slot for the next guide."""
+        from app.models import WaitlistEntry
+        from flask_jwt_extended import create_access_token
+        from datetime import timedelta
+
+        with client.application.app_context():
+            event = Event(
+                title="One guide",
+                description="Limited",
+                date=datetime.now() + timedelta(days=1),
+                channel="Virtual",
+                language="English",
+                location="Zoom",
+                target_audience="Universities",
+                num_instructors_needed=1
+            )
+            db.session.add(event)
+            guides = []
+            for name in ("guide_a", "guide_b"):
+                guide = User(first_name=name, last_name="G", email=f"{name}@example.com", role="Guide")
+                guide.password_hash = "unused"
+                db.session.add(guide)
+                guides.append(guide)
+            db.session.commit()
+            event_id = event.id
+            guide_ids = [g.id for g in guides]
+            tokens = [
+                create_access_token(identity=str(g.id), additional_claims={"token_version": 0})
+                for g in guides
+            ]
+
+        for token in tokens:
+            client.post(f'/events/{event_id}/register', headers={'Authorization': f'Bearer {token}'})
+
+        response = client.delete(
+            f'/admin/reject-registration/{event_id}/{guide_ids[0]}', headers=admin_headers
+        )
+
+        assert response.status_code == 200
+        with client.application.app_context():
+            promoted = db.session.get(Registration, (guide_ids[1], event_id))
+            assert promoted is not None
+            assert promoted.status == 'pending'
+            assert WaitlistEntry.query.count() == 0
+
+
+class TestPoolStats:
+    """Test cases for the connection pool statistics endpoint."""
+
+    def test_pool_stats(self, client, admin_headers):
+        """Test that admins can read the pool statistics."""
+        response = client.get('/admin/pool-stats', headers=admin_headers)
+
+        assert response.status_code == 200
+        assert 'pool' in response.json
+
+    def test_pool_stats_requires_admin(self, client, authenticated_headers):
+        """Test that regular users cannot read the pool statistics."""
+        response = client.get('/admin/pool-stats', headers=authenticated_headers)
+
+        assert response.status_code == 403
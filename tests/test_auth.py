@@ -132,6 +132,49 @@ class TestLoginRoute:
         data = response.get_json()
         assert data['message'] == 'Invalid credentials'
     
+    def test_login_upgrades_outdated_hash(self, client, sample_user):
+        """Test that a hash made with other parameters is replaced on login."""
+        from app.utils.passwords import PasswordHasher
+
+        with client.application.app_context():
+            db.session.add(sample_user)
+            db.session.commit()
+            user_id, user_email = sample_user.id, sample_user.email
+        client.application.extensions["password_hasher"] = PasswordHasher(
+            method="pbkdf2:sha256:1000", workers=0
+        )
+
+        response = client.post('/login', json={
+            'email': user_email,
+            'password': 'password123'
+        })
+
+        assert response.status_code == 200
+        with client.application.app_context():
+            user = db.session.get(User, user_id)
+            assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+            assert user.check_password('password123')
+
+    def test_login_when_hashing_saturated(self, client, sample_user):
+        """Test that login answers 503 when no hashing slot frees up."""
+        from app.utils.passwords import PasswordHasher
+
+        with client.application.app_context():
+            db.session.add(sample_user)
+            db.session.commit()
+            user_email = sample_user.email
+        hasher = PasswordHasher(workers=0, max_pending=1, timeout=0.01)
+        hasher._slots.acquire()
+        client.application.extensions["password_hasher"] = hasher
+
+        response = client.post('/login', json={
+            'email': user_email,
+            'password': 'password123'
+        })
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
     def test_login_missing_data(self, client):
         """Test login with missing data."""
         response = client.post('/login', json={})
@@ -174,4 +217,418 @@ class TestLogoutRoute:
         headers = {'Authorization': 'Bearer invalid_token'}
         response = client.post('/logout', headers=headers)
         
-        assert response.status_code == 422  # Unprocessable Entity for invalid JWT
\ No newline at end of file
+        assert response.status_code == 422  # Unprocessable Entity for invalid JWT
+
+class TestIdentityResolution:
+    """Test cases for the cached JWT identity lookup."""
+
+    def _user_selects(self, client, method, path, headers):
+        from sqlalchemy import event as sa_event
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith('SELECT') and 'FROM user' in statement:
+                statements.append(statement)
+
+        with client.application.app_context():
+            sa_event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            response = client.open(path, method=method, headers=headers)
+        finally:
+            with client.application.app_context():
+                sa_event.remove(db.engine, "before_cursor_execute", record)
+        return response, statements
+
+    def test_admin_request_needs_no_user_query(self, client, admin_headers):
+        """Test that lookup, permission check and view share one cached user."""
+        response, statements = self._user_selects(
+            client, 'GET', '/events/1/registrations/pending', admin_headers
+        )
+
+        assert response.status_code == 404
+        assert statements == []
+
+    def test_cache_holds_no_password_hash(self, client, authenticated_headers):
+        """Test that cached identities keep only the columns authorization needs."""
+        cache = client.application.extensions["identity_cache"]
+        client.get('/me', headers=authenticated_headers)
+        rows = [row for _, row in cache._cache._data.values()]
+
+        assert rows
+        assert all('password_hash' not in row for row in rows)
+
+        response = client.get('/me', headers=authenticated_headers)
+        assert response.status_code == 200
+        assert response.get_json()['firstName'] == 'Test'
+
+    def test_logout_revokes_token(self, client, authenticated_headers):
+        """Test that a token stops working once its user logs out."""
+        client.post('/logout', headers=authenticated_headers)
+
+        response = client.get('/me', headers=authenticated_headers)
+
+        assert response.status_code == 401
+
+    def test_permission_change_invalidates_cache(self, client, admin_headers, super_admin_headers):
+        """Test that a demoted admin's tokens are revoked on their next request."""
+        assert client.get('/admin/cache-stats', headers=admin_headers).status_code == 200
+        with client.application.app_context():
+            admin_id = User.query.filter_by(permission_type='admin').first().id
+
+        client.put(
+            f'/admin/set-permission/{admin_id}',
+            json={'permission_type': 'user'},
+            headers=super_admin_headers
+        )
+
+        assert client.get('/admin/cache-stats', headers=admin_headers).status_code == 401
+
+
+class TestClaimsAuthorization:
+    """Test cases for permission checks from token claims and the revocation list."""
+
+    def test_login_token_carries_permission_claims(self, client, admin_headers):
+        """Test that login embeds permission_type and role in the token."""
+        from flask_jwt_extended import decode_token
+
+        with client.application.app_context():
+            claims = decode_token(admin_headers['Authorization'].split()[1])
+        assert claims['permission_type'] == 'admin'
+        assert claims['role'] == 'Guide'
+
+    def test_admin_route_needs_no_query(self, client, admin_headers):
+        """Test that an admin endpoint is authorized without touching the database."""
+        from sqlalchemy import event as sa_event
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with client.application.app_context():
+            # Even a cold identity cache must not cost a user query.
+            client.application.extensions["identity_cache"]._cache.clear()
+            sa_event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            response = client.get('/admin/cache-stats', headers=admin_headers)
+        finally:
+            with client.application.app_context():
+                sa_event.remove(db.engine, "before_cursor_execute", record)
+
+        assert response.status_code == 200
+        assert statements == []
+
+    def test_demoted_admin_logs_in_as_user(self, client, admin_headers, super_admin_headers):
+        """Test that a fresh login after a permission change carries the new permission."""
+        with client.application.app_context():
+            admin = User.query.filter_by(permission_type='admin').first()
+            admin_id, admin_email = admin.id, admin.email
+        client.put(
+            f'/admin/set-permission/{admin_id}',
+            json={'permission_type': 'user'},
+            headers=super_admin_headers
+        )
+
+        response = client.post('/login', json={
+            'email': admin_email,
+            'password': 'admin123'
+        })
+        headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+        assert client.get('/admin/cache-stats', headers=headers).status_code == 403
+
+    def test_reload_picks_up_revocations_from_other_processes(self, client, admin_headers):
+        """Test that a token revoked outside this process is rejected after a reload."""
+        from sqlalchemy import update
+
+        with client.application.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(
+                    update(User)
+                    .where(User.permission_type == 'admin')
+                    .values(token_version=User.token_version + 1)
+                )
+            revocations = client.application.extensions["revocations"]
+            assert client.get('/admin/cache-stats', headers=admin_headers).status_code == 200
+            revocations.load()
+
+        assert client.get('/admin/cache-stats', headers=admin_headers).status_code == 401
+
+    def test_stale_list_reloads_in_background(self, client, admin_headers):
+        """Test that a stale list is reloaded in a background thread."""
+        from sqlalchemy import update
+
+        with client.application.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(
+                    update(User)
+                    .where(User.permission_type == 'admin')
+                    .values(token_version=User.token_version + 1)
+                )
+            revocations = client.application.extensions["revocations"]
+            assert revocations.refresh_if_stale() is None
+
+            revocations.max_staleness = 0
+            revocations.refresh_if_stale().join()
+            revocations.max_staleness = 30
+
+        assert client.get('/admin/cache-stats', headers=admin_headers).status_code == 401
+
+
+class TestLoginThrottle:
+    """Test cases for the login and forgot_password rate limits."""
+
+    def _statements(self, client, method, path, **kwargs):
+        from sqlalchemy import event as sa_event
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with client.application.app_context():
+            sa_event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            response = client.open(path, method=method, **kwargs)
+        finally:
+            with client.application.app_context():
+                sa_event.remove(db.engine, "before_cursor_execute", record)
+        return response, statements
+
+    def test_login_throttled_per_email(self, client):
+        """Test that repeated attempts on one email get 429 without any query."""
+        client.application.config['LOGIN_RATE_LIMIT_EMAIL'] = (2, 0.01)
+        credentials = {'email': 'Victim@Example.com', 'password': 'guess'}
+        for _ in range(2):
+            assert client.post('/login', json=credentials).status_code == 401
+
+        response, statements = self._statements(
+            client, 'POST', '/login',
+            json={'email': ' victim@example.com', 'password': 'guess'}
+        )
+
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+        assert statements == []
+        # Another address from the same client is not affected.
+        other = {'email': 'other@example.com', 'password': 'guess'}
+        assert client.post('/login', json=other).status_code == 401
+
+    def test_login_throttled_per_ip(self, client):
+        """Test that one address cycling through emails is throttled."""
+        client.application.config['LOGIN_RATE_LIMIT_IP'] = (3, 0.01)
+        statuses = [
+            client.post('/login', json={
+                'email': f'user{i}@example.com', 'password': 'guess'
+            }).status_code
+            for i in range(4)
+        ]
+
+        assert statuses == [401, 401, 401, 429]
+        other_ip = client.post(
+            '/login',
+            json={'email': 'user9@example.com', 'password': 'guess'},
+            environ_base={'REMOTE_ADDR': '10.0.0.2'}
+        )
+        assert other_ip.status_code == 401
+
+    def test_client_ip_behind_trusted_proxy(self, monkeypatch):
+        """Test that X-Forwarded-For decides the IP bucket only behind a trusted proxy."""
+        from app import create_app
+
+        def statuses(app):
+            app.config['LOGIN_RATE_LIMIT_IP'] = (1, 0.01)
+            client = app.test_client()
+            with app.app_context():
+                db.create_all()
+                return [
+                    client.post(
+                        '/login',
+                        json={'email': 'proxied@example.com', 'password': 'guess'},
+                        headers={'X-Forwarded-For': forwarded},
+                    ).status_code
+                    for forwarded in ('203.0.113.1', '203.0.113.2')
+                ]
+
+        assert statuses(create_app()) == [401, 429]
+
+        monkeypatch.setenv('TRUSTED_PROXY_COUNT', '1')
+        assert statuses(create_app()) == [401, 401]
+
+    def test_forgot_password_throttled_per_email(self, client):
+        """Test that password resets for one address are throttled before any query."""
+        client.application.config['FORGOT_PASSWORD_RATE_LIMIT_EMAIL'] = (1, 0.001)
+        payload = {'email': 'nobody@example.com'}
+        assert client.post('/forgot_password', json=payload).status_code == 200
+
+        response, statements = self._statements(
+            client, 'POST', '/forgot_password', json=payload
+        )
+
+        assert response.status_code == 429
+        assert statements == []
+
+
+class TestForgotPassword:
+    """Test cases for forgot_password and the mail outbox behind it."""
+
+    def _register(self, client, sample_user):
+        with client.application.app_context():
+            db.session.add(sample_user)
+            db.session.commit()
+            return sample_user.id, sample_user.email
+
+    def test_password_change_and_mail_commit_together(self, client, sample_user):
+        """Test that the reset is queued in the outbox instead of sent inline."""
+        from app.models import OutboxMessage
+
+        user_id, email = self._register(client, sample_user)
+
+        response = client.post('/forgot_password', json={'email': email})
+
+        assert response.status_code == 200
+        with client.application.app_context():
+            assert not db.session.get(User, user_id).check_password('password123')
+            messages = OutboxMessage.query.all()
+            assert [m.recipient for m in messages] == [email]
+            assert messages[0].body.startswith('Your temporary password is: ')
+
+    def test_unknown_email_queues_nothing(self, client):
+        """Test that an unregistered address gets the same answer and no mail."""
+        from app.models import OutboxMessage
+
+        response = client.post('/forgot_password', json={'email': 'nobody@example.com'})
+
+        assert response.status_code == 200
+        with client.application.app_context():
+            assert OutboxMessage.query.count() == 0
+
+    def test_batch_shares_one_smtp_connection(self, app, smtp_server):
+        """Test that a batch is delivered over a single connection and removed."""
+        from app.models import OutboxMessage
+        from app.utils.outbox import deliver_pending, enqueue_mail
+
+        for i in range(3):
+            enqueue_mail(db.session, f'user{i}@example.com', 'Hello', f'Body {i}')
+        db.session.commit()
+
+        assert deliver_pending() == (3, 0)
+        assert sorted(e.rcpt_tos[0] for e in smtp_server.messages) == [
+            'user0@example.com', 'user1@example.com', 'user2@example.com'
+        ]
+        assert len(smtp_server.sessions) == 1
+        assert OutboxMessage.query.count() == 0
+
+    def test_failed_delivery_backs_off(self, app):
+        """Test that a failed send is retried later, with a doubling delay."""
+        import socket
+        from datetime import datetime, timedelta
+        from flask_mailman import Mail
+        from app.models import OutboxMessage
+        from app.utils.outbox import deliver_pending, enqueue_mail
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            closed_port = sock.getsockname()[1]
+        app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=closed_port, MAIL_USE_TLS=False)
+        app.extensions['mailman'] = Mail.init_mail(app.config)
+        enqueue_mail(db.session, 'user@example.com', 'Hello', 'Body')
+        db.session.commit()
+        now = datetime.utcnow()
+
+        assert deliver_pending(now) == (0, 1)
+        message = OutboxMessage.query.one()
+        assert message.attempts == 1
+        assert message.last_error
+        assert message.next_attempt_at == now + timedelta(seconds=30)
+
+        assert deliver_pending(now + timedelta(seconds=10)) == (0, 0)
+        later = now + timedelta(seconds=31)
+        assert deliver_pending(later) == (0, 1)
+        assert OutboxMessage.query.one().next_attempt_at == later + timedelta(seconds=60)
+
+        app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+        assert deliver_pending(later + timedelta(days=1)) == (0, 0)
+
+    def test_exhausted_message_is_redacted(self, app, caplog):
+        """Test that a message out of attempts loses its body and is logged."""
+        import socket
+        from flask_mailman import Mail
+        from app.models import OutboxMessage
+        from app.utils.outbox import deliver_pending, enqueue_mail
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            closed_port = sock.getsockname()[1]
+        app.config.update(
+            MAIL_SERVER='127.0.0.1',
+            MAIL_PORT=closed_port,
+            MAIL_USE_TLS=False,
+            MAIL_OUTBOX_MAX_ATTEMPTS=1,
+        )
+        app.extensions['mailman'] = Mail.init_mail(app.config)
+        enqueue_mail(db.session, 'user@example.com', 'Reset', 'Your password: hunter2')
+        db.session.commit()
+
+        assert deliver_pending() == (0, 1)
+
+        message = OutboxMessage.query.one()
+        assert message.body == ''
+        assert message.last_error
+        assert f'Giving up on outbox message {message.id}' in caplog.text
+
+    def test_background_sender_delivers_reset(self, client, sample_user, smtp_server):
+        """Test that the sender thread picks up a queued reset after the commit."""
+        import time
+        from app.utils.outbox import OutboxSender
+
+        _, email = self._register(client, sample_user)
+        sender = OutboxSender(client.application, poll_interval=0.1)
+        client.application.extensions['mail_outbox_sender'] = sender
+        try:
+            client.post('/forgot_password', json={'email': email})
+            deadline = time.monotonic() + 5
+            while not smtp_server.messages and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            sender.stop(timeout=5)
+
+        assert [e.rcpt_tos for e in smtp_server.messages] == [[email]]
+        assert b'Your temporary password is' in smtp_server.messages[0].content
+
+    def test_sender_starts_for_mail_left_by_earlier_process(
+        self, tmp_path, monkeypatch, smtp_server
+    ):
+        """Test that mail queued before a restart is sent without new mail."""
+        import time
+        from sqlalchemy import create_engine
+        from app import create_app
+        from app.models import OutboxMessage
+
+        path = tmp_path / 'outbox.db'
+        engine = create_engine(f"sqlite:///{path}")
+        db.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(OutboxMessage.__table__.insert().values(
+                recipient='left@example.com', subject='Reset', body='Body'
+            ))
+        engine.dispose()
+
+        monkeypatch.setenv('DATABASE_URL', f"sqlite:///{path}")
+        monkeypatch.setenv('MAIL_OUTBOX_WORKER', 'True')
+        monkeypatch.setenv('MAIL_SERVER', '127.0.0.1')
+        monkeypatch.setenv('MAIL_PORT', str(smtp_server.port))
+        monkeypatch.setenv('MAIL_USE_TLS', 'False')
+        monkeypatch.setenv('MAIL_DEFAULT_SENDER', 'noreply@example.com')
+        restarted = create_app()
+        try:
+            deadline = time.monotonic() + 5
+            while not smtp_server.messages and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            restarted.extensions['mail_outbox_sender'].stop(timeout=5)
+            with restarted.app_context():
+                db.engine.dispose()
+
+        assert [e.rcpt_tos for e in smtp_server.messages] == [['left@example.com']]
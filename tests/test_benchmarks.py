@@ -0,0 +1,68 @@
+import os
+import pytest
+from benchmarks.login_throughput import run_benchmark as run_login_benchmark
+from benchmarks.registration_contention import run_benchmark
+
+
+@pytest.mark.slow
+class TestRegistrationContention:
+    """Short runs of the registration contention benchmark as a stress test."""
+
+    def test_threads_keep_invariants(self, tmp_path):
+        """Concurrent register/unregister on one hot event keeps the invariants."""
+        report = run_benchmark(
+            str(tmp_path / "bench.db"), workers=6, iterations=10, mode="thread"
+        )
+
+        assert report["violations"] == []
+        assert report["requests"] == 6 * 10 * 2
+        # Lock errors are counted separately; everything else is an API response.
+        for outcome in report["outcomes"]:
+            method, status = outcome.split()
+            assert status == "locked" or int(status) < 500
+
+    def test_full_roles_waitlist(self, tmp_path):
+        """With one slot per role most signups are waitlisted, never over capacity."""
+        report = run_benchmark(
+            str(tmp_path / "bench.db"),
+            workers=6,
+            iterations=5,
+            reps_needed=1,
+            instructors_needed=1,
+        )
+
+        assert report["violations"] == []
+        assert report["outcomes"].get("POST 202", 0) > 0
+
+
+@pytest.mark.slow
+class TestLoginThroughput:
+    """Short run of the login throughput benchmark."""
+
+    def test_logins_succeed_for_each_pool_size(self, tmp_path):
+        """Inline and pooled hashing both serve every login."""
+        report = run_login_benchmark(
+            str(tmp_path),
+            pool_sizes=[0, 1],
+            clients=3,
+            logins=2,
+            method="pbkdf2:sha256:1000",
+        )
+
+        assert [run["workers"] for run in report["runs"]] == [0, 1]
+        for run in report["runs"]:
+            assert run["logins"] == 3 * 2
+            assert run["failed"] == 0
+
+    def test_environment_is_restored(self, tmp_path, monkeypatch):
+        """The benchmark leaves the settings of later tests alone."""
+        monkeypatch.delenv("PASSWORD_HASH_METHOD", raising=False)
+        monkeypatch.delenv("SQLITE_JOURNAL_MODE", raising=False)
+        monkeypatch.setenv("DATABASE_URL", "sqlite:///:memory:")
+
+        run_benchmark(str(tmp_path / "bench.db"), workers=2, iterations=1)
+        run_login_benchmark(str(tmp_path), pool_sizes=[0], clients=1, logins=1)
+
+        assert os.environ["DATABASE_URL"] == "sqlite:///:memory:"
+        assert "PASSWORD_HASH_METHOD" not in os.environ
+        assert "SQLITE_JOURNAL_MODE" not in os.environ
@@ -2,7 +2,9 @@ import pytest
 import json
 from app import db
 from app.models import User, Event, Registration
-from datetime import datetime
+from app.utils.broadcast import Broadcaster
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
 
 
 class TestGetEvents:
@@ -82,6 +84,696 @@ class TestGetEvents:
         assert 'Event 2' in titles
 
 
+class TestGetEventsPagination:
+    """Test cases for keyset pagination and filters on the events feed."""
+
+    def _create_events(self, count, **overrides):
+        base = datetime.now() + timedelta(days=1)
+        for i in range(count):
+            fields = dict(
+                title=f"Event {i}",
+                description="Paged event",
+                date=base + timedelta(hours=i),
+                channel="Virtual",
+                language="English",
+                location="Zoom",
+                target_audience="Universities",
+            )
+            fields.update(overrides)
+            db.session.add(Event(**fields))
+        db.session.commit()
+
+    def test_pages_follow_date_order(self, client):
+        """Test walking the feed page by page with next_cursor."""
+        with client.application.app_context():
+            self._create_events(5)
+
+        titles = []
+        cursor = None
+        pages = 0
+        while True:
+            url = '/events?limit=2' + (f'&cursor={cursor}' if cursor else '')
+            response = client.get(url)
+            assert response.status_code == 200
+            data = response.get_json()
+            titles.extend(event['title'] for event in data['events'])
+            pages += 1
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        assert pages == 3
+        assert titles == [f"Event {i}" for i in range(5)]
+
+    def test_last_page_has_no_cursor(self, client):
+        """Test that a page holding every remaining event has no next_cursor."""
+        with client.application.app_context():
+            self._create_events(2)
+
+        response = client.get('/events?limit=2')
+
+        data = response.get_json()
+        assert len(data['events']) == 2
+        assert data['next_cursor'] is None
+
+    def test_filters_by_enum_columns(self, client):
+        """Test that status, channel, language and location filter the feed."""
+        with client.application.app_context():
+            self._create_events(2)
+            self._create_events(1, channel="Donations", language="Hebrew")
+            self._create_events(1, status="approved", location="North")
+
+        assert len(client.get('/events?channel=Donations').get_json()['events']) == 1
+        assert len(client.get('/events?language=Hebrew').get_json()['events']) == 1
+        assert len(client.get('/events?location=North').get_json()['events']) == 1
+        assert len(client.get('/events?status=pending').get_json()['events']) == 3
+        assert len(
+            client.get('/events?channel=Virtual&status=approved').get_json()['events']
+        ) == 1
+
+    def test_invalid_filter_value(self, client):
+        """Test that an unknown filter value is rejected."""
+        response = client.get('/events?channel=Nowhere')
+
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'Invalid channel option'
+
+    def test_invalid_cursor(self, client):
+        """Test that a malformed cursor is rejected."""
+        response = client.get('/events?cursor=not-a-cursor')
+
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'Invalid cursor'
+
+    def test_invalid_limit(self, client):
+        """Test that a non-positive limit is rejected."""
+        response = client.get('/events?limit=0')
+
+        assert response.status_code == 400
+
+
+class TestConditionalRequests:
+    """Test cases for ETag / If-None-Match handling on the public feed."""
+
+    def test_events_not_modified(self, client):
+        """Test that a matching If-None-Match returns 304 with no body."""
+        response = client.get('/events')
+        etag = response.headers['ETag']
+
+        response = client.get('/events', headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+
+    def test_events_etag_changes_after_write(self, client, admin_headers):
+        """Test that creating an event invalidates the feed's ETag."""
+        etag = client.get('/events').headers['ETag']
+
+        client.post('/admin/new', headers=admin_headers, json={
+            'title': 'Fresh Event',
+            'description': 'New',
+            'date': (datetime.now() + timedelta(days=2)).isoformat(),
+            'channel': 'Virtual',
+            'language': 'English',
+            'location': 'Zoom',
+            'target_audience': 'Universities',
+            'group_size': 5,
+            'num_instructors_needed': 1,
+            'num_representatives_needed': 1,
+        })
+
+        response = client.get('/events', headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert len(response.get_json()['events']) == 1
+
+    def test_failed_deferred_bump_keeps_the_write(self, client, admin_headers, monkeypatch):
+        """Test that a failing post-commit version bump does not fail the request."""
+        import app.utils.versions as versions
+
+        bump = versions.bump_versions
+        notified = []
+
+        def bump_or_fail(connection, keys):
+            if keys & versions.DEFERRED_KEYS:
+                raise RuntimeError("database is locked")
+            bump(connection, keys)
+
+        monkeypatch.setattr(versions, "bump_versions", bump_or_fail)
+        monkeypatch.setattr(versions, "_commit_listeners", [notified.append])
+
+        response = client.post('/admin/new', headers=admin_headers, json={
+            'title': 'Durable Event',
+            'description': 'New',
+            'date': (datetime.now() + timedelta(days=2)).isoformat(),
+            'channel': 'Virtual',
+            'language': 'English',
+            'location': 'Zoom',
+            'target_audience': 'Universities',
+            'group_size': 5,
+            'num_instructors_needed': 1,
+            'num_representatives_needed': 1,
+        })
+
+        assert response.status_code == 201
+        assert "events" in notified[0]
+        with client.application.app_context():
+            assert Event.query.filter_by(title='Durable Event').count() == 1
+
+    def test_events_etag_varies_with_query(self, client):
+        """Test that different pages/filters get different ETags."""
+        first = client.get('/events').headers['ETag']
+        filtered = client.get('/events?channel=Virtual').headers['ETag']
+
+        assert first != filtered
+
+    def test_registration_leaves_feed_etag_alone(self, client, admin_headers, sample_event):
+        """Test that a signup that does not change an event's status keeps the feed ETag."""
+        from app.models import ResourceVersion
+
+        with client.application.app_context():
+            sample_event.date = datetime.now() + timedelta(days=3)
+            db.session.add(sample_event)
+            db.session.commit()
+            event_id = sample_event.id
+        etag = client.get('/events').headers['ETag']
+
+        # A guide's signup leaves an event needing two instructors pending.
+        response = client.post(f'/events/{event_id}/register', headers=admin_headers)
+
+        assert response.status_code == 201
+        assert client.get('/events', headers={'If-None-Match': etag}).status_code == 304
+        with client.application.app_context():
+            keys = {row.key for row in ResourceVersion.query.all()}
+        assert keys == {f'registrants:{event_id}', 'events', f'event:{event_id}'}
+
+    def test_registrants_etag_changes_after_registration(
+        self, client, authenticated_headers, sample_event
+    ):
+        """Test that registering invalidates the registrants ETag."""
+        with client.application.app_context():
+            db.session.add(sample_event)
+            db.session.commit()
+            event_id = sample_event.id
+
+        etag = client.get(f'/events/{event_id}/registrants').headers['ETag']
+        assert client.get(
+            f'/events/{event_id}/registrants', headers={'If-None-Match': etag}
+        ).status_code == 304
+
+        client.post(f'/events/{event_id}/register', headers=authenticated_headers)
+
+        response = client.get(
+            f'/events/{event_id}/registrants', headers={'If-None-Match': etag}
+        )
+        assert response.status_code == 200
+        assert len(response.get_json()['registrants']) == 1
+
+
+class TestEventsCache:
+    """Test cases for the in-process cache in front of the events feed."""
+
+    def test_repeat_request_is_served_from_cache(self, client, admin_headers):
+        """Test that an identical request hits the cache."""
+        client.get('/events')
+        client.get('/events')
+
+        stats = client.get('/admin/cache-stats', headers=admin_headers).get_json()['events']
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_commit_invalidates_cache(self, client, sample_event):
+        """Test that committing an Event change empties the cache."""
+        client.get('/events')
+        cache = client.application.extensions['events_cache']
+        assert cache.stats()['size'] == 1
+
+        with client.application.app_context():
+            sample_event.date = datetime.now() + timedelta(days=1)
+            db.session.add(sample_event)
+            db.session.commit()
+
+        assert cache.stats()['size'] == 0
+        assert len(client.get('/events').get_json()['events']) == 1
+
+
+    def test_registration_keeps_cached_pages(self, client, admin_headers, sample_event):
+        """Test that a signup leaves the plain page cached and misses the counts page."""
+        with client.application.app_context():
+            sample_event.date = datetime.now() + timedelta(days=1)
+            db.session.add(sample_event)
+            db.session.commit()
+            event_id = sample_event.id
+        client.get('/events')
+        client.get('/events?include=counts')
+        cache = client.application.extensions['events_cache']
+
+        # A guide's signup leaves the event pending: no feed-wide change.
+        client.post(f'/events/{event_id}/register', headers=admin_headers)
+        hits = cache.stats()['hits']
+        client.get('/events')
+        counts = client.get('/events?include=counts').get_json()
+
+        assert cache.stats()['hits'] == hits + 1
+        assert counts['events'][0]['registration_counts']['Guide']['pending'] == 1
+
+
+class TestNdjsonStreaming:
+    """Test cases for the opt-in application/x-ndjson list format."""
+
+    NDJSON = {'Accept': 'application/x-ndjson'}
+
+    def test_events_stream_every_row(self, client):
+        """Test that the stream is not capped by the JSON page size."""
+        with client.application.app_context():
+            base = datetime.now() + timedelta(days=1)
+            for i in range(3):
+                db.session.add(Event(
+                    title=f"Event {i}",
+                    description="Streamed",
+                    date=base + timedelta(hours=i),
+                    channel="Virtual",
+                    language="English",
+                    location="Zoom",
+                    target_audience="Universities"
+                ))
+            db.session.commit()
+
+        response = client.get('/events', headers=self.NDJSON)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [row['title'] for row in rows] == ['Event 0', 'Event 1', 'Event 2']
+        assert 'ETag' not in response.headers
+
+    def test_events_stream_respects_limit(self, client, sample_event):
+        """Test that an explicit limit still applies to the stream."""
+        with client.application.app_context():
+            sample_event.date = datetime.now() + timedelta(days=1)
+            db.session.add(sample_event)
+            db.session.commit()
+
+        response = client.get('/events?limit=0', headers=self.NDJSON)
+
+        assert response.status_code == 400
+
+    def test_registrants_stream(self, client, sample_event, sample_user):
+        """Test streaming the registrants of an event."""
+        with client.application.app_context():
+            db.session.add(sample_user)
+            db.session.add(sample_event)
+            db.session.commit()
+            db.session.add(Registration(user_id=sample_user.id, event_id=sample_event.id))
+            db.session.commit()
+            event_id = sample_event.id
+
+        response = client.get(f'/events/{event_id}/registrants', headers=self.NDJSON)
+
+        lines = response.get_data(as_text=True).splitlines()
+        assert len(lines) == 1
+        assert json.loads(lines[0])['firstName'] == 'Test'
+
+    def test_json_remains_default(self, client):
+        """Test that clients without the Accept header still get JSON."""
+        response = client.get('/events', headers={'Accept': '*/*'})
+
+        assert response.mimetype == 'application/json'
+
+
+class TestSparseFieldsets:
+    """Test cases for ?fields= on the events feed."""
+
+    def test_only_requested_fields_are_loaded(self, client, sample_event):
+        """Test that unrequested columns are neither selected nor returned."""
+        with client.application.app_context():
+            sample_event.date = datetime.now() + timedelta(days=1)
+            db.session.add(sample_event)
+            db.session.commit()
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            sa_event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                response = client.get('/events?fields=title,date,status')
+            finally:
+                sa_event.remove(db.engine, "before_cursor_execute", record)
+
+        assert response.status_code == 200
+        event = response.get_json()['events'][0]
+        assert set(event) == {'id', 'title', 'date', 'status'}
+        event_selects = [s for s in statements if 'FROM event' in s]
+        assert event_selects
+        assert all('group_description' not in s for s in event_selects)
+
+    def test_unknown_field(self, client):
+        """Test that unknown field names are rejected."""
+        response = client.get('/events?fields=title,password_hash')
+
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'Unknown field: password_hash'
+
+
+class TestEventCounts:
+    """Test cases for ?include=counts on the events feed."""
+
+    def test_counts_by_role_and_status(self, client, sample_event):
+        """Test that counts are grouped by role and registration status."""
+        with client.application.app_context():
+            sample_event.date = datetime.now() + timedelta(days=1)
+            db.session.add(sample_event)
+            users = []
+            for i, role in enumerate(["Guide", "Guide", "Family Representative"]):
+                user = User(
+                    first_name="User",
+                    last_name=str(i),
+                    email=f"counts{i}@example.com",
+                    role=role
+                )
+                user.password_hash = "unused"
+                users.append(user)
+                db.session.add(user)
+            db.session.commit()
+            db.session.add_all([
+                Registration(user_id=users[0].id, event_id=sample_event.id, status="pending"),
+                Registration(user_id=users[1].id, event_id=sample_event.id, status="approved"),
+                Registration(user_id=users[2].id, event_id=sample_event.id, status="approved"),
+            ])
+            db.session.commit()
+
+        response = client.get('/events?include=counts')
+
+        assert response.status_code == 200
+        counts = response.get_json()['events'][0]['registration_counts']
+        assert counts == {
+            'Guide': {'approved': 1, 'pending': 1},
+            'Family Representative': {'approved': 1, 'pending': 0},
+        }
+
+    def test_counts_etag_tracks_registrations(self, client, sample_event, sample_user):
+        """Test that a new registration invalidates the counts ETag."""
+        with client.application.app_context():
+            sample_event.date = datetime.now() + timedelta(days=1)
+            db.session.add(sample_event)
+            db.session.add(sample_user)
+            db.session.commit()
+            etag = client.get('/events?include=counts').headers['ETag']
+
+            db.session.add(Registration(user_id=sample_user.id, event_id=sample_event.id))
+            db.session.commit()
+
+        response = client.get('/events?include=counts', headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        counts = response.get_json()['events'][0]['registration_counts']
+        assert counts['Family Representative']['approved'] == 1
+
+    def test_unknown_include(self, client):
+        """Test that unknown include values are rejected."""
+        response = client.get('/events?include=everything')
+
+        assert response.status_code == 400
+
+
+class TestSearchEvents:
+    """Test cases for full-text event search."""
+
+    def _create(self, title, description, group_description=None, days=1):
+        event = Event(
+            title=title,
+            description=description,
+            date=datetime.now() + timedelta(days=days),
+            channel="Virtual",
+            language="English",
+            location="Zoom",
+            target_audience="Universities",
+            group_description=group_description
+        )
+        db.session.add(event)
+        db.session.commit()
+        return event
+
+    def test_search_matches_all_indexed_columns(self, client):
+        """Test that title, description and group description are searched."""
+        with client.application.app_context():
+            self._create("Kibbutz visit", "Morning tour")
+            self._create("Lecture", "Story of the kibbutz")
+            self._create("Meetup", "Evening", group_description="Kibbutz volunteers")
+            self._create("Unrelated", "Nothing to see")
+
+        response = client.get('/events/search?q=kibbutz')
+
+        assert response.status_code == 200
+        titles = {event['title'] for event in response.get_json()['events']}
+        assert titles == {"Kibbutz visit", "Lecture", "Meetup"}
+
+    def test_search_ranks_and_paginates(self, client):
+        """Test that better matches come first and pages do not overlap."""
+        with client.application.app_context():
+            self._create("Hostages talk", "A talk")
+            self._create("Square", "Hostages hostages hostages square talk")
+            self._create("Other", "Hostages mentioned once among many many other words here")
+
+        first = client.get('/events/search?q=hostages&limit=2').get_json()
+        second = client.get(f"/events/search?q=hostages&limit=2&page={first['next_page']}").get_json()
+
+        assert len(first['events']) == 2
+        assert len(second['events']) == 1
+        assert second['next_page'] is None
+        assert first['events'][0]['title'] == "Square"
+
+    def test_search_tracks_updates_and_deletes(self, client):
+        """Test that the index follows edits and deletions of events."""
+        with client.application.app_context():
+            event = self._create("Old title", "Desc")
+            event.title = "Renamed"
+            db.session.commit()
+
+            assert client.get('/events/search?q=old').get_json()['events'] == []
+            assert len(client.get('/events/search?q=renamed').get_json()['events']) == 1
+
+            db.session.delete(event)
+            db.session.commit()
+
+        assert client.get('/events/search?q=renamed').get_json()['events'] == []
+
+    def test_counter_updates_skip_the_index(self, client):
+        """Test that only changes to indexed columns fire the FTS update trigger."""
+        from sqlalchemy import text
+        from app.utils.search import install_search_index
+
+        with client.application.app_context():
+            with db.engine.begin() as connection:
+                # A database created with the former, column-less trigger.
+                connection.execute(text("DROP TRIGGER event_fts_au"))
+                connection.execute(text(
+                    "CREATE TRIGGER event_fts_au AFTER UPDATE ON event BEGIN SELECT 1; END"
+                ))
+                install_search_index(connection)
+                sql = connection.execute(text(
+                    "SELECT sql FROM sqlite_master WHERE name = 'event_fts_au'"
+                )).scalar()
+
+        assert 'AFTER UPDATE OF title, description, group_description ON event' in sql
+
+    def test_search_skips_past_events(self, client):
+        """Test that search, like the feed, only returns upcoming events."""
+        with client.application.app_context():
+            self._create("Archive", "Past", days=-30)
+
+        assert client.get('/events/search?q=archive').get_json()['events'] == []
+
+    def test_search_ignores_query_syntax(self, client):
+        """Test that FTS operators in user input are treated as plain words."""
+        response = client.get('/events/search?q=title:"foo" OR (bar')
+
+        assert response.status_code == 200
+
+    def test_search_requires_query(self, client):
+        """Test that an empty query is rejected."""
+        assert client.get('/events/search').status_code == 400
+
+
+class TestEventStream:
+    """Test cases for the Server-Sent Events feed of event changes."""
+
+    def _open(self, client, **headers):
+        client.application.config['EVENTS_STREAM_HEARTBEAT'] = 0
+        response = client.get('/events/stream', headers=headers, buffered=False)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        chunks = response.iter_encoded()
+        assert next(chunks).startswith(b'retry:')
+        return response, chunks
+
+    def _next_message(self, chunks):
+        for _ in range(10):
+            chunk = next(chunks).decode()
+            if not chunk.startswith(':'):
+                return chunk
+        raise AssertionError("no message on the stream")
+
+    def test_registration_pushes_change(self, client, authenticated_headers, sample_event):
+        """Test that auto-approval by a registration reaches subscribers."""
+        with client.application.app_context():
+            sample_event.date = datetime.now() + timedelta(days=1)
+            db.session.add(sample_event)
+            db.session.commit()
+            event_id = sample_event.id
+
+        response, chunks = self._open(client)
+        client.post(f'/events/{event_id}/register', headers=authenticated_headers)
+
+        message = self._next_message(chunks)
+        response.close()
+
+        lines = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+        assert lines['event'] == 'change'
+        assert json.loads(lines['data']) == {
+            'id': event_id,
+            'status': 'approved',
+            'num_family_reps_registered': 1,
+            'num_guides_registered': 0,
+        }
+
+    def test_resume_from_last_event_id(self, client):
+        """Test that a reconnecting client gets the messages it missed."""
+        broadcaster = client.application.extensions['event_broadcaster']
+        first = broadcaster.publish({'id': 1, 'status': 'approved'})
+        broadcaster.publish({'id': 2, 'status': 'pending'})
+
+        response, chunks = self._open(client, **{'Last-Event-ID': str(first)})
+        message = self._next_message(chunks)
+        response.close()
+
+        assert '"id": 2' in message
+
+    def test_stale_last_event_id_resets(self, client):
+        """Test that a client whose position is unknown is told to reload."""
+        response, chunks = self._open(client, **{'Last-Event-ID': '1'})
+        message = self._next_message(chunks)
+        response.close()
+
+        assert 'event: reset' in message
+
+    def test_invalid_last_event_id(self, client):
+        """Test that a malformed Last-Event-ID is rejected."""
+        response = client.get('/events/stream', headers={'Last-Event-ID': 'abc'})
+
+        assert response.status_code == 400
+
+    def test_subscriber_limit(self, client):
+        """Test that streams beyond the limit get 503 until one closes."""
+        broadcaster = client.application.extensions['event_broadcaster']
+        broadcaster.max_subscribers = 1
+
+        response, _ = self._open(client)
+        rejected = client.get('/events/stream')
+        assert rejected.status_code == 503
+        assert rejected.headers['Retry-After'] == '5'
+
+        response.close()
+        assert broadcaster.subscribers == 0
+        response, _ = self._open(client)
+        response.close()
+
+    def test_unchanged_event_is_not_repeated(self, client):
+        """Test that publishing identical state twice sends one message."""
+        broadcaster = client.application.extensions['event_broadcaster']
+
+        assert broadcaster.publish({'id': 1, 'status': 'approved'}) is not None
+        assert broadcaster.publish({'id': 1, 'status': 'approved'}) is None
+
+    def test_published_states_are_bounded_by_history(self):
+        """Test that events whose last message left the history are forgotten."""
+        broadcaster = Broadcaster(history=2)
+        for event_id in range(5):
+            broadcaster.publish({'id': event_id, 'status': 'approved'})
+
+        assert set(broadcaster._published) == {3, 4}
+        assert broadcaster.publish({'id': 0, 'status': 'approved'}) is not None
+
+
+class TestEventFacets:
+    """Test cases for the facet counts endpoint."""
+
+    def _create(self, **fields):
+        defaults = dict(
+            title="Event",
+            description="Faceted",
+            date=datetime.now() + timedelta(days=1),
+            channel="Virtual",
+            language="English",
+            location="Zoom",
+            target_audience="Universities"
+        )
+        defaults.update(fields)
+        db.session.add(Event(**defaults))
+
+    def test_facet_counts(self, client):
+        """Test counts for every option, including zero counts."""
+        with client.application.app_context():
+            self._create()
+            self._create(language="Hebrew", location="North")
+            self._create(channel="Donations", language="Hebrew")
+            self._create(date=datetime.now() - timedelta(days=10))
+            db.session.commit()
+
+        response = client.get('/events/facets')
+
+        assert response.status_code == 200
+        facets = response.get_json()['facets']
+        assert facets['channel']['Virtual'] == 2
+        assert facets['channel']['Donations'] == 1
+        assert facets['channel']['Business Sector'] == 0
+        assert facets['language'] == {
+            'Hebrew': 2, 'English': 1, 'Arabic': 0, 'Russian': 0,
+            'French': 0, 'Spanish': 0, 'Other': 0
+        }
+        assert facets['location']['North'] == 1
+        assert facets['target_audience']['Universities'] == 3
+
+    def test_facets_apply_other_filters(self, client):
+        """Test that each facet honours every filter except its own."""
+        with client.application.app_context():
+            self._create()
+            self._create(language="Hebrew")
+            self._create(channel="Donations", language="Hebrew")
+            db.session.commit()
+
+        facets = client.get('/events/facets?language=Hebrew').get_json()['facets']
+
+        assert facets['channel']['Virtual'] == 1
+        assert facets['channel']['Donations'] == 1
+        assert facets['language']['English'] == 1
+        assert facets['language']['Hebrew'] == 2
+
+    def test_facets_single_query(self, client):
+        """Test that all facets are computed by one statement."""
+        with client.application.app_context():
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            sa_event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                client.get('/events/facets')
+            finally:
+                sa_event.remove(db.engine, "before_cursor_execute", record)
+
+        assert len([s for s in statements if 'FROM event' in s]) == 1
+
+    def test_facets_invalid_filter(self, client):
+        """Test that invalid filter values are rejected."""
+        assert client.get('/events/facets?location=Mars').status_code == 400
+
+
 class TestGetEventRegistrants:
     """Test cases for getting event registrants."""
     
@@ -194,6 +886,94 @@ class TestGetEventRegistrants:
         assert 'user2@example.com' in emails
 
 
+class TestGetRegistrantsBatch:
+    """Test cases for fetching registrants of several events at once."""
+
+    def _setup(self, event_count, users_per_event, prefix="batch"):
+        event_ids = []
+        for e in range(event_count):
+            event = Event(
+                title=f"Event {e}",
+                description="Batch",
+                date=datetime.now() + timedelta(days=1),
+                channel="Virtual",
+                language="English",
+                location="Zoom",
+                target_audience="Universities"
+            )
+            db.session.add(event)
+            db.session.flush()
+            for u in range(users_per_event):
+                user = User(
+                    first_name="User",
+                    last_name=f"{e}-{u}",
+                    email=f"{prefix}{e}-{u}@example.com",
+                    role="Guide"
+                )
+                user.password_hash = "unused"
+                db.session.add(user)
+                db.session.flush()
+                db.session.add(Registration(user_id=user.id, event_id=event.id))
+            event_ids.append(event.id)
+        db.session.commit()
+        return event_ids
+
+    def _count_selects(self, client, url):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append(statement)
+
+        sa_event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            response = client.get(url)
+        finally:
+            sa_event.remove(db.engine, "before_cursor_execute", record)
+        return response, len(statements)
+
+    def test_grouped_by_event(self, client):
+        """Test that registrants come back keyed by event id."""
+        with client.application.app_context():
+            first, second, empty = self._setup(3, 0)
+            user = User(first_name="A", last_name="B", email="ab@example.com")
+            user.password_hash = "unused"
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Registration(user_id=user.id, event_id=first))
+            db.session.add(Registration(user_id=user.id, event_id=second))
+            db.session.commit()
+
+        response = client.get(f'/events/registrants?ids={first},{second},{empty},999')
+
+        assert response.status_code == 200
+        data = response.get_json()['registrants']
+        assert set(data) == {str(first), str(second), str(empty)}
+        assert data[str(first)][0]['email'] == 'ab@example.com'
+        assert data[str(empty)] == []
+
+    def test_query_count_is_constant(self, client):
+        """Test that the number of queries does not grow with the data."""
+        with client.application.app_context():
+            small = self._setup(1, 1)
+            large = self._setup(5, 4, prefix="large")
+
+            _, small_queries = self._count_selects(
+                client, f"/events/registrants?ids={','.join(map(str, small))}"
+            )
+            response, large_queries = self._count_selects(
+                client, f"/events/registrants?ids={','.join(map(str, large))}"
+            )
+
+        assert sum(len(v) for v in response.get_json()['registrants'].values()) == 20
+        assert small_queries == large_queries
+
+    def test_invalid_ids(self, client):
+        """Test that missing or malformed ids are rejected."""
+        assert client.get('/events/registrants').status_code == 400
+        assert client.get('/events/registrants?ids=1,abc').status_code == 400
+
+
 class TestGetEventPendingRegistrations:
     """Test cases for getting pending registrations for a specific event."""
     
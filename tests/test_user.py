@@ -1,8 +1,10 @@
 import pytest
 import json
 from app import db
-from app.models import User, Event, Registration
-from datetime import datetime
+from app.models import User, Event, Registration, WaitlistEntry
+from app.utils.replica import STICKY_COOKIE
+from flask_jwt_extended import create_access_token
+from datetime import datetime, timedelta
 
 
 class TestGetCurrentUser:
@@ -130,6 +132,422 @@ class TestRegisterForEvent:
         assert response.status_code == 401
 
 
+class TestRegisterStatements:
+    """Test cases for the single-statement registration path."""
+
+    def test_register_without_pre_checks(self, client, authenticated_headers, sample_event):
+        """Test that a signup is one INSERT plus counter/status UPDATEs, no SELECTs."""
+        from sqlalchemy import event as sa_event
+
+        with client.application.app_context():
+            db.session.add(sample_event)
+            db.session.commit()
+            event_id = sample_event.id
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement.lstrip().split()[0].upper())
+
+            sa_event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                response = client.post(f'/events/{event_id}/register', headers=authenticated_headers)
+            finally:
+                sa_event.remove(db.engine, "before_cursor_execute", record)
+
+        assert response.status_code == 201
+        assert 'SELECT' not in statements
+        # Registration and its event's version; the approval then bumps the
+        # feed version in a transaction of its own after the commit.
+        assert statements.count('INSERT') == 3
+
+    def test_register_approves_staffed_event(self, client, authenticated_headers, sample_event):
+        """Test that a family representative signup approves the event."""
+        with client.application.app_context():
+            db.session.add(sample_event)
+            db.session.commit()
+            event_id = sample_event.id
+
+        client.post(f'/events/{event_id}/register', headers=authenticated_headers)
+
+        with client.application.app_context():
+            event = db.session.get(Event, event_id)
+            assert event.status == 'approved'
+            assert event.num_family_reps_registered == 1
+
+
+class CapacityHelpers:
+    """Helpers creating limited-capacity events and users with ready-made tokens."""
+
+    def _event(self, reps=1, guides=1):
+        event = Event(
+            title="Popular",
+            description="Limited seats",
+            date=datetime.now() + timedelta(days=1),
+            channel="Virtual",
+            language="English",
+            location="Zoom",
+            target_audience="Universities",
+            num_representatives_needed=reps,
+            num_instructors_needed=guides
+        )
+        db.session.add(event)
+        db.session.commit()
+        return event.id
+
+    def _headers(self, name, role="Family Representative"):
+        user = User(first_name=name, last_name="User", email=f"{name}@example.com", role=role)
+        user.password_hash = "unused"
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(
+            identity=str(user.id), additional_claims={"token_version": 0}
+        )
+        return user.id, {'Authorization': f'Bearer {token}'}
+
+
+class TestWaitlist(CapacityHelpers):
+    """Test cases for per-role capacity and the waitlist."""
+
+    def test_full_role_goes_to_waitlist(self, client):
+        """Test that signups beyond a role's capacity are queued in order."""
+        with client.application.app_context():
+            event_id = self._event(reps=1)
+            _, first = self._headers("first")
+            _, second = self._headers("second")
+            _, third = self._headers("third")
+            _, guide = self._headers("guide", role="Guide")
+
+        assert client.post(f'/events/{event_id}/register', headers=first).status_code == 201
+
+        response = client.post(f'/events/{event_id}/register', headers=second)
+        assert response.status_code == 202
+        assert response.get_json()['status'] == 'waitlisted'
+        assert response.get_json()['position'] == 1
+        assert client.post(f'/events/{event_id}/register', headers=third).get_json()['position'] == 2
+
+        # Guides have their own capacity.
+        assert client.post(f'/events/{event_id}/register', headers=guide).status_code == 201
+
+        duplicate = client.post(f'/events/{event_id}/register', headers=second)
+        assert duplicate.status_code == 400
+        assert duplicate.get_json()['message'] == 'Already on the waitlist'
+
+        with client.application.app_context():
+            event = db.session.get(Event, event_id)
+            assert event.num_family_reps_registered == 1
+
+    def test_unregister_promotes_next_in_line(self, client):
+        """Test that a freed slot goes to the oldest waitlisted user."""
+        with client.application.app_context():
+            event_id = self._event(reps=1)
+            _, first = self._headers("first")
+            second_id, second = self._headers("second")
+            third_id, third = self._headers("third")
+
+        client.post(f'/events/{event_id}/register', headers=first)
+        client.post(f'/events/{event_id}/register', headers=second)
+        client.post(f'/events/{event_id}/register', headers=third)
+
+        response = client.delete(f'/events/{event_id}/unregister', headers=first)
+        assert response.status_code == 200
+
+        with client.application.app_context():
+            promoted = db.session.get(Registration, (second_id, event_id))
+            assert promoted is not None
+            assert promoted.status == 'approved'
+            assert [e.user_id for e in WaitlistEntry.query.all()] == [third_id]
+            assert db.session.get(Event, event_id).num_family_reps_registered == 1
+
+    def test_leave_waitlist(self, client):
+        """Test that unregistering while waitlisted removes the entry."""
+        with client.application.app_context():
+            event_id = self._event(reps=1)
+            _, first = self._headers("first")
+            _, second = self._headers("second")
+
+        client.post(f'/events/{event_id}/register', headers=first)
+        client.post(f'/events/{event_id}/register', headers=second)
+
+        response = client.delete(f'/events/{event_id}/unregister', headers=second)
+
+        assert response.status_code == 200
+        assert response.get_json()['message'] == 'Removed from waitlist'
+        with client.application.app_context():
+            assert WaitlistEntry.query.count() == 0
+
+    def test_slot_freed_while_joining_waitlist(self, client, monkeypatch):
+        """Test that a slot freed between the failed claim and the waitlist join is taken."""
+        import app.routes.user as user_routes
+
+        with client.application.app_context():
+            event_id = self._event(reps=1)
+            first_id, first = self._headers("first")
+            second_id, second = self._headers("second")
+
+        client.post(f'/events/{event_id}/register', headers=first)
+        join = user_routes.join_waitlist
+
+        def unregister_then_join(event_id, user_id):
+            # A concurrent unregister commits first and finds nobody waiting.
+            connection = db.session.connection()
+            connection.execute(
+                Registration.__table__.delete().where(Registration.user_id == first_id)
+            )
+            connection.execute(
+                Event.__table__.update()
+                .where(Event.id == event_id)
+                .values(num_family_reps_registered=0)
+            )
+            return join(event_id, user_id)
+
+        monkeypatch.setattr(user_routes, "join_waitlist", unregister_then_join)
+
+        response = client.post(f'/events/{event_id}/register', headers=second)
+
+        assert response.status_code == 201
+        assert response.get_json()['status'] == 'approved'
+        with client.application.app_context():
+            assert db.session.get(Registration, (second_id, event_id)) is not None
+            assert WaitlistEntry.query.count() == 0
+            event = db.session.get(Event, event_id)
+            assert event.num_family_reps_registered == 1
+            assert event.status == 'approved'
+
+    def test_registering_clears_own_waitlist_entry(self, client):
+        """Test that a waitlisted user who registers directly is not promoted later."""
+        with client.application.app_context():
+            event_id = self._event(reps=1)
+            _, first = self._headers("first")
+            second_id, second = self._headers("second")
+
+        client.post(f'/events/{event_id}/register', headers=first)
+        client.post(f'/events/{event_id}/register', headers=second)
+
+        with client.application.app_context():
+            db.session.get(Event, event_id).num_representatives_needed = 2
+            db.session.commit()
+
+        assert client.post(f'/events/{event_id}/register', headers=second).status_code == 201
+        with client.application.app_context():
+            assert WaitlistEntry.query.count() == 0
+
+        response = client.delete(f'/events/{event_id}/unregister', headers=second)
+
+        assert response.status_code == 200
+        with client.application.app_context():
+            assert db.session.get(Registration, (second_id, event_id)) is None
+
+    def test_promotion_skips_registered_users(self, client):
+        """Test that a leftover entry of a registered user is dropped, not promoted."""
+        with client.application.app_context():
+            event_id = self._event(reps=2)
+            first_id, first = self._headers("first")
+            second_id, second = self._headers("second")
+            third_id, third = self._headers("third")
+
+        client.post(f'/events/{event_id}/register', headers=first)
+        client.post(f'/events/{event_id}/register', headers=second)
+        client.post(f'/events/{event_id}/register', headers=third)
+
+        with client.application.app_context():
+            # An entry left behind for a registered user, ahead of the queue.
+            db.session.add(WaitlistEntry(user_id=second_id, event_id=event_id, id=0))
+            db.session.commit()
+
+        response = client.delete(f'/events/{event_id}/unregister', headers=first)
+
+        assert response.status_code == 200
+        with client.application.app_context():
+            assert db.session.get(Registration, (second_id, event_id)) is not None
+            assert db.session.get(Registration, (third_id, event_id)) is not None
+            assert db.session.get(Registration, (first_id, event_id)) is None
+            assert WaitlistEntry.query.count() == 0
+            assert db.session.get(Event, event_id).num_family_reps_registered == 2
+
+    def test_zero_capacity_is_unlimited(self, client):
+        """Test that roles with no configured need are never waitlisted."""
+        with client.application.app_context():
+            event_id = self._event(reps=0)
+            headers = [self._headers(f"user{i}")[1] for i in range(3)]
+
+        for h in headers:
+            assert client.post(f'/events/{event_id}/register', headers=h).status_code == 201
+
+
+class TestBulkRegistrations(CapacityHelpers):
+    """Test cases for registering and unregistering for many events at once."""
+
+    def test_bulk_register(self, client):
+        """Test per-event results of a bulk registration."""
+        with client.application.app_context():
+            open_id = self._event(reps=0)
+            full_id = self._event(reps=1)
+            _, other = self._headers("other")
+            user_id, headers = self._headers("bulk")
+
+        client.post(f'/events/{full_id}/register', headers=other)
+
+        response = client.post(
+            '/me/registrations',
+            json={'event_ids': [open_id, full_id, 999]},
+            headers=headers
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()['results'] == {
+            str(open_id): 'approved',
+            str(full_id): 'waitlisted',
+            '999': 'not_found',
+        }
+
+        again = client.post(
+            '/me/registrations', json={'event_ids': [open_id, full_id]}, headers=headers
+        )
+        assert again.get_json()['results'] == {
+            str(open_id): 'already_registered',
+            str(full_id): 'already_waitlisted',
+        }
+
+        with client.application.app_context():
+            event = db.session.get(Event, open_id)
+            assert event.num_family_reps_registered == 1
+            assert event.status == 'approved'
+
+    def test_bulk_register_concurrent_duplicate(self, client, monkeypatch):
+        """Test that a registration landing mid-request is skipped and its slot released."""
+        import app.routes.user as user_routes
+
+        with client.application.app_context():
+            event_id = self._event(reps=0)
+            user_id, headers = self._headers("racer")
+
+        claim = user_routes.claim_staffing_slots
+
+        def claim_then_race(connection, event_ids, *args):
+            claimed = claim(connection, event_ids, *args)
+            # A parallel request registers the user right after the claim.
+            connection.execute(
+                Registration.__table__.insert().values(
+                    user_id=user_id, event_id=event_id, status="approved"
+                )
+            )
+            connection.execute(
+                Event.__table__.update()
+                .where(Event.id == event_id)
+                .values(num_family_reps_registered=Event.num_family_reps_registered + 1)
+            )
+            return claimed
+
+        monkeypatch.setattr(user_routes, "claim_staffing_slots", claim_then_race)
+
+        response = client.post(
+            '/me/registrations', json={'event_ids': [event_id]}, headers=headers
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()['results'] == {str(event_id): 'already_registered'}
+        with client.application.app_context():
+            assert db.session.get(Event, event_id).num_family_reps_registered == 1
+
+    def test_bulk_slot_freed_while_joining_waitlist(self, client, monkeypatch):
+        """Test that the bulk path also takes a slot freed before its waitlist join."""
+        import app.routes.user as user_routes
+
+        with client.application.app_context():
+            event_id = self._event(reps=1)
+            first_id, first = self._headers("first")
+            _, second = self._headers("second")
+
+        client.post(f'/events/{event_id}/register', headers=first)
+        join = user_routes.join_waitlists
+
+        def unregister_then_join(connection, event_ids, user_id):
+            connection.execute(
+                Registration.__table__.delete().where(Registration.user_id == first_id)
+            )
+            connection.execute(
+                Event.__table__.update()
+                .where(Event.id == event_id)
+                .values(num_family_reps_registered=0)
+            )
+            return join(connection, event_ids, user_id)
+
+        monkeypatch.setattr(user_routes, "join_waitlists", unregister_then_join)
+
+        response = client.post(
+            '/me/registrations', json={'event_ids': [event_id]}, headers=second
+        )
+
+        assert response.get_json()['results'] == {str(event_id): 'approved'}
+        with client.application.app_context():
+            assert WaitlistEntry.query.count() == 0
+            assert db.session.get(Event, event_id).num_family_reps_registered == 1
+
+    def test_bulk_register_statement_count(self, client):
+        """Test that the number of statements does not grow with the event count."""
+        from sqlalchemy import event as sa_event
+
+        counts = []
+        for size in (1, 5):
+            with client.application.app_context():
+                event_ids = [self._event(reps=0) for _ in range(size)]
+                _, headers = self._headers(f"counter{size}")
+                engine = db.engine
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            sa_event.listen(engine, "before_cursor_execute", record)
+            try:
+                response = client.post(
+                    '/me/registrations', json={'event_ids': event_ids}, headers=headers
+                )
+            finally:
+                sa_event.remove(engine, "before_cursor_execute", record)
+            assert response.status_code == 200
+            counts.append(len(statements))
+
+        assert counts[0] == counts[1]
+
+    def test_bulk_unregister_promotes(self, client):
+        """Test that bulk unregistering frees slots for waitlisted users."""
+        with client.application.app_context():
+            first_id = self._event(reps=1)
+            second_id = self._event(reps=1)
+            user_id, headers = self._headers("leaver")
+            waiting_id, waiting = self._headers("waiting")
+
+        client.post('/me/registrations', json={'event_ids': [first_id]}, headers=headers)
+        client.post('/me/registrations', json={'event_ids': [first_id, second_id]}, headers=waiting)
+        client.post('/me/registrations', json={'event_ids': [second_id]}, headers=headers)
+
+        response = client.delete(
+            '/me/registrations', json={'event_ids': [first_id, second_id, 999]}, headers=headers
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()['results'] == {
+            str(first_id): 'unregistered',
+            str(second_id): 'left_waitlist',
+            '999': 'not_registered',
+        }
+        with client.application.app_context():
+            assert db.session.get(Registration, (waiting_id, first_id)) is not None
+            assert db.session.get(Registration, (waiting_id, second_id)) is not None
+            first = db.session.get(Event, first_id)
+            assert first.num_family_reps_registered == 1
+            assert first.status == 'approved'
+            assert WaitlistEntry.query.count() == 0
+
+    def test_bulk_invalid_payload(self, client, authenticated_headers):
+        """Test that a missing or malformed id list is rejected."""
+        for payload in ({}, {'event_ids': []}, {'event_ids': ['x']}):
+            response = client.post('/me/registrations', json=payload, headers=authenticated_headers)
+            assert response.status_code == 400
+
+
 class TestUnregisterFromEvent:
     """Test cases for event unregistration."""
     
@@ -226,4 +644,189 @@ class TestGetMyEvents:
         """Test getting user's events without authentication."""
         response = client.get('/me/events')
         
-        assert response.status_code == 401
\ No newline at end of file
+        assert response.status_code == 401
+
+    def test_get_my_events_fields(self, client, authenticated_headers, sample_event):
+        """Test restricting /me/events to a sparse fieldset."""
+        with client.application.app_context():
+            sample_event.date = datetime.now() + timedelta(days=1)
+            db.session.add(sample_event)
+            db.session.commit()
+            event_id = sample_event.id
+
+        client.post(f'/events/{event_id}/register', headers=authenticated_headers)
+
+        response = client.get('/me/events?fields=title,date', headers=authenticated_headers)
+
+        assert response.status_code == 200
+        event = response.get_json()['events'][0]
+        assert set(event) == {'id', 'title', 'date', 'registration_status'}
+
+
+class TestGetMyEventsRange:
+    """Test cases for date ranges and pagination on /me/events."""
+
+    def _register_for(self, client, headers, days_from_now):
+        with client.application.app_context():
+            event_ids = []
+            for days in days_from_now:
+                event = Event(
+                    title=f"In {days} days",
+                    description="Ranged",
+                    date=datetime.now() + timedelta(days=days),
+                    channel="Virtual",
+                    language="English",
+                    location="Zoom",
+                    target_audience="Universities"
+                )
+                db.session.add(event)
+                db.session.commit()
+                event_ids.append(event.id)
+        for event_id in event_ids:
+            client.post(f'/events/{event_id}/register', headers=headers)
+
+    def test_date_range(self, client, authenticated_headers):
+        """Test that from/to bound the returned events."""
+        self._register_for(client, authenticated_headers, [-20, -5, 3, 10])
+        start = (datetime.now() - timedelta(days=7)).isoformat()
+        end = (datetime.now() + timedelta(days=5)).isoformat()
+
+        response = client.get(f'/me/events?from={start}&to={end}', headers=authenticated_headers)
+
+        assert response.status_code == 200
+        titles = [event['title'] for event in response.get_json()['events']]
+        assert titles == ['In -5 days', 'In 3 days']
+
+    def test_cursor_pagination(self, client, authenticated_headers):
+        """Test paging through registrations in date order."""
+        self._register_for(client, authenticated_headers, [3, 1, 2])
+
+        first = client.get('/me/events?limit=2', headers=authenticated_headers).get_json()
+        second = client.get(
+            f"/me/events?limit=2&cursor={first['next_cursor']}", headers=authenticated_headers
+        ).get_json()
+
+        assert [e['title'] for e in first['events']] == ['In 1 days', 'In 2 days']
+        assert [e['title'] for e in second['events']] == ['In 3 days']
+        assert second['next_cursor'] is None
+
+    def test_only_own_registrations(self, client, authenticated_headers):
+        """Test that other events are not cross-joined into the result."""
+        self._register_for(client, authenticated_headers, [1])
+        with client.application.app_context():
+            db.session.add(Event(
+                title="Not mine",
+                description="Other",
+                date=datetime.now() + timedelta(days=2),
+                channel="Virtual",
+                language="English",
+                location="Zoom",
+                target_audience="Universities"
+            ))
+            db.session.commit()
+
+        events = client.get('/me/events', headers=authenticated_headers).get_json()['events']
+
+        assert [event['title'] for event in events] == ['In 1 days']
+
+    def test_invalid_date(self, client, authenticated_headers):
+        """Test that malformed range bounds are rejected."""
+        response = client.get('/me/events?from=yesterday', headers=authenticated_headers)
+
+        assert response.status_code == 400
+
+
+class TestReadReplica(CapacityHelpers):
+    """Test cases for routing GET requests to a read replica."""
+
+    @pytest.fixture
+    def replica_client(self, tmp_path, monkeypatch):
+        """A client whose app has a second SQLite file as its read replica."""
+        from sqlalchemy import create_engine
+        from app import create_app
+
+        replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+        db.metadata.create_all(replica)
+        monkeypatch.setenv('DATABASE_URL', 'sqlite:///:memory:')
+        monkeypatch.setenv('JWT_SECRET_KEY', 'test-secret-key')
+        monkeypatch.setenv('DATABASE_REPLICA_URL', str(replica.url))
+
+        app = create_app()
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+            self.replica = replica
+            yield app.test_client()
+            db.drop_all(bind_key=None)
+        # init_app registered a metadata for the bind on the shared db object;
+        # apps in later tests have no such bind.
+        db.metadatas.pop('replica', None)
+        replica.dispose()
+
+    def _copy_to_replica(self, model, row_id):
+        """Replicate one row of ``model`` by hand."""
+        table = model.__table__
+        row = db.session.execute(
+            table.select().where(table.c.id == row_id)
+        ).mappings().one()
+        with self.replica.begin() as connection:
+            connection.execute(table.insert().values(**row))
+
+    def test_reads_go_to_replica(self, replica_client):
+        """Test that GET requests read the replica, not the primary."""
+        event_id = self._event()
+        self._copy_to_replica(Event, event_id)
+        db.session.get(Event, event_id).title = "Renamed on the primary"
+        db.session.commit()
+
+        events = replica_client.get('/events').get_json()['events']
+
+        assert [event['title'] for event in events] == ["Popular"]
+
+    def test_writer_reads_own_writes(self, replica_client):
+        """Test that a user who just wrote reads from the primary until the window ends."""
+        event_id = self._event()
+        user_id, headers = self._headers("sticky")
+        self._copy_to_replica(Event, event_id)
+        self._copy_to_replica(User, user_id)
+
+        response = replica_client.post(f'/events/{event_id}/register', headers=headers)
+        assert response.status_code == 201
+
+        events = replica_client.get('/me/events', headers=headers).get_json()['events']
+        assert [event['id'] for event in events] == [event_id]
+
+        # The window travels in a cookie, so any worker (here, a fresh client
+        # holding the same cookie) keeps the writer on the primary.
+        other_worker = replica_client.application.test_client()
+        other_worker.set_cookie(
+            STICKY_COOKIE, replica_client.get_cookie(STICKY_COOKIE).value
+        )
+        events = other_worker.get('/me/events', headers=headers).get_json()['events']
+        assert [event['id'] for event in events] == [event_id]
+
+        replica_client.delete_cookie(STICKY_COOKIE)
+        events = replica_client.get('/me/events', headers=headers).get_json()['events']
+        assert events == []
+
+    def test_forged_stickiness_cookie_is_ignored(self, replica_client):
+        """Test that an unsigned or tampered cookie does not pin reads to the primary."""
+        event_id = self._event()
+        user_id, headers = self._headers("forger")
+        self._copy_to_replica(User, user_id)
+        db.session.add(Registration(user_id=user_id, event_id=event_id, status="approved"))
+        db.session.commit()
+
+        replica_client.set_cookie(STICKY_COOKIE, str(user_id))
+        events = replica_client.get('/me/events', headers=headers).get_json()['events']
+
+        assert events == []
+
+    def test_replica_is_read_only(self, replica_client):
+        """Test that the replica engine refuses writes."""
+        from sqlalchemy import text
+        from sqlalchemy.exc import OperationalError
+
+        with db.engines['replica'].connect() as connection:
+            with pytest.raises(OperationalError):
+                connection.execute(text("DELETE FROM event"))
@@ -1,11 +1,30 @@
 import pytest
 from app import db
 from app.models import User, Event, Registration
-from app.utils.autoapprove import should_autoapprove_event
+from app.utils.autoapprove import (
+    reconcile_staffing_counters,
+    reevaluate_event_statuses,
+    should_autoapprove_event,
+)
 from app.utils.decorators import admin_required, super_admin_required
+from app.utils.cache import TTLCache
+from app.utils.passwords import HashingBusy, PasswordHasher, normalize_method
+from app.utils.ratelimit import MemoryBucketStore, parse_rate
+from app.utils.pool import (
+    TimedQueuePool,
+    parse_statement_timeouts,
+    pool_stats,
+    postgres_engine_options,
+)
+from app.utils.sql import ensure_columns, ensure_indexes
+from app.utils.sqlite import (
+    apply_sqlite_pragmas,
+    check_sqlite_settings,
+    effective_sqlite_settings,
+)
 from flask import Flask, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class TestAutoApproveFunction:
@@ -184,6 +203,237 @@ class TestAutoApproveFunction:
             assert result is True
 
 
+class TestStaffingCounters:
+    """Test cases for the denormalized per-event staffing counters."""
+
+    def _user(self, email, role):
+        user = User(first_name="Counted", last_name="User", email=email, role=role)
+        user.set_password("password123")
+        db.session.add(user)
+        return user
+
+    def test_counters_follow_registrations(self, app, sample_event):
+        """Test that adding and removing registrations updates the counters."""
+        with app.app_context():
+            guide = self._user("counter_guide@example.com", "Guide")
+            rep = self._user("counter_rep@example.com", "Family Representative")
+            db.session.add(sample_event)
+            db.session.commit()
+
+            db.session.add(Registration(user_id=guide.id, event_id=sample_event.id))
+            db.session.add(Registration(user_id=rep.id, event_id=sample_event.id))
+            db.session.commit()
+            assert sample_event.num_guides_registered == 1
+            assert sample_event.num_family_reps_registered == 1
+
+            db.session.delete(Registration.query.get((rep.id, sample_event.id)))
+            db.session.commit()
+            assert sample_event.num_family_reps_registered == 0
+            assert sample_event.num_guides_registered == 1
+
+    def test_counters_follow_role_changes(self, app, sample_event):
+        """Test that a role change moves the user's registrations to the other counter."""
+        with app.app_context():
+            user = self._user("switcher@example.com", "Guide")
+            db.session.add(sample_event)
+            db.session.commit()
+            db.session.add(Registration(user_id=user.id, event_id=sample_event.id))
+            db.session.commit()
+            assert sample_event.status == "pending"
+
+            user.role = "Family Representative"
+            db.session.commit()
+
+            event = db.session.get(Event, sample_event.id)
+            assert event.num_guides_registered == 0
+            assert event.num_family_reps_registered == 1
+            assert event.status == "approved"
+
+    def test_counters_follow_deleted_users(self, app, sample_event):
+        """Test that registrations removed by ON DELETE CASCADE are uncounted."""
+        with app.app_context():
+            rep = self._user("leaving_rep@example.com", "Family Representative")
+            sample_event.status = "approved"
+            db.session.add(sample_event)
+            db.session.commit()
+            db.session.add(Registration(user_id=rep.id, event_id=sample_event.id))
+            db.session.commit()
+            event_id = sample_event.id
+            db.session.expire_all()
+
+            db.session.delete(db.session.get(User, rep.id))
+            db.session.commit()
+
+            event = db.session.get(Event, event_id)
+            assert Registration.query.count() == 0
+            assert event.num_family_reps_registered == 0
+            assert event.status == "pending"
+
+    def test_counters_are_rolled_back(self, app, sample_event):
+        """Test that a rolled back registration leaves the counters alone."""
+        with app.app_context():
+            guide = self._user("rollback_guide@example.com", "Guide")
+            db.session.add(sample_event)
+            db.session.commit()
+
+            db.session.add(Registration(user_id=guide.id, event_id=sample_event.id))
+            db.session.flush()
+            db.session.rollback()
+
+            assert db.session.get(Event, sample_event.id).num_guides_registered == 0
+
+    def test_autoapprove_reads_counters(self, app, sample_event):
+        """Test that the decision is a single query on the event row."""
+        from sqlalchemy import event as sa_event
+
+        with app.app_context():
+            sample_event.num_family_reps_registered = 1
+            db.session.add(sample_event)
+            db.session.commit()
+            event_id = sample_event.id
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            sa_event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                assert should_autoapprove_event(event_id) is True
+            finally:
+                sa_event.remove(db.engine, "before_cursor_execute", record)
+
+            assert len(statements) == 1
+
+    def test_reconcile_rebuilds_counters(self, app, runner, sample_event):
+        """Test that the CLI command recomputes drifted counters."""
+        with app.app_context():
+            guide = self._user("reconcile_guide@example.com", "Guide")
+            db.session.add(sample_event)
+            db.session.commit()
+            db.session.add(Registration(user_id=guide.id, event_id=sample_event.id))
+            sample_event.num_family_reps_registered = 5
+            db.session.commit()
+
+            result = runner.invoke(args=["reconcile-staffing-counters"])
+
+            assert "Reconciled staffing counters for 1 events." in result.output
+            db.session.refresh(sample_event)
+            assert sample_event.num_family_reps_registered == 0
+            assert sample_event.num_guides_registered == 1
+
+
+class TestReevaluateEventStatuses:
+    """Test cases for set-based re-evaluation of the auto-approve rule."""
+
+    def _event(self, title, instructors_needed, days=1):
+        event = Event(
+            title=title,
+            description="Reevaluated",
+            date=datetime.now() + timedelta(days=days),
+            channel="Virtual",
+            language="English",
+            location="Zoom",
+            target_audience="Universities",
+            num_instructors_needed=instructors_needed,
+        )
+        db.session.add(event)
+        return event
+
+    def _guide(self, email):
+        guide = User(first_name="Eval", last_name="Guide", email=email, role="Guide")
+        guide.password_hash = "unused"
+        db.session.add(guide)
+        return guide
+
+    def test_one_update_for_many_events(self, app):
+        """Test that stale statuses in both directions are fixed by one statement."""
+        from sqlalchemy import event as sa_event
+
+        with app.app_context():
+            staffed = self._event("Staffed", instructors_needed=1)
+            unstaffed = self._event("Unstaffed", instructors_needed=1)
+            unstaffed.status = "approved"
+            correct = self._event("Correct", instructors_needed=1)
+            guide = self._guide("eval_guide@example.com")
+            db.session.commit()
+            db.session.add(Registration(user_id=guide.id, event_id=staffed.id))
+            db.session.commit()
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            sa_event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                changed = reevaluate_event_statuses()
+            finally:
+                sa_event.remove(db.engine, "before_cursor_execute", record)
+            db.session.commit()
+
+            assert changed == {staffed.id, unstaffed.id}
+            assert len(statements) == 1
+            assert staffed.status == "approved"
+            assert unstaffed.status == "pending"
+            assert correct.status == "pending"
+
+    def test_filters(self, app):
+        """Test that only the listed, or only upcoming, events are touched."""
+        with app.app_context():
+            first = self._event("First", instructors_needed=0)
+            second = self._event("Second", instructors_needed=0)
+            past = self._event("Past", instructors_needed=0, days=-3)
+            for event in (first, second, past):
+                event.status = "approved"
+            db.session.commit()
+
+            assert reevaluate_event_statuses([first.id]) == {first.id}
+            assert reevaluate_event_statuses(upcoming_only=True) == {second.id}
+            db.session.commit()
+            assert past.status == "approved"
+
+    def test_cli_recounts_registrations(self, app, runner):
+        """Test that the nightly command evaluates the rule from registrations."""
+        with app.app_context():
+            event = self._event("Drifted", instructors_needed=1)
+            guide = self._guide("drift_guide@example.com")
+            db.session.commit()
+            db.session.add(Registration(user_id=guide.id, event_id=event.id))
+            db.session.commit()
+            # Counters drifted to zero; the registration is still there.
+            event.num_guides_registered = 0
+            db.session.commit()
+
+            result = runner.invoke(args=["reevaluate-event-statuses"])
+
+            assert "Updated the status of 1 events." in result.output
+            db.session.refresh(event)
+            assert event.status == "approved"
+
+    def test_cli_keeps_admin_approvals(self, app, runner):
+        """Test that the nightly command only promotes and announces each change."""
+        from app.models import ResourceVersion
+
+        with app.app_context():
+            manual = self._event("Approved by hand", instructors_needed=1)
+            manual.status = "approved"
+            staffed = self._event("Staffed", instructors_needed=1)
+            guide = self._guide("nightly_guide@example.com")
+            db.session.commit()
+            db.session.add(Registration(user_id=guide.id, event_id=staffed.id))
+            db.session.commit()
+
+            result = runner.invoke(args=["reevaluate-event-statuses"])
+
+            assert "Updated the status of 1 events." in result.output
+            db.session.refresh(manual)
+            db.session.refresh(staffed)
+            assert manual.status == "approved"
+            assert staffed.status == "approved"
+            assert db.session.get(ResourceVersion, f"event:{staffed.id}") is not None
+
+
 class TestDecorators:
     """Test cases for permission decorators."""
     
@@ -291,4 +541,283 @@ class TestDecorators:
             with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
                 result = protected_route()
                 # Should return 403 response
-                assert result[1] == 403
\ No newline at end of file
+                assert result[1] == 403
+
+class TestTTLCache:
+    """Test cases for the bounded LRU/TTL cache."""
+
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted as hits or misses."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest untouched entry is evicted when full."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_entries_expire(self):
+        """Test that entries older than the TTL are dropped."""
+        cache = TTLCache(maxsize=2, ttl=0)
+        cache.set("a", 1)
+
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+
+class TestSqliteProfile:
+    """Test cases for the SQLite connection PRAGMA profile."""
+
+    def test_file_database_uses_profile(self, tmp_path):
+        """Test that a file database runs with the configured settings."""
+        from sqlalchemy import create_engine, event
+
+        config = {
+            "SQLITE_JOURNAL_MODE": "WAL",
+            "SQLITE_SYNCHRONOUS": "NORMAL",
+            "SQLITE_BUSY_TIMEOUT": "2500",
+            "SQLITE_CACHE_SIZE": "-2000",
+            "SQLITE_TEMP_STORE": "MEMORY",
+        }
+        engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+        event.listen(
+            engine, "connect", lambda conn, _: apply_sqlite_pragmas(conn, config)
+        )
+
+        with engine.connect() as connection:
+            settings = effective_sqlite_settings(connection)
+            assert check_sqlite_settings(connection, config) == []
+
+        assert settings["journal_mode"] == "wal"
+        assert settings["synchronous"] == "NORMAL"
+        assert settings["busy_timeout"] == 2500
+        assert settings["cache_size"] == -2000
+        assert settings["temp_store"] == "MEMORY"
+        assert settings["foreign_keys"] == 1
+
+    def test_reports_settings_not_applied(self, app):
+        """Test that WAL on an in-memory database is reported as not applied."""
+        with app.app_context():
+            with db.engine.connect() as connection:
+                warnings = check_sqlite_settings(
+                    connection, {"SQLITE_JOURNAL_MODE": "WAL"}
+                )
+                assert effective_sqlite_settings(connection)["foreign_keys"] == 1
+
+        assert warnings == ["journal_mode is memory, configured WAL"]
+
+
+class TestConnectionPool:
+    """Test cases for PostgreSQL pool settings and pool statistics."""
+
+    def test_engine_options_from_environment(self, monkeypatch):
+        """Test that DB_* settings drive the engine options."""
+        monkeypatch.setenv("DB_POOL_SIZE", "20")
+        monkeypatch.setenv("DB_MAX_OVERFLOW", "5")
+        monkeypatch.setenv("DB_POOL_PRE_PING", "False")
+        monkeypatch.setenv("DB_STATEMENT_TIMEOUT", "1500")
+
+        options = postgres_engine_options()
+
+        assert options["poolclass"] is TimedQueuePool
+        assert options["pool_size"] == 20
+        assert options["max_overflow"] == 5
+        assert options["pool_pre_ping"] is False
+        assert options["connect_args"] == {"options": "-c statement_timeout=1500"}
+
+    def test_zero_statement_timeout_means_none(self, monkeypatch):
+        """Test that DB_STATEMENT_TIMEOUT=0 leaves the server default."""
+        monkeypatch.setenv("DB_STATEMENT_TIMEOUT", "0")
+        assert "connect_args" not in postgres_engine_options()
+
+    def test_parse_statement_timeouts(self):
+        """Test parsing of per-blueprint statement timeouts."""
+        assert parse_statement_timeouts("events:2000, admin:10000") == {
+            "events": 2000,
+            "admin": 10000,
+        }
+        assert parse_statement_timeouts(None) == {}
+
+    def test_timed_pool_stats(self, tmp_path):
+        """Test that checkouts and occupancy are reported."""
+        from sqlalchemy import create_engine
+
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'pool.db'}",
+            poolclass=TimedQueuePool,
+            pool_size=2,
+            max_overflow=1,
+        )
+        first = engine.connect()
+        second = engine.connect()
+        third = engine.connect()
+
+        stats = pool_stats(engine)
+        assert stats["pool"] == "TimedQueuePool"
+        assert stats["checked_out"] == 3
+        assert stats["overflow"] == 1
+        assert stats["checkouts"] == 3
+
+        for connection in (first, second, third):
+            connection.close()
+        assert pool_stats(engine)["checked_out"] == 0
+        engine.dispose()
+
+
+class TestPasswordHasher:
+    """Test cases for the off-thread password hasher."""
+
+    def test_normalize_method(self):
+        """Test that short method names expand to Werkzeug's stored form."""
+        from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+
+        assert normalize_method("pbkdf2") == f"pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}"
+        assert normalize_method("pbkdf2:sha512:1000") == "pbkdf2:sha512:1000"
+        assert normalize_method("scrypt") == "scrypt:32768:8:1"
+        with pytest.raises(ValueError):
+            normalize_method("md5")
+
+    def test_process_pool_hashes_and_verifies(self):
+        """Test hashing and verification through a worker process."""
+        hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1)
+        try:
+            # Never forked from the (multithreaded) serving process.
+            assert hasher._pool()._mp_context.get_start_method() != "fork"
+            password_hash = hasher.hash("secret")
+            assert hasher.verify(password_hash, "secret")
+            assert not hasher.verify(password_hash, "wrong")
+        finally:
+            hasher.shutdown()
+
+        assert password_hash.startswith("pbkdf2:sha256:1000$")
+        assert not hasher.needs_rehash(password_hash)
+        assert PasswordHasher(method="pbkdf2:sha256:2000", workers=0).needs_rehash(
+            password_hash
+        )
+
+    def test_saturated_hasher_raises(self):
+        """Test that callers give up once every slot stays taken past the timeout."""
+        hasher = PasswordHasher(
+            method="pbkdf2:sha256:1000", workers=0, max_pending=1, timeout=0.01
+        )
+        hasher._slots.acquire()
+
+        with pytest.raises(HashingBusy):
+            hasher.hash("secret")
+
+
+class TestTokenBuckets:
+    """Test cases for the in-memory token bucket store."""
+
+    def test_parse_rate(self):
+        """Test parsing of "attempts/seconds" limits."""
+        assert parse_rate("10/300") == (10, 10 / 300)
+        assert parse_rate("") is None
+        assert parse_rate("0/60") is None
+
+    def test_bucket_drains_and_refills(self):
+        """Test that a drained bucket refuses until a token has refilled."""
+        store = MemoryBucketStore()
+
+        assert store.consume("k", 2, 1.0, now=0) == (True, 0)
+        assert store.consume("k", 2, 1.0, now=0) == (True, 0)
+        allowed, retry_after = store.consume("k", 2, 1.0, now=0.25)
+        assert not allowed
+        assert retry_after == pytest.approx(0.75)
+        assert store.consume("k", 2, 1.0, now=1.25)[0]
+
+    def test_full_buckets_expire_lazily(self):
+        """Test that refilled buckets are dropped on the next sweep."""
+        store = MemoryBucketStore(sweep_every=3)
+        store.consume("a", 1, 1.0, now=0)
+        store.consume("b", 1, 1.0, now=0)
+        assert len(store) == 2
+
+        store.consume("c", 1, 1.0, now=5)
+
+        assert len(store) == 1
+
+    def test_maxsize_drops_least_recently_used(self):
+        """Test that the store stays bounded, keeping recently used buckets."""
+        store = MemoryBucketStore(maxsize=2)
+        store.consume("a", 5, 0.001, now=0)
+        store.consume("b", 5, 0.001, now=1)
+        store.consume("a", 5, 0.001, now=2)
+        store.consume("c", 5, 0.001, now=3)
+
+        assert len(store) == 2
+        assert set(store._buckets) == {"a", "c"}
+
+
+class TestEnsureIndexes:
+    """Test cases for creating model indexes on existing tables."""
+
+    def test_missing_indexes_are_created(self, app):
+        """Test that an index dropped from an existing table is recreated once."""
+        from sqlalchemy import inspect, text
+
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_event_status_date_id"))
+            ensure_indexes(connection, db.metadata)
+            # Running it again on an up-to-date schema is a no-op.
+            ensure_indexes(connection, db.metadata)
+            names = {index["name"] for index in inspect(connection).get_indexes("event")}
+
+        assert "ix_event_status_date_id" in names
+
+
+class TestEnsureColumns:
+    """Test cases for adding model columns to existing tables."""
+
+    def test_counters_added_and_filled_at_startup(self, tmp_path, monkeypatch):
+        """Test that a database from before the staffing counters is upgraded."""
+        from sqlalchemy import create_engine, text
+        from app import create_app
+
+        path = tmp_path / 'old.db'
+        engine = create_engine(f"sqlite:///{path}")
+        db.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE event DROP COLUMN num_family_reps_registered"))
+            connection.execute(text("ALTER TABLE event DROP COLUMN num_guides_registered"))
+            connection.execute(text(
+                "INSERT INTO user (id, first_name, last_name, email, password_hash, "
+                "permission_type, role) VALUES (1, 'Old', 'User', 'old@example.com', "
+                "'unused', 'user', 'Family Representative')"
+            ))
+            connection.execute(text(
+                "INSERT INTO event (id, title, description, date, channel, language, "
+                "location, status, group_size, num_instructors_needed, "
+                "num_representatives_needed, target_audience) VALUES (1, 'Old', "
+                "'Event', '2030-01-01 10:00:00', 'Virtual', 'English', 'Zoom', "
+                "'approved', 0, 1, 1, 'Universities')"
+            ))
+            connection.execute(text(
+                "INSERT INTO registrations (user_id, event_id, status) "
+                "VALUES (1, 1, 'approved')"
+            ))
+        engine.dispose()
+
+        monkeypatch.setenv('DATABASE_URL', f"sqlite:///{path}")
+        app = create_app()
+        with app.app_context():
+            event = db.session.get(Event, 1)
+            assert event.num_family_reps_registered == 1
+            assert event.num_guides_registered == 0
+            with db.engine.connect() as connection:
+                assert ensure_columns(connection, db.metadata) == []
+            db.engine.dispose()